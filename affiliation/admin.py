@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.utils import timezone
 from .models import PropertyTransaction, AffiliatePackage, Affiliate, CommissionLog, UserInvoice
 from django.utils.html import format_html
-from .services import distribute_commissions  # The math logic
+from .services import verify_property_sales  # The math logic
 
 
 admin.site.register(UserInvoice)
@@ -15,19 +15,11 @@ class PropertyTransactionAdmin(admin.ModelAdmin):
 
     @admin.action(description="Verify selected sales and pay commissions")
     def approve_sales(self, request, queryset):
-        for tx in queryset:
-            if not tx.is_verified:
-                tx.is_verified = True
-                tx.verified_by = request.user
-                tx.verification_date = timezone.now()
-                tx.save()
-
-                # Triggers the MLM math
-                
-                distribute_commissions(property=tx)
+        # Verifies, posts to the ledger and triggers the MLM math in one batch
+        verified = verify_property_sales(queryset, request.user)
 
         self.message_user(
-            request, "Selected sales verified and commissions paid.")
+            request, f"{verified} sales verified and commissions paid.")
 
 
 @admin.register(AffiliatePackage)
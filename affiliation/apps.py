@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AffiliationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'affiliation'
+
+    def ready(self):
+        import affiliation.signals
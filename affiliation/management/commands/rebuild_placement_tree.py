@@ -0,0 +1,15 @@
+"""
+Management command to recompute the spillover placement bookkeeping.
+Run via: python manage.py rebuild_placement_tree
+"""
+
+from django.core.management.base import BaseCommand
+from affiliation.services import rebuild_placement_tree
+
+
+class Command(BaseCommand):
+    help = 'Recompute Affiliate child counts and placement paths from the upline links'
+
+    def handle(self, *args, **options):
+        total = rebuild_placement_tree()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt placement data for {total} affiliates'))
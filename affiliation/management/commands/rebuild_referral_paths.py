@@ -0,0 +1,15 @@
+"""
+Management command to rebuild the referral closure table from scratch.
+Run via: python manage.py rebuild_referral_paths
+"""
+
+from django.core.management.base import BaseCommand
+from affiliation.services import rebuild_referral_paths
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ReferralPath closure table from UserProfile.referrer'
+
+    def handle(self, *args, **options):
+        total = rebuild_referral_paths()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} referral paths'))
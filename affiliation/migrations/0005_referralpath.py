@@ -0,0 +1,50 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_referral_paths(apps, schema_editor):
+    """Closure rows for the referral trees built before ReferralPath existed."""
+    UserProfile = apps.get_model('authentication', 'UserProfile')
+    ReferralPath = apps.get_model('affiliation', 'ReferralPath')
+    parents = dict(UserProfile.objects.values_list('id', 'referrer_id'))
+
+    paths = []
+    for profile_id in parents:
+        # 'seen' guards against corrupt (cyclic) data
+        seen = {profile_id}
+        ancestor_id = parents.get(profile_id)
+        depth = 1
+        while ancestor_id and ancestor_id not in seen:
+            paths.append(ReferralPath(ancestor_id=ancestor_id, descendant_id=profile_id, depth=depth))
+            seen.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+    ReferralPath.objects.bulk_create(paths, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0004_alter_affiliatepackage_generations_and_more'),
+        ('authentication', '0007_alter_user_user_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_paths', to='authentication.userprofile')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_paths', to='authentication.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='affiliation_descend_1949d2_idx'), models.Index(fields=['ancestor', 'depth'], name='affiliation_ancesto_ad570f_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(backfill_referral_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0005_referralpath'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='affiliate',
+            index=models.Index(fields=['is_active', 'duration'], name='affiliation_is_acti_cd14b2_idx'),
+        ),
+    ]
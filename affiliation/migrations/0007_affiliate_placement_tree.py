@@ -0,0 +1,67 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:05
+
+from django.conf import settings
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def backfill_placement_tree(apps, schema_editor):
+    """Child counts and root-to-node paths for the uplines set before placement existed."""
+    Affiliate = apps.get_model('affiliation', 'Affiliate')
+    uplines = dict(Affiliate.objects.values_list('id', 'upline_id'))
+    child_counts = defaultdict(int)
+    for upline_id in uplines.values():
+        if upline_id:
+            child_counts[upline_id] += 1
+
+    paths = {}
+    affiliates = list(Affiliate.objects.only('id'))
+    for affiliate in affiliates:
+        chain, seen, node = [], set(), affiliate.id
+        while node and node not in paths and node not in seen:
+            seen.add(node)
+            chain.append(node)
+            node = uplines.get(node)
+        prefix = paths.get(node, '')
+        for node_id in reversed(chain):
+            prefix = f"{prefix}{node_id}/"
+            paths[node_id] = prefix
+
+        affiliate.child_count = child_counts[affiliate.id]
+        affiliate.placement_path = paths[affiliate.id]
+        affiliate.placement_depth = affiliate.placement_path.count('/') - 1
+
+    Affiliate.objects.bulk_update(
+        affiliates, ['child_count', 'placement_path', 'placement_depth'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0006_affiliate_expiry_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='affiliate',
+            name='child_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='affiliate',
+            name='placement_depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='affiliate',
+            name='placement_path',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=500),
+        ),
+        migrations.AddIndex(
+            model_name='affiliate',
+            index=models.Index(fields=['child_count', 'placement_depth', 'id'], name='affiliation_child_c_58d8da_idx'),
+        ),
+        migrations.RunPython(backfill_placement_tree, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0007_affiliate_placement_tree'),
+        ('authentication', '0007_alter_user_user_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commissionlog',
+            index=models.Index(fields=['recipient_profile', 'created_at'], name='affiliation_recipie_66dc7a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propertytransaction',
+            index=models.Index(condition=models.Q(('is_verified', False)), fields=['created_at'], name='property_unverified_idx'),
+        ),
+    ]
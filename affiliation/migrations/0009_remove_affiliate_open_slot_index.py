@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='affiliate',
+            name='affiliation_child_c_58d8da_idx',
+        ),
+    ]
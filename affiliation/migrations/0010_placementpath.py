@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-18 12:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_placement_paths(apps, schema_editor):
+    """One row per (ancestor, descendant) pair of the existing placement paths, self included."""
+    Affiliate = apps.get_model('affiliation', 'Affiliate')
+    PlacementPath = apps.get_model('affiliation', 'PlacementPath')
+    rows = []
+    for affiliate_id, path in Affiliate.objects.exclude(placement_path='').values_list('id', 'placement_path'):
+        for depth, ancestor_id in enumerate(reversed(path.rstrip('/').split('/'))):
+            rows.append(PlacementPath(ancestor_id=int(ancestor_id), descendant_id=affiliate_id, depth=depth))
+    PlacementPath.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0009_remove_affiliate_open_slot_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='affiliate',
+            index=models.Index(fields=['child_count', 'placement_depth', 'id'], name='affiliation_child_c_58d8da_idx'),
+        ),
+        migrations.CreateModel(
+            name='PlacementPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='placement_descendants', to='affiliation.affiliate')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='placement_ancestors', to='affiliation.affiliate')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+                'indexes': [models.Index(fields=['ancestor', 'depth', 'descendant'], name='affiliation_ancesto_274351_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_placement_paths, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.db import models, transaction
+from django.db.models import Q
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
@@ -60,19 +61,26 @@ class CommissionLog(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Latest commissions on the dashboard (see krysline_admin.index_advisor)
+            models.Index(fields=['recipient_profile', 'created_at']),
+        ]
+
+    def compute_integrity_hash(self):
+        """SHA-256 seal over recipient, amount and generation."""
+        hash_data = f"{self.recipient_profile_id}{self.amount}{self.generation}{settings.SECRET_KEY}"
+        return hashlib.sha256(hash_data.encode()).hexdigest()
+
     def save(self, *args, **kwargs):
         # Create a SHA-256 hash of the transaction data
         # If the amount or recipient is changed in the DB, the hash won't match
-        hash_data = f"{self.recipient_profile_id}{self.amount}{self.generation}{settings.SECRET_KEY}"
-        self.integrity_hash = hashlib.sha256(hash_data.encode()).hexdigest()
+        self.integrity_hash = self.compute_integrity_hash()
         super().save(*args, **kwargs)
 
     def is_valid(self):
         """Verify that the record hasn't been tampered with."""
-        expected_hash = hashlib.sha256(
-            f"{self.recipient_profile_id}{self.amount}{self.generation}{settings.SECRET_KEY}".encode()
-        ).hexdigest()
-        return self.integrity_hash == expected_hash
+        return self.integrity_hash == self.compute_integrity_hash()
 
 # Register for auditlog tracking
 auditlog.register(AffiliatePackage)
@@ -114,6 +122,20 @@ class Affiliate(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Placement tree (upline) bookkeeping, maintained by affiliation.services.place_affiliate
+    child_count = models.PositiveIntegerField(default=0)
+    # Upline ids from the root down to this node, e.g. "12/45/78/"
+    placement_path = models.CharField(max_length=500, blank=True, default='', db_index=True)
+    placement_depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Serves the expiry sweep: is_active=True AND duration < now
+            models.Index(fields=['is_active', 'duration']),
+            # Open slots (child_count < width) in breadth-first order for spillover placement
+            models.Index(fields=['child_count', 'placement_depth', 'id']),
+        ]
+
     def save(self, *args, **kwargs):
         # Generate a secure, unique KAL referral code if it doesn't exist
         if not self.referral_code:
@@ -130,6 +152,66 @@ class Affiliate(models.Model):
     
 
 
+class ReferralPath(models.Model):
+    """
+    Closure table for the UserProfile.referrer tree.
+    One row per (ancestor, descendant) pair, so the whole upline of a
+    profile can be read back in a single query instead of hop by hop.
+    """
+    ancestor = models.ForeignKey(
+        'authentication.UserProfile',
+        on_delete=models.CASCADE,
+        related_name='descendant_paths'
+    )
+    descendant = models.ForeignKey(
+        'authentication.UserProfile',
+        on_delete=models.CASCADE,
+        related_name='ancestor_paths'
+    )
+    # 1 = direct referrer, 2 = referrer's referrer, ...
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+            models.Index(fields=['ancestor', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} (Gen {self.depth})"
+
+
+class PlacementPath(models.Model):
+    """
+    Closure table for the Affiliate.upline (placement) tree, the way
+    ReferralPath is for the sponsor tree. Every affiliate also has a row
+    for itself at depth 0, so a node's whole placement subtree, shallowest
+    first, is one range of the (ancestor, depth, descendant) index.
+    """
+    ancestor = models.ForeignKey(
+        Affiliate,
+        on_delete=models.CASCADE,
+        related_name='placement_descendants'
+    )
+    descendant = models.ForeignKey(
+        Affiliate,
+        on_delete=models.CASCADE,
+        related_name='placement_ancestors'
+    )
+    # 0 = the node itself, 1 = placed directly under the ancestor, ...
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['ancestor', 'depth', 'descendant']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} (Level {self.depth})"
+
+
 class UserInvoice(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, 
@@ -189,4 +271,8 @@ class PropertyTransaction(models.Model):
 
     class Meta:
         verbose_name = "Property Transaction"
-        ordering = ['created_at']
\ No newline at end of file
+        ordering = ['created_at']
+        indexes = [
+            # Verification queue: only the (few) unverified sales are indexed
+            models.Index(fields=['created_at'], condition=Q(is_verified=False), name='property_unverified_idx'),
+        ]
\ No newline at end of file
@@ -1,12 +1,27 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count, Sum, Q, F, DecimalField, ExpressionWrapper
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from collections import defaultdict
 from decimal import Decimal
-from .models import CommissionLog, AffiliatePackage, Affiliate
-from authentication.models import User
+from .models import CommissionLog, AffiliatePackage, Affiliate, ReferralPath, PlacementPath, PropertyTransaction
+from authentication.models import User, UserProfile
+from users.models import Transaction, Notification, UserFinancialSummary
+from users.services import credit_balance, apply_balance_deltas
+from users.pagination import seek_page, cursor_int
+from ledger.models import FinancialEntry
+from ledger.services import post_many
+from krysline_admin.services import invalidate_kpi_snapshot
 from django.shortcuts import get_object_or_404
 import requests
 from dotenv import load_dotenv
 import os
 from security.decorators import *
+from project.cache import VersionedLocalCache
 
 load_dotenv()
 
@@ -47,6 +62,410 @@ load_dotenv()
 #         gen += 1
 
 
+# ==================================================
+# Referral tree (closure table)
+# ==================================================
+
+
+def get_upline(profile, max_depth=3):
+    """
+    Returns the ReferralPath rows above `profile`, nearest referrer first.
+    Each row's ancestor comes with its user and Affiliate already loaded,
+    so the whole upline costs one query (rates come from _load_commission_schedules).
+    """
+    return list(
+        ReferralPath.objects.filter(
+            descendant=profile,
+            depth__lte=max_depth
+        ).select_related(
+            'ancestor__user__affiliate_record'
+        ).order_by('depth')
+    )
+
+
+@transaction.atomic
+def update_referral_paths(profile):
+    """
+    Moves `profile` and its whole downline under its current referrer.
+    Called whenever UserProfile.referrer changes.
+    """
+    # 1. The subtree being moved: the profile itself (depth 0) + its downline
+    subtree = {profile.pk: 0}
+    subtree.update(
+        ReferralPath.objects.filter(ancestor=profile).values_list('descendant_id', 'depth')
+    )
+
+    if profile.referrer_id in subtree:
+        raise ValidationError("A referrer cannot be inside their own downline.")
+
+    # 2. Detach the subtree from its old upline (paths inside it stay valid)
+    ReferralPath.objects.filter(
+        descendant_id__in=subtree
+    ).exclude(
+        ancestor_id__in=subtree
+    ).delete()
+
+    if not profile.referrer_id:
+        return
+
+    # 3. Attach it under the new referrer and everyone above them
+    upline = {profile.referrer_id: 0}
+    upline.update(
+        ReferralPath.objects.filter(descendant_id=profile.referrer_id).values_list('ancestor_id', 'depth')
+    )
+
+    ReferralPath.objects.bulk_create([
+        ReferralPath(
+            ancestor_id=ancestor_id,
+            descendant_id=descendant_id,
+            depth=ancestor_depth + 1 + descendant_depth
+        )
+        for ancestor_id, ancestor_depth in upline.items()
+        for descendant_id, descendant_depth in subtree.items()
+    ], batch_size=1000)
+
+
+@transaction.atomic
+def rebuild_referral_paths():
+    """
+    Rebuilds the whole ReferralPath table from UserProfile.referrer.
+    Returns the number of paths written.
+    """
+    parents = dict(UserProfile.objects.values_list('id', 'referrer_id'))
+    paths = []
+
+    for profile_id in parents:
+        # Walk up in memory; 'seen' guards against corrupt (cyclic) data
+        seen = {profile_id}
+        ancestor_id = parents.get(profile_id)
+        depth = 1
+
+        while ancestor_id and ancestor_id not in seen:
+            paths.append(ReferralPath(ancestor_id=ancestor_id, descendant_id=profile_id, depth=depth))
+            seen.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+    ReferralPath.objects.all().delete()
+    ReferralPath.objects.bulk_create(paths, batch_size=1000)
+    return len(paths)
+
+
+# ==================================================
+# Spillover placement (Affiliate.upline tree)
+# ==================================================
+
+# Direct children a node may hold before recruits spill over to the next level
+SPILLOVER_WIDTH = getattr(settings, 'SPILLOVER_WIDTH', 3)
+# Open slots fetched per attempt; losing a race just moves on to the next one
+PLACEMENT_CANDIDATES = 20
+# Rounds of candidates tried before giving up on a contended subtree
+PLACEMENT_ATTEMPTS = 5
+
+
+def _ensure_placement_path(affiliate):
+    """Affiliates never placed under anyone are roots of their own tree."""
+    if not affiliate.placement_path:
+        affiliate.placement_path = f"{affiliate.pk}/"
+        affiliate.placement_depth = 0
+        Affiliate.objects.filter(pk=affiliate.pk, placement_path='').update(
+            placement_path=affiliate.placement_path, placement_depth=0
+        )
+        PlacementPath.objects.get_or_create(ancestor=affiliate, descendant=affiliate, defaults={'depth': 0})
+
+
+def _claim_slot(parent_id, width=None):
+    """
+    Takes one child slot on `parent_id` with a conditional UPDATE.
+    The row lock the UPDATE takes makes concurrent claims queue up and
+    re-check child_count, so a slot can never be over-filled.
+    """
+    slots = Affiliate.objects.filter(pk=parent_id)
+    if width is not None:
+        slots = slots.filter(child_count__lt=width)
+    return slots.update(child_count=F('child_count') + 1) == 1
+
+
+def _claim_spillover_slot(sponsor, width):
+    """
+    Claims the shallowest node (lowest id within a level) of the sponsor's
+    placement subtree, the sponsor included, with fewer than `width` children.
+    The candidates are read in (ancestor, depth, descendant) index order,
+    joined to child_count by primary key, and the scan stops at the first
+    PLACEMENT_CANDIDATES open ones: no sort, and nothing below them is read.
+    Returns its pk, or None if no slot could be claimed.
+    """
+    for _ in range(PLACEMENT_ATTEMPTS):
+        # 1. Open slots, shallowest first; rows other placements hold are skipped
+        candidates = list(
+            Affiliate.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                placement_ancestors__ancestor=sponsor,
+                child_count__lt=width,
+            ).order_by(
+                'placement_ancestors__depth', 'placement_ancestors__descendant_id'
+            ).values_list('pk', flat=True)[:PLACEMENT_CANDIDATES]
+        )
+        if not candidates:
+            return None
+
+        # 2. Claim the first one nobody else filled in the meantime
+        claimed = next((pk for pk in candidates if _claim_slot(pk, width)), None)
+        if claimed is not None:
+            return claimed
+
+    return None
+
+
+@transaction.atomic
+def place_affiliate(affiliate, sponsor, width=SPILLOVER_WIDTH):
+    """
+    Sets affiliate.upline for a new recruit of `sponsor`.
+    Sponsors whose package has spillover (ELITE) get the recruit in the
+    shallowest open slot of their placement tree, breadth-first, each node
+    holding at most `width` children; everyone else gets them directly.
+    Returns the upline used. Already-placed affiliates are left alone.
+    """
+    if affiliate.upline_id:
+        return affiliate.upline
+
+    _ensure_placement_path(sponsor)
+
+    if sponsor.package_id and sponsor.package.has_spillover:
+        claimed = _claim_spillover_slot(sponsor, width)
+        if claimed is None:
+            # Never over-fill: either every round lost its race, or the
+            # bookkeeping disagrees with the upline links
+            raise ValidationError(
+                "No open placement slot under this sponsor; retry, or run rebuild_placement_tree."
+            )
+        if claimed == sponsor.pk:
+            parent = sponsor
+        else:
+            parent = Affiliate.objects.only('placement_path', 'placement_depth').get(pk=claimed)
+    else:
+        # No spillover: straight under the sponsor, however many they already have
+        _claim_slot(sponsor.pk)
+        parent = sponsor
+
+    affiliate.upline = parent
+    affiliate.placement_path = f"{parent.placement_path}{affiliate.pk}/"
+    affiliate.placement_depth = parent.placement_depth + 1
+    Affiliate.objects.filter(pk=affiliate.pk).update(
+        upline=parent,
+        placement_path=affiliate.placement_path,
+        placement_depth=affiliate.placement_depth,
+    )
+
+    # The recruit sits one level below everything above (and including) its parent
+    PlacementPath.objects.bulk_create(
+        [PlacementPath(ancestor_id=affiliate.pk, descendant_id=affiliate.pk, depth=0)] + [
+            PlacementPath(ancestor_id=ancestor_id, descendant_id=affiliate.pk, depth=depth + 1)
+            for ancestor_id, depth in PlacementPath.objects.filter(
+                descendant_id=parent.pk
+            ).values_list('ancestor_id', 'depth')
+        ],
+        ignore_conflicts=True,
+    )
+    return parent
+
+
+@transaction.atomic
+def rebuild_placement_tree():
+    """
+    Recomputes child_count, placement_path, placement_depth and the
+    PlacementPath rows for every Affiliate from the upline links (e.g. after
+    uplines were edited by hand). Returns the number of affiliates updated.
+    """
+    uplines = dict(Affiliate.objects.values_list('id', 'upline_id'))
+    child_counts = defaultdict(int)
+    for upline_id in uplines.values():
+        if upline_id:
+            child_counts[upline_id] += 1
+
+    paths = {}
+
+    def path_of(affiliate_id):
+        # Walk up in memory; 'seen' guards against corrupt (cyclic) data
+        chain, seen = [], set()
+        node = affiliate_id
+        while node and node not in paths and node not in seen:
+            seen.add(node)
+            chain.append(node)
+            node = uplines.get(node)
+        prefix = paths.get(node, '')
+        for node_id in reversed(chain):
+            prefix = f"{prefix}{node_id}/"
+            paths[node_id] = prefix
+        return paths[affiliate_id]
+
+    affiliates = list(Affiliate.objects.only('id', 'child_count', 'placement_path', 'placement_depth'))
+    for affiliate in affiliates:
+        affiliate.child_count = child_counts[affiliate.id]
+        affiliate.placement_path = path_of(affiliate.id)
+        affiliate.placement_depth = affiliate.placement_path.count('/') - 1
+
+    Affiliate.objects.bulk_update(
+        affiliates, ['child_count', 'placement_path', 'placement_depth'], batch_size=1000
+    )
+
+    PlacementPath.objects.all().delete()
+    PlacementPath.objects.bulk_create([
+        PlacementPath(ancestor_id=int(ancestor_id), descendant_id=affiliate.id, depth=depth)
+        for affiliate in affiliates
+        for depth, ancestor_id in enumerate(reversed(affiliate.placement_path.rstrip('/').split('/')))
+    ], batch_size=1000)
+    return len(affiliates)
+
+
+# ==================================================
+# Downline analytics
+# ==================================================
+
+DOWNLINE_PAGE_SIZE = 100
+# Cursor parts of a downline page: (depth, descendant_id)
+DOWNLINE_CURSOR = (cursor_int, cursor_int)
+
+
+def downline_stats(profile, max_depth=None):
+    """
+    Per-generation shape of `profile`'s downline, read from the closure table:
+    one grouped query for head counts (with active/inactive split) and one
+    for the commissions earned from each generation.
+    """
+    paths = ReferralPath.objects.filter(ancestor=profile)
+    if max_depth:
+        paths = paths.filter(depth__lte=max_depth)
+
+    counts = {
+        row['depth']: row
+        for row in paths.values('depth').annotate(
+            total=Count('id'),
+            active=Count('id', filter=Q(descendant__user__affiliate_record__is_active=True)),
+        ).order_by()
+    }
+    commissions = CommissionLog.objects.filter(recipient_profile=profile)
+    if max_depth:
+        commissions = commissions.filter(generation__lte=max_depth)
+    earned = dict(
+        commissions.values('generation').annotate(total=Sum('amount')).order_by()
+        .values_list('generation', 'total')
+    )
+
+    generations = []
+    for depth in sorted(set(counts) | set(earned)):
+        row = counts.get(depth, {'total': 0, 'active': 0})
+        generations.append({
+            'generation': depth,
+            'total': row['total'],
+            'active': row['active'],
+            'inactive': row['total'] - row['active'],
+            'commission': earned.get(depth) or Decimal('0'),
+        })
+
+    return {
+        'generations': generations,
+        'total': sum(g['total'] for g in generations),
+        'active': sum(g['active'] for g in generations),
+        'inactive': sum(g['inactive'] for g in generations),
+        'total_commission': sum((g['commission'] for g in generations), Decimal('0')),
+    }
+
+
+def downline_members(profile, max_depth=None, generation=None, after=None, limit=DOWNLINE_PAGE_SIZE):
+    """
+    Page of `profile`'s downline ordered by (generation, profile id).
+    `after` is the (depth, descendant_id) of the last row already shown, as
+    parsed by parse_cursor(value, DOWNLINE_CURSOR).
+    Returns (paths, next_cursor); each ReferralPath carries its descendant's
+    user, Affiliate and package.
+    """
+    paths = ReferralPath.objects.filter(ancestor=profile).select_related(
+        'descendant__user__affiliate_record__package'
+    )
+
+    if generation:
+        paths = paths.filter(depth=generation)
+    elif max_depth:
+        paths = paths.filter(depth__lte=max_depth)
+    return seek_page(paths, ('depth', 'descendant_id'), after=after, limit=limit)
+
+
+# ==================================================
+# Commission schedules
+# ==================================================
+
+
+
+class CommissionSchedule:
+    """
+    Read-only, precompiled copy of one AffiliatePackage.
+    `rates[gen]` is the Decimal fraction (20% -> 0.2) paid at generation
+    `gen`; generations past the package's limit are simply absent.
+    Carries the fields the pricing page renders, so it can stand in for
+    the package in templates.
+    """
+    __slots__ = (
+        'id', 'name', 'display_name', 'price', 'generations', 'rates',
+        'has_spillover', 'is_active', 'description',
+    )
+
+    def __init__(self, package):
+        self.id = package.id
+        self.name = package.name
+        self.display_name = package.get_name_display()
+        self.price = package.price
+        self.generations = package.generations
+        self.has_spillover = package.has_spillover
+        self.is_active = package.is_active
+        self.description = package.description
+
+        rates = {}
+        for gen in range(1, package.generations + 1):
+            percentage = (package.commissions or {}).get(str(gen), 0)
+            if percentage:
+                # str() keeps JSON floats like 7.5 exact instead of their binary expansion
+                rates[gen] = Decimal(str(percentage)) / Decimal(100)
+        self.rates = rates
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def get_name_display(self):
+        return self.display_name
+
+    def rate(self, gen):
+        return self.rates.get(gen, Decimal(0))
+
+
+def _load_commission_schedules():
+    return {
+        package.id: CommissionSchedule(package)
+        for package in AffiliatePackage.objects.order_by('price')
+    }
+
+
+_commission_schedules = VersionedLocalCache('commission_schedules', _load_commission_schedules)
+
+
+def commission_schedules():
+    """
+    {package_id: CommissionSchedule} for every AffiliatePackage, served from
+    process memory and refreshed through the shared cache (see
+    VersionedLocalCache). For display only: payouts compile their own copy
+    inside their transaction, so they never pay on rates a few seconds old.
+    """
+    return _commission_schedules.get()
+
+
+def invalidate_commission_schedules():
+    """Every process recompiles the schedules once the current transaction commits."""
+    _commission_schedules.invalidate()
+
+
 @transaction.atomic
 def distribute_commissions(new_affiliate=None, property=None, new=False):
     """
@@ -54,82 +473,259 @@ def distribute_commissions(new_affiliate=None, property=None, new=False):
 
     """
     payment_amount = 0
-    current_upline_profile = None
 
     # The person who just paid
     if new:
         payment_amount = new_affiliate.package.price
-
-        # The first person to get paid (The Referrer)
-        current_upline_profile = new_affiliate.user.profile.referrer
+        source_profile = new_affiliate.user.profile
     else:
         payment_amount = property.amount
-        # The first person to get paid (The Referrer)
-        current_upline_profile = property.affiliate.user.profile.referrer
+        source_profile = property.affiliate.user.profile
+
+    # Rates as committed right now, not the display cache
+    schedules = _load_commission_schedules()
 
-    gen = 1
     # KAL Policy: We only pay up to 3 generations
-    while current_upline_profile and gen <= 3:
-        # Get the upline's business record to check their package
-        upline_affiliate = getattr(
-            current_upline_profile.user, 'affiliate_record', None)
-
-        if upline_affiliate and upline_affiliate.is_active:
-            upline_package = upline_affiliate.package
-
-            # Check if their package allows earning at this depth (Gen 1, 2, or 3)
-            if gen <= upline_package.generations:
-                # Pull percentage from the JSONField we created: {"1": 20, "2": 10...}
-                percentage = upline_package.commissions.get(str(gen), 0)
-
-                if percentage > 0:
-                    commission_amount = (
-                        payment_amount * Decimal(percentage)) / Decimal(100)
-
-                    with transaction.atomic():
-
-                        if not new:
-                            # 1. Update Balance (Securely)
-                            current_upline_profile.balance += commission_amount
-                            current_upline_profile.save()
-
-                            
-                            property.affiliate.user.profile.balance += int((
-                                property.amount * 10)/100)
-                            property.affiliate.user.profile.save()
-
-                        # 2. Create Audit Log
-                            CommissionLog.objects.create(
-                                recipient_profile=current_upline_profile,
-                                amount=commission_amount,
-                                source_user=property.affiliate.user,
-                                generation=gen
-                            )
-
-                        else:
-                            # 1. Update Balance (Securely)
-                            current_upline_profile.balance += commission_amount
-                            current_upline_profile.save()
-
-                            CommissionLog.objects.create(
-                                recipient_profile=current_upline_profile,
-                                amount=commission_amount,
-                                source_user=new_affiliate.user,
-                                generation=gen
-                            )
-
-                        logger.info(
-                            f"Commission Paid: {commission_amount} to {current_upline_profile.user.email}")
-
-        # Move up to the next boss in the tree
-        current_upline_profile = current_upline_profile.referrer
-        gen += 1
-
-        # print('Commission')
+    # The whole upline (with Affiliate + Package) comes back in one query
+    for path in get_upline(source_profile, max_depth=3):
+        gen = path.depth
+        current_upline_profile = path.ancestor
+
+        rate = _commission_rate(current_upline_profile, gen, schedules)
+
+        if rate > 0:
+            # Round to kobo up front so the integrity hash matches the stored amount
+            commission_amount = (payment_amount * rate).quantize(Decimal('0.01'))
+
+            with transaction.atomic():
+
+                if not new:
+                    # 1. Update Balance (Securely)
+                    credit_balance(current_upline_profile, commission_amount)
+
+                    credit_balance(property.affiliate.user.profile, int((
+                        property.amount * 10)/100))
+
+                # 2. Create Audit Log
+                    CommissionLog.objects.create(
+                        recipient_profile=current_upline_profile,
+                        amount=commission_amount,
+                        source_user=property.affiliate.user,
+                        generation=gen
+                    )
+
+                else:
+                    # 1. Update Balance (Securely)
+                    credit_balance(current_upline_profile, commission_amount)
+
+                    CommissionLog.objects.create(
+                        recipient_profile=current_upline_profile,
+                        amount=commission_amount,
+                        source_user=new_affiliate.user,
+                        generation=gen
+                    )
+
+                logger.info(
+                    f"Commission Paid: {commission_amount} to {current_upline_profile.user.email}")
 
     return True
 
 
+def _commission_rate(upline_profile, gen, schedules):
+    """
+    Fraction of the payment an upline earns at generation `gen`, or 0 if
+    their Affiliate is inactive or their package doesn't reach that deep.
+    `schedules` is the payout's own _load_commission_schedules().
+    """
+    # Get the upline's business record to check their package
+    upline_affiliate = getattr(upline_profile.user, 'affiliate_record', None)
+
+    if not upline_affiliate or not upline_affiliate.is_active:
+        return Decimal(0)
+
+    # Precompiled from AffiliatePackage.commissions, e.g. {"1": 20, "2": 10}
+    schedule = schedules.get(upline_affiliate.package_id)
+    if schedule is None:
+        return Decimal(0)
+
+    return schedule.rate(gen)
+
+
+# ==================================================
+# Package revenue statistics
+# ==================================================
+
+
+def package_revenue_stats():
+    """
+    AffiliatePackage queryset annotated in one grouped query with:
+    member_count, active_count, revenue (price x members) and
+    active_revenue (price x active members).
+    """
+    money = DecimalField(max_digits=18, decimal_places=2)
+    return AffiliatePackage.objects.annotate(
+        member_count=Count('members'),
+        active_count=Count('members', filter=Q(members__is_active=True)),
+    ).annotate(
+        revenue=ExpressionWrapper(F('price') * F('member_count'), output_field=money),
+        active_revenue=ExpressionWrapper(F('price') * F('active_count'), output_field=money),
+    ).order_by('id')
+
+
+# ==================================================
+# Bulk property sale verification
+# ==================================================
+
+
+@transaction.atomic
+def verify_property_sales(queryset, verified_by):
+    """
+    Verifies a batch of PropertyTransactions, posts them to the ledger and
+    pays their commissions in one transaction. Sales that are already
+    verified are skipped. Returns the number of sales verified.
+    """
+    sales = list(
+        queryset.filter(is_verified=False)
+        .select_for_update(of=('self',))
+        .select_related('affiliate__user__profile')
+    )
+
+    if not sales:
+        return 0
+
+    # 1. Mark verified with a single UPDATE
+    now = timezone.now()
+    PropertyTransaction.objects.filter(
+        pk__in=[sale.pk for sale in sales]
+    ).update(is_verified=True, verified_by=verified_by, verification_date=now)
+    invalidate_kpi_snapshot()
+
+    verified_per_seller = defaultdict(int)
+    for sale in sales:
+        sale.is_verified = True
+        sale.verified_by = verified_by
+        sale.verification_date = now
+        verified_per_seller[sale.affiliate.user_id] += 1
+
+    # .update() skips post_save, so keep the sellers' dashboards in step here
+    for user_id, count in verified_per_seller.items():
+        UserFinancialSummary.adjust(user_id, verified_sales_count=count)
+
+    # 2. Company ledger inflow (what track_property_inflow does on save);
+    #    post_many skips sales that are already in the ledger
+    post_many([
+        FinancialEntry(
+            actor=sale.affiliate.user,
+            entry_type='inflow',
+            category='property_sale',
+            amount=sale.amount,
+            description=f"Property {sale.transaction_type}: {sale.transaction_id} by {sale.affiliate.user.get_full_name()}",
+            reference_id=f"PROP-{sale.transaction_id}"
+        )
+        for sale in sales
+    ])
+
+    # 3. Commissions
+    distribute_commissions_bulk(sales)
+
+    return len(sales)
+
+
+@transaction.atomic
+def distribute_commissions_bulk(sales):
+    """
+    Set-based distribute_commissions(property=...) for a batch of sales.
+    Every payout is worked out in memory first, then written with one F()
+    update per recipient and bulk inserts for the logs.
+    """
+    sales = list(sales)
+    seller_profile_ids = {sale.affiliate.user.profile.pk for sale in sales}
+
+    # 1. Every seller's upline in one query
+    uplines = defaultdict(list)
+    for path in ReferralPath.objects.filter(
+        descendant_id__in=seller_profile_ids,
+        depth__lte=3
+    ).select_related(
+        'ancestor__user__affiliate_record'
+    ).order_by('depth'):
+        uplines[path.descendant_id].append(path)
+
+    # 2. Work out every generation's payout in memory, on the rates as committed now
+    schedules = _load_commission_schedules()
+    balance_deltas = defaultdict(Decimal)
+    commission_logs = []
+
+    for sale in sales:
+        seller = sale.affiliate.user
+
+        for path in uplines[seller.profile.pk]:
+            rate = _commission_rate(path.ancestor, path.depth, schedules)
+
+            if rate > 0:
+                commission_amount = (sale.amount * rate).quantize(Decimal('0.01'))
+
+                balance_deltas[path.ancestor_id] += commission_amount
+                # Same seller bonus distribute_commissions pays per generation
+                balance_deltas[seller.profile.pk] += int((sale.amount * 10)/100)
+
+                log = CommissionLog(
+                    recipient_profile=path.ancestor,
+                    amount=commission_amount,
+                    source_user=seller,
+                    generation=path.depth
+                )
+                # bulk_create skips save(), so seal the record here
+                log.integrity_hash = log.compute_integrity_hash()
+                commission_logs.append(log)
+
+    # 3. Apply every recipient's balance in one UPDATE, no read-modify-write
+    apply_balance_deltas(balance_deltas)
+
+    # 4. Audit trail (record_commission_earned doesn't fire on bulk_create)
+    CommissionLog.objects.bulk_create(commission_logs, batch_size=500)
+
+    Transaction.objects.bulk_create([
+        Transaction(
+            user=log.recipient_profile.user,
+            amount=log.amount,
+            transaction_type='commission',
+            description="Commission Earned"
+        )
+        for log in commission_logs
+    ], batch_size=500)
+
+    Notification.objects.bulk_create([
+        Notification(
+            user=log.recipient_profile.user,
+            title="Commission from your Referral",
+            message=f"You received ₦{log.amount} commission from your Referral",
+            notification_type=Notification.NotificationType.REFERRAL,
+            priority=Notification.Priority.NORMAL,
+        )
+        for log in commission_logs
+    ], batch_size=500)
+
+    # Dashboard totals: one UPDATE per recipient
+    earned_per_user = defaultdict(Decimal)
+    logs_per_user = defaultdict(int)
+    for log in commission_logs:
+        earned_per_user[log.recipient_profile.user_id] += log.amount
+        logs_per_user[log.recipient_profile.user_id] += 1
+
+    for user_id, earned in earned_per_user.items():
+        UserFinancialSummary.adjust(
+            user_id,
+            total_commission=earned,
+            unread_notifications=logs_per_user[user_id]
+        )
+
+    logger.info(
+        f"Bulk Commissions Paid: {len(commission_logs)} payouts across {len(sales)} sales")
+
+    return len(commission_logs)
+
+
 # ==================================================
 # Flutterwave transaction verification
 # ==================================================
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.core.exceptions import ValidationError
+from authentication.models import UserProfile
+from .models import ReferralPath, AffiliatePackage
+from .services import update_referral_paths, invalidate_commission_schedules
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_referrer(sender, instance, **kwargs):
+    """
+    Keeps the referrer the profile was loaded with, so post_save can tell
+    whether the tree actually moved. Reads __dict__ to avoid loading a
+    deferred field.
+    """
+    instance._saved_referrer_id = instance.__dict__.get('referrer_id')
+
+
+@receiver(pre_save, sender=UserProfile)
+def block_referral_cycle(sender, instance, raw=False, **kwargs):
+    """
+    Refuses to save a referrer that sits inside the profile's own downline,
+    before the row is written.
+    """
+    if raw or not instance.pk or not instance.referrer_id:
+        return
+
+    if instance._saved_referrer_id == instance.referrer_id:
+        return
+
+    if instance.referrer_id == instance.pk or ReferralPath.objects.filter(
+        ancestor_id=instance.pk,
+        descendant_id=instance.referrer_id
+    ).exists():
+        raise ValidationError("A referrer cannot be inside their own downline.")
+
+
+@receiver(post_save, sender=UserProfile)
+def sync_referral_paths(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Keeps the ReferralPath closure table in step with UserProfile.referrer.
+    """
+    if raw:
+        return
+
+    if update_fields is not None and not {'referrer', 'referrer_id'} & set(update_fields):
+        return
+
+    if created:
+        # New profiles have no downline yet; nothing to do without a referrer
+        if not instance.referrer_id:
+            return
+    elif instance._saved_referrer_id == instance.referrer_id:
+        return
+
+    update_referral_paths(instance)
+    instance._saved_referrer_id = instance.referrer_id
+
+
+@receiver(post_save, sender=AffiliatePackage)
+@receiver(post_delete, sender=AffiliatePackage)
+def refresh_commission_schedules(sender, **kwargs):
+    """Recompiles the cached commission schedules after any package change."""
+    invalidate_commission_schedules()
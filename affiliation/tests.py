@@ -1,3 +1,250 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from authentication.models import User, UserProfile
+from users.models import Notification, Transaction, UserFinancialSummary
+from users.pagination import parse_cursor
+from .models import Affiliate, AffiliatePackage, CommissionLog, PlacementPath, PropertyTransaction, ReferralPath
+from .services import (
+    place_affiliate, rebuild_placement_tree, downline_members, update_referral_paths, DOWNLINE_CURSOR,
+    commission_schedules, distribute_commissions, distribute_commissions_bulk,
+)
 
-# Create your tests here.
+
+class PlaceAffiliateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.elite = AffiliatePackage.objects.create(
+            name='ELITE', price=Decimal('500000'), generations=5, has_spillover=True
+        )
+        cls.basic = AffiliatePackage.objects.create(name='BASIC', price=Decimal('20000'), generations=1)
+
+    def affiliate(self, package=None):
+        n = User.objects.count()
+        user = User.objects.create_user(email=f"user{n}@example.com", password="pw", username=f"user{n}")
+        affiliate = user.affiliate_record
+        if package:
+            Affiliate.objects.filter(pk=affiliate.pk).update(package=package)
+            affiliate.refresh_from_db()
+        return affiliate
+
+    def recruit(self, sponsor, width=2):
+        return place_affiliate(self.affiliate(), sponsor, width=width)
+
+    def test_spillover_fills_the_tree_breadth_first(self):
+        sponsor = self.affiliate(self.elite)
+        uplines = [self.recruit(sponsor).pk for _ in range(8)]
+
+        children = list(Affiliate.objects.filter(upline=sponsor).order_by('id').values_list('pk', flat=True))
+        # Two under the sponsor, then two under each of them in id order, then the next level
+        grandchildren = list(
+            Affiliate.objects.filter(upline__in=children).order_by('id').values_list('pk', flat=True)
+        )
+        self.assertEqual(uplines, [sponsor.pk] * 2 + [children[0]] * 2 + [children[1]] * 2 + [grandchildren[0]] * 2)
+
+        placed = Affiliate.objects.filter(upline_id=grandchildren[0]).latest('id')
+        self.assertEqual(placed.placement_depth, 3)
+        self.assertEqual(placed.placement_path, f"{sponsor.pk}/{children[0]}/{grandchildren[0]}/{placed.pk}/")
+
+    def test_placement_paths_follow_the_upline_tree(self):
+        sponsor = self.affiliate(self.elite)
+        for _ in range(7):
+            self.recruit(sponsor)
+        placed = Affiliate.objects.filter(upline__upline__upline=sponsor).get()
+
+        self.assertEqual(
+            list(PlacementPath.objects.filter(descendant=placed).order_by('depth').values_list('ancestor_id', 'depth')),
+            [(placed.pk, 0), (placed.upline_id, 1), (placed.upline.upline_id, 2), (sponsor.pk, 3)]
+        )
+        self.assertEqual(PlacementPath.objects.filter(ancestor=sponsor).count(), 8)
+
+        placed_paths = set(PlacementPath.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        rebuild_placement_tree()
+        self.assertEqual(set(PlacementPath.objects.values_list('ancestor_id', 'descendant_id', 'depth')), placed_paths)
+
+    def test_placement_cost_does_not_grow_with_the_tree(self):
+        sponsor = self.affiliate(self.elite)
+        for _ in range(3):
+            self.recruit(sponsor)
+        # Slot lookup, claim, parent, upline update, parent's paths, insert (+ savepoint)
+        recruit = self.affiliate()
+        with self.assertNumQueries(8):
+            place_affiliate(recruit, sponsor, width=2)
+
+        for _ in range(20):
+            self.recruit(sponsor)
+        recruit = self.affiliate()
+        with self.assertNumQueries(8):
+            place_affiliate(recruit, sponsor, width=2)
+
+    def test_without_spillover_recruits_go_straight_under_the_sponsor(self):
+        sponsor = self.affiliate(self.basic)
+        for _ in range(4):
+            self.assertEqual(self.recruit(sponsor), sponsor)
+        sponsor.refresh_from_db()
+        self.assertEqual(sponsor.child_count, 4)
+
+    def test_stale_child_counts_fail_instead_of_overfilling(self):
+        sponsor = self.affiliate(self.elite)
+        self.recruit(sponsor)
+        child = Affiliate.objects.get(upline=sponsor)
+        # Counts that claim full nodes the upline links do not back up
+        Affiliate.objects.filter(pk__in=[sponsor.pk, child.pk]).update(child_count=2)
+
+        with self.assertRaises(ValidationError):
+            self.recruit(sponsor)
+        sponsor.refresh_from_db()
+        self.assertEqual(sponsor.child_count, 2)
+
+    def test_already_placed_affiliates_are_left_alone(self):
+        sponsor = self.affiliate(self.elite)
+        recruit = self.affiliate()
+        place_affiliate(recruit, sponsor)
+        self.assertEqual(place_affiliate(recruit, self.affiliate(self.elite)), sponsor)
+
+
+class DownlineMembersTests(TestCase):
+
+    def profile(self, referrer=None):
+        n = User.objects.count()
+        user = User.objects.create_user(email=f"user{n}@example.com", password="pw", username=f"user{n}")
+        profile = user.profile
+        if referrer:
+            UserProfile.objects.filter(pk=profile.pk).update(referrer=referrer)
+            profile.refresh_from_db()
+            update_referral_paths(profile)
+        return profile
+
+    def test_pages_walk_the_downline_by_generation(self):
+        root = self.profile()
+        children = [self.profile(root) for _ in range(3)]
+        for child in children:
+            self.profile(child)
+            self.profile(child)
+
+        seen, cursor = [], None
+        while True:
+            paths, cursor = downline_members(root, after=parse_cursor(cursor, DOWNLINE_CURSOR), limit=2)
+            seen.extend((path.depth, path.descendant_id) for path in paths)
+            if cursor is None:
+                break
+        self.assertEqual(
+            seen, list(ReferralPath.objects.filter(ancestor=root).order_by('depth', 'descendant_id')
+                       .values_list('depth', 'descendant_id'))
+        )
+        self.assertEqual(len(seen), 9)
+
+
+class CommissionPayoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = AffiliatePackage.objects.create(
+            name='PROFESSIONAL', price=Decimal('200000'), generations=3,
+            commissions={'1': 10, '2': 5, '3': 2}
+        )
+        # great_grandparent -> grandparent -> parent -> seller
+        cls.chain = []
+        referrer = None
+        for n in range(4):
+            user = User.objects.create_user(email=f"chain{n}@example.com", password="pw", username=f"chain{n}")
+            Affiliate.objects.filter(user=user).update(package=cls.package, is_active=True)
+            if referrer:
+                user.profile.referrer = referrer
+                user.profile.save()
+            referrer = user.profile
+            cls.chain.append(user)
+        cls.seller = cls.chain[-1]
+
+    def sale(self, amount='100000'):
+        return PropertyTransaction.objects.create(
+            affiliate=self.seller.affiliate_record, amount=Decimal(amount), description='Plot 7'
+        )
+
+    def test_payouts_use_the_rates_committed_now(self):
+        commission_schedules()
+        # A change the display copy has not picked up yet (update() sends no signal)
+        AffiliatePackage.objects.filter(pk=self.package.pk).update(commissions={'1': 50, '2': 5, '3': 2})
+
+        distribute_commissions_bulk([self.sale()])
+
+        parent_log = CommissionLog.objects.get(generation=1)
+        self.assertEqual(parent_log.amount, Decimal('50000.00'))
+        self.assertEqual(commission_schedules()[self.package.pk].rate(1), Decimal('0.1'))
+
+    def state(self):
+        """What a payout changes, per chain member: balance, logs, transactions, notifications, summary."""
+        users = {user.pk: user for user in self.chain}
+        return {
+            'balances': dict(UserProfile.objects.filter(user__in=users).values_list('user_id', 'balance')),
+            'logs': sorted(CommissionLog.objects.values_list('recipient_profile__user_id', 'generation', 'amount')),
+            'transactions': sorted(Transaction.objects.filter(
+                transaction_type='commission').values_list('user_id', 'amount')),
+            'notifications': Notification.objects.filter(user__in=users, is_read=False).count(),
+            'commission_totals': dict(
+                UserFinancialSummary.objects.filter(user__in=users).values_list('user_id', 'total_commission')
+            ),
+        }
+
+    def run_and_diff(self, pay):
+        """Runs `pay` and returns what it changed, so two engines can be compared run for run."""
+        before = self.state()
+        pay()
+        after = self.state()
+        return {
+            'balances': {pk: after['balances'][pk] - before['balances'][pk] for pk in after['balances']},
+            'logs': sorted(set(after['logs']) - set(before['logs'])),
+            'transactions': len(after['transactions']) - len(before['transactions']),
+            'notifications': after['notifications'] - before['notifications'],
+            'commission_totals': {
+                pk: after['commission_totals'].get(pk, 0) - before['commission_totals'].get(pk, 0)
+                for pk in after['commission_totals']
+            },
+        }
+
+    def test_bulk_engine_pays_what_the_per_sale_loop_pays(self):
+        legacy = self.run_and_diff(lambda: distribute_commissions(property=self.sale('123456.78')))
+        CommissionLog.objects.all().delete()
+        bulk = self.run_and_diff(lambda: distribute_commissions_bulk([self.sale('123456.78')]))
+
+        self.assertEqual(bulk, legacy)
+        parent, grandparent, great_grandparent = self.chain[2], self.chain[1], self.chain[0]
+        self.assertEqual(bulk['logs'], sorted([
+            (parent.pk, 1, Decimal('12345.68')),
+            (grandparent.pk, 2, Decimal('6172.84')),
+            (great_grandparent.pk, 3, Decimal('2469.14')),
+        ]))
+        # The seller's 10% bonus is paid once per paying generation
+        self.assertEqual(bulk['balances'][self.seller.pk], 3 * 12345)
+        self.assertEqual(bulk['transactions'], 3)
+        self.assertEqual(bulk['notifications'], 3)
+
+    def test_inactive_uplines_and_shallow_packages_are_skipped(self):
+        Affiliate.objects.filter(user=self.chain[1]).update(is_active=False)
+        shallow = AffiliatePackage.objects.create(name='BASIC', price=Decimal('20000'), generations=2,
+                                                  commissions={'1': 10, '2': 5, '3': 2})
+        Affiliate.objects.filter(user=self.chain[0]).update(package=shallow)
+
+        distribute_commissions_bulk([self.sale()])
+
+        self.assertEqual(list(CommissionLog.objects.values_list('recipient_profile__user_id', 'generation')),
+                         [(self.chain[2].pk, 1)])
+
+    def test_each_table_is_written_once_per_batch(self):
+        sales = [self.sale() for _ in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(distribute_commissions_bulk(sales), 9)
+
+        def statements(prefix, table):
+            return [q['sql'] for q in queries.captured_queries if q['sql'].startswith(prefix) and f'"{table}"' in q['sql']]
+
+        self.assertEqual(len(statements('INSERT', 'affiliation_commissionlog')), 1)
+        self.assertEqual(len(statements('INSERT', 'users_transaction')), 1)
+        self.assertEqual(len(statements('INSERT', 'users_notification')), 1)
+        self.assertEqual(len(statements('UPDATE', 'authentication_userprofile')), 1)
+        self.assertEqual(CommissionLog.objects.count(), 9)
+        for log in CommissionLog.objects.all():
+            self.assertEqual(log.integrity_hash, log.compute_integrity_hash())
@@ -1,7 +1,9 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import UserCreationForm, PasswordResetForm
+from django.template import loader
 from django.core.exceptions import ValidationError
 from .models import User
+from users.services import queue_email
 import re
 
 class SecureLoginForm(forms.Form):
@@ -48,4 +50,21 @@ class AffiliateRegistrationForm(UserCreationForm):
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'user_type', 'password1', 'password2']
-   
\ No newline at end of file
+   
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Password reset that queues its email in the outbox instead of sending inline."""
+
+    def send_mail(self, subject_template_name, email_template_name, context,
+                  from_email, to_email, html_email_template_name=None):
+        subject = loader.render_to_string(subject_template_name, context)
+        # Email subject *must not* contain newlines
+        subject = "".join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+
+        html_body = ''
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name, context)
+
+        queue_email(subject, body, [to_email], html_body=html_body, from_email=from_email)
@@ -1,5 +1,5 @@
 from django.http import HttpResponseForbidden
-from .models import BlacklistedIP
+from security.security_utils import is_ip_blocked
 from django.contrib import messages as mg
 
 import logging
@@ -18,8 +18,8 @@ class IPBlacklistMiddleware:
         # 1. Get the visitor's IP
         ip = request.META.get('REMOTE_ADDR')
         
-        # 2. Check if it exists in your BlacklistedIP model
-        if BlacklistedIP.objects.filter(ip_address=ip).exists():
+        # 2. Check it against the cached blacklist (no query per request)
+        if is_ip_blocked(ip):
             mg.error(request, "403 Forbidden, Your IP has been blacklisted for security reasons. Contact KAL Support.")
         
         return self.get_response(request)
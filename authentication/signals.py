@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import UserProfile, User
+from .models import UserProfile, User, BlacklistedIP
+from security.security_utils import invalidate_ip_blacklist
 from affiliation.models import UserInvoice, Affiliate
 
 
@@ -25,4 +26,12 @@ def create_user_affiliate(sender, instance, created, **kwargs):
         Affiliate.objects.create(
             user=instance,
             is_active=False
-        ) 
\ No newline at end of file
+        ) 
+
+
+
+@receiver(post_save, sender=BlacklistedIP)
+@receiver(post_delete, sender=BlacklistedIP)
+def refresh_ip_blacklist(sender, instance, **kwargs):
+    # Admin edits and unblocks must reach every process's cached blacklist
+    invalidate_ip_blacklist()
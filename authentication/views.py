@@ -5,11 +5,13 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.db import transaction
 from affiliation.models import Affiliate
+from affiliation.services import place_affiliate
 from django.utils import timezone
 from django.contrib import messages as mg
-from .forms import SecureLoginForm, AffiliateRegistrationForm
+from .forms import SecureLoginForm, AffiliateRegistrationForm, QueuedPasswordResetForm
 from security.decorators import rate_limit, get_client_ip, log_security_event, logger
 from security.models import SecurityAuditLog
+from security.services import record_audit_event
 from security.security_utils import *
 from .token import email_verification_token
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
@@ -18,9 +20,9 @@ import requests
 from django.core.mail import EmailMessage
 # Email Require
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from users.services import queue_email
 from .models import User
 
 
@@ -90,7 +92,7 @@ def login(request):
 
             user_email = user.email
 
-            SecurityAuditLog.objects.create(
+            record_audit_event(
                 user = user,
                 action = 'LOGIN_SUCCESS',
                 ip_address=ip_address,
@@ -183,10 +185,8 @@ def register(request):
 
                     text_content = strip_tags(message)
 
-                    email = EmailMultiAlternatives(subject, text_content, to=[user.email])
-                    # email = EmailMessage(subject, message, to=[user.email])
-                    email.attach_alternative(message, 'text/html')
-                    email.send()
+                    # Queued in this transaction; send_queued_emails delivers it
+                    queue_email(subject, text_content, [user.email], html_body=message)
                     
                     # Log success
                     logger.info("registration_successful", user=user.email)
@@ -259,10 +259,8 @@ def activate_account(request, uidb64, token):
                 new_profile.referrer = upline_affiliate.user.profile
                 new_profile.save()
 
-                print("Creat Affiliate")
-                new_profile.user.affiliate_record.upline = upline_affiliate
-                new_profile.user.affiliate_record.save() 
-                print("Creat Done")
+                # Direct, or spilled over under the sponsor's downline (ELITE)
+                place_affiliate(new_profile.user.affiliate_record, upline_affiliate)
                 
             except Affiliate.DoesNotExist:
                 pass
@@ -311,10 +309,8 @@ def resend_activation(request):
 
             text_content = strip_tags(message)
 
-            email = EmailMultiAlternatives(subject, text_content, to=[user.email])
-            # email = EmailMessage(subject, message, to=[user.email])
-            email.attach_alternative(message, 'text/html')
-            email.send()
+            # Queued in this transaction; send_queued_emails delivers it
+            queue_email(subject, text_content, [user.email], html_body=message)
             
             # 4. Set the 2-minute lock in cache
             cache.set(cache_key, True, 120) 
@@ -352,6 +348,7 @@ def logout(request):
 
 
 class CustomPasswordResetView(PasswordResetView):
+    form_class = QueuedPasswordResetForm
     template_name = 'authentication/password_reset_form.html'
     email_template_name = 'authentication/password_reset_email.txt'
     subject_template_name = 'authentication/password_reset_subject.txt'
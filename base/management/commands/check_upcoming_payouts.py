@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 
 from base.models import InvestmentPayout
 
@@ -14,8 +14,9 @@ class Command(BaseCommand):
         
         upcoming = InvestmentPayout.objects.filter(
             status='scheduled',
-            scheduled_date__date__gte=today,
-            scheduled_date__date__lte=next_week
+            # A range on the raw column, so the (status, scheduled_date) index applies
+            scheduled_date__gte=timezone.make_aware(datetime.combine(today, time.min)),
+            scheduled_date__lt=timezone.make_aware(datetime.combine(next_week + timedelta(days=1), time.min))
         ).select_related('investment', 'investment__user').order_by('scheduled_date')
         
         if not upcoming.exists():
@@ -2,25 +2,34 @@
 """
 Management command to process scheduled investment payouts.
 Run via: python manage.py process_payouts
-Or via cron: 0 9 * * * /usr/bin/python3 /path/to/manage.py process_payouts
+Or via cron: 0 9 * * * /usr/bin/python3 /path/to/manage.py process_payouts --bulk
 """
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db import transaction
-from django.core.mail import send_mail
-from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q, Case, When, Value, Count, DecimalField, IntegerField
+from collections import defaultdict
 from decimal import Decimal
 from dotenv import load_dotenv
 from django.conf import settings
 import os
+import time
+from datetime import datetime, timedelta
 from base.models import Investment, InvestmentPayout, InvestmentStatus
+from users.services import credit_balance, apply_balance_deltas, queue_email, queue_emails
 
 load_dotenv()
 
 email = settings.EMAIL_HOST_USER
 
 
+
+def _day_start(day):
+    """Midnight at the start of `day` in the project timezone."""
+    # A range on the raw column can use the (status, scheduled_date) index; __date can't
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
 class Command(BaseCommand):
     help = 'Process scheduled investment payouts and update investment statuses'
 
@@ -35,23 +44,37 @@ class Command(BaseCommand):
             type=str,
             help='Process payouts for specific date (YYYY-MM-DD)',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Process payouts set-based, one transaction per chunk',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Payouts per transaction in --bulk mode (default 500)',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
         
         # Determine date to process
         if options['date']:
-            from datetime import datetime
             process_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
         else:
             process_date = timezone.now().date()
         
         self.stdout.write(self.style.MIGRATE_HEADING(f'Processing payouts for {process_date}'))
+
+        if options['bulk']:
+            return self.handle_bulk(process_date, options['chunk_size'], dry_run)
         
         # Find payouts scheduled for today
         due_payouts = InvestmentPayout.objects.filter(
             status='scheduled',
-            scheduled_date__date=process_date,
+            scheduled_date__gte=_day_start(process_date),
+            scheduled_date__lt=_day_start(process_date + timedelta(days=1)),
             investment__status='active'
         ).select_related('investment', 'investment__user', 'investment__plan')
         
@@ -115,8 +138,7 @@ class Command(BaseCommand):
         investment.save(update_fields=['total_paid_out', 'payouts_completed'])
 
         # Update user account balance for withdrawing 
-        user.profile.balance += payout.total_amount
-        user.profile.save()
+        credit_balance(user.profile, payout.total_amount)
         
         # Create transaction record
         # from financial.models import Transaction  # Adjust import as needed
@@ -137,87 +159,156 @@ class Command(BaseCommand):
 
     def update_investment_statuses(self, dry_run=False):
         """Mark investments as completed when all payouts are done"""
-        # Find active investments with all payouts completed
+        # Active investments whose payouts are all completed, counted in one grouped query
         investments_to_complete = Investment.objects.filter(
             status='active'
-        ).exclude(
-            payouts__status__in=['scheduled', 'processing']
+        ).annotate(
+            total_payouts=Count('payouts'),
+            completed_payouts=Count('payouts', filter=Q(payouts__status='completed')),
         ).filter(
-            payouts__status='completed'
-        ).distinct()
+            total_payouts__gt=0,
+            total_payouts=F('completed_payouts'),
+        ).select_related('user', 'plan')
         
         completed_count = 0
         
         for investment in investments_to_complete:
-            total_payouts = investment.payouts.count()
-            completed_payouts = investment.payouts.filter(status='completed').count()
+            self.stdout.write(
+                f'Completing investment {investment.reference_code} '
+                f'({investment.completed_payouts}/{investment.total_payouts} payouts)'
+            )
             
-            if total_payouts == completed_payouts and total_payouts > 0:
-                self.stdout.write(
-                    f'Completing investment {investment.reference_code} '
-                    f'({completed_payouts}/{total_payouts} payouts)'
-                )
+            if not dry_run:
+                investment.status = InvestmentStatus.COMPLETED
+                investment.completed_at = timezone.now()
+                investment.save(update_fields=['status', 'completed_at'])
                 
-                if not dry_run:
-                    investment.status = InvestmentStatus.COMPLETED
-                    investment.completed_at = timezone.now()
-                    investment.save(update_fields=['status', 'completed_at'])
-                    
-                    # Send completion notification
-                    self.send_completion_notification(investment)
-                
-                completed_count += 1
+                # Send completion notification
+                self.send_completion_notification(investment)
+            
+            completed_count += 1
         
         return completed_count
 
-    def send_payout_notification(self, payout):
-        """Send email notification to user"""
-        with  get_connection(
-            host=settings.EMAIL_HOST,
-            port=settings.EMAIL_PORT,
-            username=settings.EMAIL_HOST_USER,
-            password=settings.EMAIL_HOST_PASSWORD,
-            # use_ssl=settings.EMAIL_USE_SSL
-            use_tls=settings.EMAIL_USE_TLS
-        ) as connection:
-            try:
-                user = payout.investment.user
-                plan_name = payout.investment.plan.get_name_display()
-                
-                subject = f'Investment Payout Received - {plan_name}'
-                message = f'''
-    Dear {user.get_full_name() or user.username},
+    # ==========================================
+    # BULK MODE
+    # ==========================================
 
-    Your investment payout has been processed successfully.
+    def handle_bulk(self, process_date, chunk_size, dry_run=False):
+        """Set-based run: a fixed number of queries per chunk instead of per payout"""
+        started = time.monotonic()
 
-    Investment: {plan_name}
-    Payout Number: #{payout.payout_number} of {payout.investment.plan.total_payouts}
-    Amount Received: ₦{payout.total_amount:,.2f}
-    Principal: ₦{payout.principal_amount:,.2f}
-    Returns: ₦{payout.return_amount:,.2f}
-    Date: {payout.processed_date.strftime("%d %B, %Y")}
+        payout_ids = list(InvestmentPayout.objects.filter(
+            status='scheduled',
+            scheduled_date__gte=_day_start(process_date),
+            scheduled_date__lt=_day_start(process_date + timedelta(days=1)),
+            investment__status='active'
+        ).order_by('scheduled_date', 'id').values_list('id', flat=True))
 
-    Reference: {payout.payment_reference}
+        if not payout_ids:
+            self.stdout.write(self.style.WARNING('No payouts due for processing.'))
+            return
 
-    Thank you for investing with Krysline Agency.
+        self.stdout.write(f'Found {len(payout_ids)} payouts to process in chunks of {chunk_size}')
 
-    Best regards,
-    Krysline Agency Team
-                '''
-                
-                # send_mail(
-                #     subject=subject,
-                #     message=message,
-                #     from_email=email,
-                #     recipient_list=[f"{user.email}", ],
-                #     fail_silently=True,
-                # )
-                EmailMessage(subject, message, email, [f"{user.email}", ], connection=connection).send(fail_silently=True,)
-                print("Payout Notificate sent")
+        processed = 0
+        failed = 0
+        paid_out = Decimal('0')
+
+        for start in range(0, len(payout_ids), chunk_size):
+            chunk = payout_ids[start:start + chunk_size]
+            try:
+                payouts = self.process_payout_chunk(chunk, dry_run)
             except Exception as e:
+                failed += len(chunk)
                 self.stdout.write(
-                    self.style.WARNING(f'Failed to send notification: {str(e)}')
+                    self.style.ERROR(f'Failed to process chunk starting at {start}: {str(e)}')
                 )
+                continue
+
+            processed += len(payouts)
+            failed += len(chunk) - len(payouts)
+            paid_out += sum((payout.total_amount for payout in payouts), Decimal('0'))
+            self.stdout.write(f'  Chunk {start // chunk_size + 1}: {len(payouts)} payouts')
+
+        completed = self.update_investment_statuses(dry_run)
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else processed
+
+        # Summary
+        self.stdout.write(self.style.MIGRATE_HEADING('Processing Summary'))
+        self.stdout.write(f'Date: {process_date}')
+        self.stdout.write(f'Payouts processed: {processed}')
+        self.stdout.write(f'Payouts failed: {failed}')
+        self.stdout.write(f'Amount paid out: ₦{paid_out:,.2f}')
+        self.stdout.write(f'Investments completed: {completed}')
+        self.stdout.write(f'Elapsed: {elapsed:.2f}s ({rate:,.1f} payouts/s)')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN - No changes made'))
+
+    @transaction.atomic
+    def process_payout_chunk(self, payout_ids, dry_run=False):
+        """Completes one chunk of payouts; returns the payouts actually processed"""
+        # 1. Lock the rows; anything already handled by a parallel run drops out here
+        payouts = list(InvestmentPayout.objects.select_for_update(of=('self',)).filter(
+            id__in=payout_ids,
+            status='scheduled',
+            investment__status='active'
+        ).select_related('investment__user__profile', 'investment__plan'))
+
+        if dry_run or not payouts:
+            return payouts
+
+        # 2. Payout rows: one bulk UPDATE
+        now = timezone.now()
+        per_investment = defaultdict(lambda: [Decimal('0'), 0])
+        per_profile = defaultdict(Decimal)
+
+        for payout in payouts:
+            payout.status = InvestmentPayout.PayoutStatus.COMPLETED
+            payout.processed_date = now
+            payout.updated_at = now
+            payout.payment_reference = f'AUTO-{now.strftime("%Y%m%d%H%M%S")}-{payout.id}'
+
+            per_investment[payout.investment_id][0] += payout.total_amount
+            per_investment[payout.investment_id][1] += 1
+            per_profile[payout.investment.user.profile.pk] += payout.total_amount
+
+        InvestmentPayout.objects.bulk_update(
+            payouts, ['status', 'processed_date', 'payment_reference', 'updated_at']
+        )
+
+        # 3. Investment totals: one UPDATE with per-row F() increments
+        Investment.objects.filter(pk__in=per_investment).update(
+            total_paid_out=F('total_paid_out') + Case(
+                *[When(pk=pk, then=Value(amount)) for pk, (amount, _) in per_investment.items()],
+                output_field=DecimalField(max_digits=15, decimal_places=2)
+            ),
+            payouts_completed=F('payouts_completed') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, (_, count) in per_investment.items()],
+                output_field=IntegerField()
+            ),
+            updated_at=now,
+        )
+
+        # 4. Withdrawable balances: one UPDATE for every investor in the chunk
+        apply_balance_deltas(per_profile)
+
+        # 5. Emails go to the outbox in the same transaction
+        queue_emails(
+            [(*self.payout_email(payout), [payout.investment.user.email]) for payout in payouts],
+            from_email=email
+        )
+
+        return payouts
+
+    def send_payout_notification(self, payout):
+        """Queue the payout email; send_queued_emails delivers it"""
+        user = payout.investment.user
+        subject, message = self.payout_email(payout)
+        queue_email(subject, message, [user.email], from_email=email)
 
     def send_completion_notification(self, investment):
         """Send investment completion notification"""
@@ -243,14 +334,35 @@ Best regards,
 Krysline Agency Team
             '''
             
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=email,
-                recipient_list=[user.email],
-                fail_silently=True,
-            )
+            queue_email(subject, message, [user.email], from_email=email)
         except Exception as e:
             self.stdout.write(
-                self.style.WARNING(f'Failed to send completion notification: {str(e)}')
-            )
\ No newline at end of file
+                self.style.WARNING(f'Failed to queue completion notification: {str(e)}')
+            )
+
+    def payout_email(self, payout):
+        """Subject and body of the payout notification"""
+        user = payout.investment.user
+        plan_name = payout.investment.plan.get_name_display()
+
+        subject = f'Investment Payout Received - {plan_name}'
+        message = f'''
+    Dear {user.get_full_name() or user.username},
+
+    Your investment payout has been processed successfully.
+
+    Investment: {plan_name}
+    Payout Number: #{payout.payout_number} of {payout.investment.plan.total_payouts}
+    Amount Received: ₦{payout.total_amount:,.2f}
+    Principal: ₦{payout.principal_amount:,.2f}
+    Returns: ₦{payout.return_amount:,.2f}
+    Date: {payout.processed_date.strftime("%d %B, %Y")}
+
+    Reference: {payout.payment_reference}
+
+    Thank you for investing with Krysline Agency.
+
+    Best regards,
+    Krysline Agency Team
+        '''
+        return subject, message
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0003_alter_investmentplan_payout_frequency_months'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investmentpayout',
+            index=models.Index(fields=['status', 'scheduled_date'], name='base_invest_status_cab939_idx'),
+        ),
+    ]
@@ -319,6 +319,10 @@ class InvestmentPayout(models.Model):
     class Meta:
         ordering = ['investment', 'payout_number']
         unique_together = ['investment', 'payout_number']
+        indexes = [
+            # Due/upcoming payout sweeps (process_payouts, check_upcoming_payouts)
+            models.Index(fields=['status', 'scheduled_date']),
+        ]
 
     def __str__(self):
         return f"{self.investment.reference_code} - Payout #{self.payout_number}"
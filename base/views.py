@@ -12,6 +12,7 @@ from users.models import Withdrawal
 from security.decorators import rate_limit, get_client_ip, log_security_event, logger
 from .models import InvestmentPlan, Investment, InvestmentStatus, InvestmentPayout
 from affiliation.models import AffiliatePackage
+from affiliation.services import commission_schedules
 from authentication.forms import AffiliateRegistrationForm
 from security.security_utils import *
 from authentication.token import email_verification_token
@@ -21,16 +22,17 @@ import requests
 from django.core.mail import EmailMessage
 # Email Require
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from users.services import queue_email
 from authentication.models import User
 
 # Create your views here.
 
 
 def package(request):
-    packages = AffiliatePackage.objects.all().order_by('price')
+    # Precompiled schedules, already ordered by price
+    packages = list(commission_schedules().values())
 
     context = {
         "packages": packages
@@ -83,10 +85,8 @@ def register(request):
 
                     text_content = strip_tags(message)
 
-                    email = EmailMultiAlternatives(subject, text_content, to=[user.email])
-                    # email = EmailMessage(subject, message, to=[user.email])
-                    email.attach_alternative(message, 'text/html')
-                    email.send()
+                    # Queued in this transaction; send_queued_emails delivers it
+                    queue_email(subject, text_content, [user.email], html_body=message)
                     
                     # Log success
                     logger.info("registration_successful", user=user.email)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class KryslineAdminConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'krysline_admin'
+
+    def ready(self):
+        import krysline_admin.signals
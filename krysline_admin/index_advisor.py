@@ -0,0 +1,261 @@
+"""
+Index advisor: replays the hot ORM queries of the views and commands through
+EXPLAIN and proposes the composite/partial indexes the slow ones are missing.
+Run via: python manage.py advise_indexes
+
+HOT_QUERIES is the catalogue. When a view or command gains (or changes) a
+query on a large table, add or update its entry here, next to the index that
+should serve it, so the advisor keeps matching the code.
+"""
+
+import re
+from datetime import timedelta
+from django.db import connection, models
+from django.db.models import Q
+from django.db.migrations import Migration
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.writer import MigrationWriter
+from django.utils import timezone
+from affiliation.models import Affiliate, CommissionLog, PlacementPath, PropertyTransaction
+from base.models import InvestmentPayout
+from ledger.models import FinancialEntry
+from users.models import Notification, Transaction, Withdrawal
+
+# Placeholder key used where the real query filters on one user/profile;
+# EXPLAIN plans the same whether or not the row exists
+SAMPLE_PK = 1
+
+
+class HotQuery:
+    """A catalogued query, where it runs, and the index that should serve it."""
+
+    def __init__(self, name, source, build, index=None):
+        self.name = name
+        self.source = source
+        self.build = build
+        self.index = index
+
+
+def _today_start():
+    return timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+HOT_QUERIES = [
+    # users
+    HotQuery(
+        'latest_commissions', 'users.views.dashboard',
+        lambda: CommissionLog.objects.filter(recipient_profile_id=SAMPLE_PK).order_by('-created_at')[:10],
+        models.Index(fields=['recipient_profile', 'created_at']),
+    ),
+    HotQuery(
+        'transaction_history', 'users.views.transaction_history',
+        lambda: Transaction.objects.filter(user_id=SAMPLE_PK).order_by('-timestamp', '-id')[:51],
+        models.Index(fields=['user', 'timestamp']),
+    ),
+    HotQuery(
+        'withdraw_history', 'users.views.withdraw_history',
+        lambda: Withdrawal.objects.filter(user_id=SAMPLE_PK).order_by('-created_at', '-id')[:51],
+        models.Index(fields=['user', 'created_at']),
+    ),
+    HotQuery(
+        'notification_inbox', 'users.services.notification_inbox',
+        lambda: Notification.objects.filter(user_id=SAMPLE_PK, is_read=False).order_by('is_read', '-created_at', '-id')[:11],
+        models.Index(fields=['user', 'is_read', '-created_at', '-id']),
+    ),
+    HotQuery(
+        'purge_read_notifications', 'users.services.purge_read_notifications',
+        lambda: Notification.objects.filter(
+            is_read=True, created_at__lt=timezone.now() - timedelta(days=90)
+        ).order_by('created_at')[:1000],
+        models.Index(fields=['created_at'], condition=Q(is_read=True), name='notification_read_idx'),
+    ),
+    HotQuery(
+        'expired_subscriptions', 'users.utils.check_expired_subscriptions',
+        lambda: Affiliate.objects.filter(is_active=True, duration__lt=timezone.now()).values_list('id', flat=True)[:1000],
+        models.Index(fields=['is_active', 'duration']),
+    ),
+    # affiliation
+    HotQuery(
+        'open_placement_slots', 'affiliation.services.place_affiliate',
+        lambda: PlacementPath.objects.filter(
+            ancestor_id=SAMPLE_PK, descendant__child_count__lt=3
+        ).order_by('depth', 'descendant_id').values_list('descendant_id', flat=True)[:20],
+        models.Index(fields=['ancestor', 'depth', 'descendant']),
+    ),
+    # krysline_admin
+    HotQuery(
+        'all_transaction', 'krysline_admin.views.transaction_history',
+        lambda: Transaction.objects.select_related('user').order_by('-timestamp', '-id')[:51],
+        models.Index(fields=['timestamp']),
+    ),
+    HotQuery(
+        'pending_withdrawal', 'krysline_admin.views.pending_withdrawal',
+        # One seek per status (users.pagination.merged_keyset_page)
+        lambda: Withdrawal.objects.filter(status='pending').order_by('-created_at', '-id')[:51],
+        models.Index(fields=['status', 'created_at']),
+    ),
+    HotQuery(
+        'unverified_property', 'krysline_admin.views.unverified_property',
+        lambda: PropertyTransaction.objects.filter(is_verified=False),
+        models.Index(fields=['created_at'], condition=Q(is_verified=False), name='property_unverified_idx'),
+    ),
+    HotQuery(
+        'today_payouts', 'krysline_admin.views.admin_investment_list',
+        lambda: InvestmentPayout.objects.filter(
+            scheduled_date__gte=_today_start(), scheduled_date__lt=_today_start() + timedelta(days=1),
+            status='scheduled'
+        ).values('status').order_by(),
+        models.Index(fields=['status', 'scheduled_date']),
+    ),
+    # ledger
+    HotQuery(
+        'open_day_totals', 'ledger.services.range_totals',
+        lambda: FinancialEntry.objects.filter(timestamp__gte=_today_start()).values('entry_type').order_by(),
+        models.Index(fields=['timestamp', 'id']),
+    ),
+    # base (investments)
+    HotQuery(
+        'due_payouts', 'base.management.commands.process_payouts',
+        lambda: InvestmentPayout.objects.filter(
+            status='scheduled',
+            scheduled_date__gte=_today_start(), scheduled_date__lt=_today_start() + timedelta(days=1),
+            investment__status='active'
+        ).order_by('scheduled_date', 'id').values_list('id', flat=True),
+        models.Index(fields=['status', 'scheduled_date']),
+    ),
+]
+
+
+# ==========================================
+# PLAN ANALYSIS
+# ==========================================
+
+# SQLite: "SCAN table [USING [COVERING] INDEX idx]"; PostgreSQL: "Seq Scan on table"
+_FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING)|Seq Scan on (\w+)')
+_INDEX_SCAN = re.compile(r'\bSCAN (\w+) USING (?:COVERING )?INDEX (\w+)')
+_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+class QueryReport:
+    """EXPLAIN outcome for one HotQuery."""
+
+    def __init__(self, query, plan, problems, proposal=None):
+        self.query = query
+        self.plan = plan
+        self.problems = problems
+        self.proposal = proposal
+
+    @property
+    def ok(self):
+        return not self.problems
+
+
+def _index_fields(index):
+    return [field.lstrip('-') for field in index.fields]
+
+
+def _index_name(model, index):
+    if index.name:
+        return index.name
+    index = index.clone()
+    index.set_name_with_model(model)
+    return index.name
+
+
+def existing_index_prefixes(model):
+    """Column lists of every index the model already has (Meta.indexes, unique sets, FKs, db_index)."""
+    prefixes = []
+    for index in model._meta.indexes:
+        prefixes.append((_index_fields(index), index.condition))
+    for fields in model._meta.unique_together:
+        prefixes.append((list(fields), None))
+    for field in model._meta.local_fields:
+        if field.primary_key or field.unique or field.db_index:
+            prefixes.append(([field.name], None))
+    return prefixes
+
+
+def has_index(model, index):
+    """True if an existing index starts with `index`'s columns (and condition, for partial ones)."""
+    wanted = _index_fields(index)
+    for fields, condition in existing_index_prefixes(model):
+        if fields[:len(wanted)] == wanted and (index.condition is None or condition == index.condition):
+            return True
+    return False
+
+
+def analyse(query):
+    """Runs EXPLAIN on one catalogued query and flags full scans and top-N sorts."""
+    queryset = query.build()
+    plan = queryset.explain()
+    limited = queryset.query.high_mark is not None
+    problems = []
+
+    for match in _FULL_SCAN.finditer(plan):
+        problems.append(f"full scan of {match.group(1) or match.group(2)}")
+    if not limited:
+        # Walking a whole index is only fine when a LIMIT stops it early,
+        # or when it is the (partial) index meant for this query
+        expected = _index_name(queryset.model, query.index) if query.index is not None else None
+        for match in _INDEX_SCAN.finditer(plan):
+            if match.group(2) != expected:
+                problems.append(f"full index scan of {match.group(1)}")
+    if limited and _SORT.search(plan):
+        problems.append("sorts every matching row to return the first few")
+
+    proposal = None
+    if problems and query.index is not None and not has_index(queryset.model, query.index):
+        proposal = (queryset.model, query.index)
+    elif problems and query.index is not None:
+        problems.append(
+            "a matching index exists but the planner can't use it here "
+            "(e.g. a bare boolean filter, an IN list before the ORDER BY column, or stale statistics)"
+        )
+
+    return QueryReport(query, plan, problems, proposal)
+
+
+def run_advisor(queries=None):
+    """Analyses every catalogued query. Returns (reports, {model: [Index, ...]})."""
+    reports = [analyse(query) for query in (queries or HOT_QUERIES)]
+
+    proposals = {}
+    for report in reports:
+        if report.proposal is None:
+            continue
+        model, index = report.proposal
+        wanted = (_index_fields(index), index.condition)
+        if all((_index_fields(i), i.condition) != wanted for i in proposals.get(model, [])):
+            proposals.setdefault(model, []).append(index)
+    return reports, proposals
+
+
+# ==========================================
+# MIGRATION PROPOSAL
+# ==========================================
+
+def proposed_migrations(proposals, name='hot_query_indexes'):
+    """
+    One MigrationWriter per app with an AddIndex for every proposed index,
+    numbered after (and depending on) the app's current leaf migration.
+    """
+    loader = MigrationLoader(connection, ignore_no_migrations=True)
+    per_app = {}
+    for model, indexes in proposals.items():
+        per_app.setdefault(model._meta.app_label, []).append((model, indexes))
+
+    writers = []
+    for app_label, entries in sorted(per_app.items()):
+        leaves = loader.graph.leaf_nodes(app_label)
+        number = max((int(leaf[1].split('_')[0]) for leaf in leaves if leaf[1][:4].isdigit()), default=0) + 1
+
+        migration = Migration(f"{number:04d}_{name}", app_label)
+        migration.dependencies = leaves
+        for model, indexes in entries:
+            for index in indexes:
+                index = index.clone()
+                index.name = _index_name(model, index)
+                migration.operations.append(AddIndex(model_name=model._meta.model_name, index=index))
+        writers.append(MigrationWriter(migration))
+    return writers
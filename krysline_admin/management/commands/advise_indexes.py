@@ -0,0 +1,76 @@
+"""
+Management command to check the hot queries against the current schema.
+Run via: python manage.py advise_indexes              (report + proposed migration on stdout)
+Or:      python manage.py advise_indexes --write      (write the proposed migrations to disk)
+
+Every query in krysline_admin.index_advisor.HOT_QUERIES goes through EXPLAIN
+(EXPLAIN QUERY PLAN on SQLite). Full scans and top-N sorts are flagged, and
+the missing indexes come out as AddIndex migrations. Add the same
+models.Index lines to each model's Meta.indexes, or the next makemigrations
+will try to drop them again. Plans depend on table statistics: run it against
+a production-sized copy for PostgreSQL/MySQL.
+"""
+
+import os
+from django.core.management.base import BaseCommand
+from django.db import connection
+from krysline_admin.index_advisor import run_advisor, proposed_migrations
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the catalogued hot queries, flag full scans and propose missing indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--write', action='store_true',
+            help="Write the proposed migrations into each app's migrations folder"
+        )
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Print the full query plan of every query, not just the flagged ones'
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Exit with an error if any index is missing (for CI)'
+        )
+
+    def handle(self, *args, **options):
+        reports, proposals = run_advisor()
+
+        # 1. Per-query verdicts
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Hot queries on {connection.vendor}'))
+        for report in reports:
+            label = f'{report.query.name} ({report.query.source})'
+            if report.ok:
+                self.stdout.write(f'  {self.style.SUCCESS("OK")}    {label}')
+            else:
+                self.stdout.write(f'  {self.style.ERROR("SLOW")}  {label}')
+                for problem in report.problems:
+                    self.stdout.write(f'        - {problem}')
+            if options['plans'] or not report.ok:
+                for line in report.plan.splitlines():
+                    self.stdout.write(f'          {line}')
+
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('No missing indexes.'))
+            return
+
+        # 2. What to add to the models
+        self.stdout.write(self.style.MIGRATE_HEADING('Missing indexes (add to Meta.indexes)'))
+        for model, indexes in proposals.items():
+            self.stdout.write(f'  {model._meta.label}:')
+            for index in indexes:
+                self.stdout.write(f'      {index!r}')
+
+        # 3. The migration that creates them
+        for writer in proposed_migrations(proposals):
+            if options['write']:
+                with open(writer.path, 'w') as f:
+                    f.write(writer.as_string())
+                self.stdout.write(self.style.SUCCESS(f'Wrote {os.path.relpath(writer.path)}'))
+            else:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'Proposed {os.path.relpath(writer.path)}'))
+                self.stdout.write(writer.as_string())
+
+        if options['strict']:
+            raise SystemExit(1)
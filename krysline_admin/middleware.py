@@ -0,0 +1,59 @@
+import time
+from django.conf import settings
+from django.db import connection
+from security.decorators import logger
+from .services import record_view_profile, query_budget_for, QueryBudgetExceeded
+
+
+class _QueryCounter:
+    """connection.execute_wrapper hook that counts queries and their time."""
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+
+class QueryProfilingMiddleware:
+    """
+    Records query count, DB time and total time per resolved view
+    (see krysline_admin.services.view_profile_report).
+    Views listed in settings.QUERY_BUDGETS are checked against their budget:
+    overruns are logged, and raise QueryBudgetExceeded when
+    QUERY_BUDGET_STRICT is on (use it in tests to catch N+1 regressions).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_PROFILING', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        # Static files, 404s and anything else that didn't resolve to a view
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+
+        view_name = match.view_name or match._func_path
+        record_view_profile(view_name, counter.count, counter.db_ms, total_ms, response.status_code)
+
+        budget = query_budget_for(view_name)
+        if budget is not None and counter.count > budget:
+            logger.warning("query_budget_exceeded", view=view_name, queries=counter.count, budget=budget)
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(f"{view_name} ran {counter.count} queries (budget {budget})")
+
+        return response
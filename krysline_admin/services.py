@@ -0,0 +1,169 @@
+import threading
+from collections import deque, defaultdict
+from django.conf import settings
+from django.db.models import Sum, Count, Q
+from authentication.models import User
+from affiliation.models import AffiliatePackage, Affiliate, PropertyTransaction
+from users.models import Withdrawal, Transaction
+from users.pagination import keyset_page, parse_cursor
+from ledger.models import Expense
+from project.cache import VersionedLocalCache
+
+
+# Signals bump the snapshot's version on every write, and every worker sees
+# the bump through the shared cache; the timeout only bounds how stale a
+# copy can get if a bump is lost (writes that bypass the signals)
+KPI_CACHE_TIMEOUT = 60 * 10
+
+RECENT_TRANSACTIONS_PAGE_SIZE = 20
+
+
+# ==========================================
+# KPI SNAPSHOT
+# ==========================================
+
+def compute_kpi_snapshot():
+    """
+    Aggregates the manager dashboard figures straight from the database.
+    One grouped query per table, independent of how many rows they hold.
+    """
+    users = User.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        unverified_email=Count('id', filter=Q(verified_email=False)),
+    )
+    withdrawals = Withdrawal.objects.aggregate(
+        approved=Sum('amount', filter=Q(status='approved')),
+        pending=Sum('amount', filter=Q(status='pending')),
+    )
+    total_expenses = Expense.objects.filter(
+        status='approved').aggregate(total=Sum('amount'))['total'] or 0
+    total_package_income = Affiliate.objects.filter(
+        is_active=True).aggregate(total=Sum('package__price'))['total'] or 0
+    properties = PropertyTransaction.objects.aggregate(
+        total=Count('id'),
+        verified_amount=Sum('amount', filter=Q(is_verified=True)),
+    )
+    total_packages = AffiliatePackage.objects.filter(is_active=True).count()
+
+    total_withdrawal = withdrawals['approved'] or 0
+    total_property_sale = properties['verified_amount'] or 0
+    outflow = total_withdrawal + total_expenses
+    total_income = total_package_income + total_property_sale
+
+    return {
+        'total_users': users['total'],
+        'active_users': users['active'],
+        'unverified_email': users['unverified_email'],
+        'total_packages': total_packages,
+        'total_withdrawal': total_withdrawal,
+        'pending_withdrawal': withdrawals['pending'] or 0,
+        'total_expenses': total_expenses,
+        'totalPackageIncome': total_package_income,
+        'totalPropertySale': total_property_sale,
+        'total_property': properties['total'],
+        'total_income': total_income,
+        'outflow': outflow,
+        'net_balance': total_income - outflow,
+    }
+
+
+_kpi_snapshot = VersionedLocalCache('kpi_snapshot', compute_kpi_snapshot, timeout=KPI_CACHE_TIMEOUT)
+
+
+def get_kpi_snapshot():
+    """
+    Returns the KPI snapshot, served from process memory and recomputed
+    once its version moves (see project.cache.VersionedLocalCache).
+    """
+    return _kpi_snapshot.get()
+
+
+def invalidate_kpi_snapshot():
+    """
+    Every process recomputes the snapshot once the current transaction
+    commits, so a rolled-back write never leaves the dashboard stale.
+    """
+    _kpi_snapshot.invalidate()
+
+
+# ==========================================
+# RECENT TRANSACTIONS FEED
+# ==========================================
+
+def recent_transactions(before=None, limit=RECENT_TRANSACTIONS_PAGE_SIZE):
+    """
+    Newest-first slice of the transaction ledger.
+    `before` is the (timestamp, id) of the last row already shown (see
+    users.pagination.keyset_page). Returns (rows, next_cursor) where
+    next_cursor is None on the last page.
+    """
+    queryset = Transaction.objects.select_related('user__affiliate_record__package')
+    return keyset_page(queryset, 'timestamp', before=before, limit=limit)
+
+
+# 'timestamp_id' cursors, shared with the other keyset-paginated views
+parse_transaction_cursor = parse_cursor
+
+
+# ==========================================
+# QUERY PROFILING
+# ==========================================
+
+# Requests kept per process by QueryProfilingMiddleware (oldest fall off)
+QUERY_PROFILE_BUFFER_SIZE = getattr(settings, 'QUERY_PROFILE_BUFFER_SIZE', 5000)
+
+_view_profiles = deque(maxlen=QUERY_PROFILE_BUFFER_SIZE)
+_view_profiles_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries than its QUERY_BUDGETS entry allows (strict mode only)."""
+
+
+def query_budget_for(view_name):
+    """Max queries allowed for a view, from settings.QUERY_BUDGETS, or None."""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def record_view_profile(view_name, queries, db_ms, total_ms, status):
+    with _view_profiles_lock:
+        _view_profiles.append((view_name, queries, db_ms, total_ms, status))
+
+
+def reset_view_profiles():
+    with _view_profiles_lock:
+        _view_profiles.clear()
+
+
+def view_profile_report(order_by='max_queries', limit=50):
+    """
+    Per-view rollup of the profiled requests held by this process, worst first.
+    `order_by` is any numeric key of the rows, e.g. 'max_queries' or 'avg_total_ms'.
+    """
+    with _view_profiles_lock:
+        samples = list(_view_profiles)
+
+    grouped = defaultdict(list)
+    for view_name, queries, db_ms, total_ms, status in samples:
+        grouped[view_name].append((queries, db_ms, total_ms))
+
+    rows = []
+    for view_name, hits in grouped.items():
+        queries = [h[0] for h in hits]
+        totals = sorted(h[2] for h in hits)
+        budget = query_budget_for(view_name)
+        rows.append({
+            'view': view_name,
+            'hits': len(hits),
+            'avg_queries': sum(queries) / len(hits),
+            'max_queries': max(queries),
+            'avg_db_ms': sum(h[1] for h in hits) / len(hits),
+            'avg_total_ms': sum(totals) / len(hits),
+            'p95_total_ms': totals[min(int(len(totals) * 0.95), len(totals) - 1)],
+            'budget': budget,
+            'over_budget': sum(1 for q in queries if budget is not None and q > budget),
+        })
+
+    rows.sort(key=lambda row: (row['over_budget'], row[order_by]), reverse=True)
+    return rows[:limit]
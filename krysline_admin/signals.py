@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from authentication.models import User
+from affiliation.models import AffiliatePackage, Affiliate, PropertyTransaction
+from users.models import Withdrawal
+from ledger.models import Expense
+from .services import invalidate_kpi_snapshot
+
+
+# Fields on User that feed the dashboard counters
+USER_KPI_FIELDS = {'is_active', 'verified_email'}
+
+
+@receiver(post_save, sender=User)
+def refresh_kpis_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    """Skips routine saves such as the last_login bump on every sign-in."""
+    if created or update_fields is None or USER_KPI_FIELDS & set(update_fields):
+        invalidate_kpi_snapshot()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Withdrawal)
+@receiver(post_delete, sender=Withdrawal)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Affiliate)
+@receiver(post_delete, sender=Affiliate)
+@receiver(post_save, sender=PropertyTransaction)
+@receiver(post_delete, sender=PropertyTransaction)
+@receiver(post_save, sender=AffiliatePackage)
+@receiver(post_delete, sender=AffiliatePackage)
+def refresh_kpis(sender, **kwargs):
+    """Any write to a table behind the manager dashboard drops the cached snapshot."""
+    invalidate_kpi_snapshot()
@@ -1,32 +1,34 @@
 from django import template
-from affiliation.models import AffiliatePackage
-from ledger.models import FinancialEntry
 from decimal import Decimal
 import math
-packages = AffiliatePackage.objects.all()
 
 register = template.Library()
 
 
 @register.filter
 def package_name(value):
+    if value is None:
+        return ''
     return f"{value.name}".capitalize()
 
 
 @register.filter
 def package_price(value):
+    if value is None:
+        return Decimal('0')
     return value.price
 
 
 @register.filter
 def package_income(value):
-    total = 0
-    package = value.members.all()
-    for amount in package:
-        total += int(amount.package.price)
-
-    total = Decimal(str(total))
-    return (total)
+    """Revenue of a package: price x members. Reads the package_revenue_stats() annotation."""
+    if value is None:
+        return Decimal('0')
+    revenue = getattr(value, 'revenue', None)
+    if revenue is None:
+        # Not annotated: one COUNT instead of walking every member
+        revenue = value.price * value.members.count()
+    return Decimal(revenue)
 
 
 @register.filter
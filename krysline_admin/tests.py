@@ -1,3 +1,145 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from affiliation.models import Affiliate, AffiliatePackage, CommissionLog
+from authentication.models import User
+from base.models import Investment, InvestmentPlan
+from ledger.models import Expense, FinancialEntry
+from ledger.services import post_many
+from users.models import Notification, Transaction, Withdrawal
+from project.cache import VersionedLocalCache, shared_cache
+from .index_advisor import HOT_QUERIES, analyse
+from .services import QueryBudgetExceeded, compute_kpi_snapshot, get_kpi_snapshot, invalidate_kpi_snapshot
 
-# Create your tests here.
+# Rows per list, enough that a per-row query would blow every budget
+ROWS = 12
+
+
+def make_user(n, **extra):
+    return User.objects.create_user(
+        email=f"user{n}@example.com", password="pw", username=f"user{n}",
+        first_name="User", last_name=str(n), is_active=True, **extra
+    )
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, AUDIT_LOG_BUFFERED=False)
+class QueryBudgetTests(TestCase):
+    """Every budgeted view must stay within settings.QUERY_BUDGETS with realistic data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        package = AffiliatePackage.objects.create(
+            name='PROFESSIONAL', price=Decimal('200000'), generations=3,
+            commissions={'1': 10, '2': 5, '3': 2}
+        )
+        plan = InvestmentPlan.objects.create(
+            name='basic', slug='basic', min_amount=Decimal('100000'), duration_months=12,
+            payout_frequency_months=3, total_payouts=4, roi_percentage=Decimal('20')
+        )
+
+        cls.manager = make_user(0, user_type='manager', is_staff=True)
+        cls.affiliate = make_user(1)
+        downline = [make_user(n) for n in range(2, ROWS + 2)]
+        for user in [cls.manager, cls.affiliate, *downline]:
+            Affiliate.objects.filter(user=user).update(
+                package=package, is_active=True, duration=timezone.now() + timedelta(days=30)
+            )
+        for user in downline:
+            user.profile.referrer = cls.affiliate.profile
+            user.profile.save()
+
+        for i, user in enumerate(downline):
+            Transaction.objects.create(user=cls.affiliate, amount=Decimal('1000'), transaction_type='commission')
+            Transaction.objects.create(user=user, amount=Decimal('500'), transaction_type='deposit')
+            Withdrawal.objects.create(user=user, amount=Decimal('5000'), status='pending' if i % 2 else 'approved')
+            Withdrawal.objects.create(user=cls.affiliate, amount=Decimal('2000'))
+            CommissionLog.objects.create(
+                recipient_profile=cls.affiliate.profile, source_user=user, amount=Decimal('100'), generation=1
+            )
+            Notification.create_notification(user=cls.affiliate, title=f"Note {i}", message="Hello")
+            Investment.objects.create(user=user, plan=plan, amount=Decimal('150000'))
+            Investment.objects.create(user=cls.affiliate, plan=plan, amount=Decimal('150000'))
+            Expense.objects.create(recorded_by=cls.manager, category='office', amount=Decimal('300'), description='Rent')
+
+        post_many([
+            FinancialEntry(
+                actor=user, entry_type='inflow', category='other', amount=Decimal('10'),
+                description='Test inflow', reference_id=f"TEST-{user.pk}"
+            )
+            for user in downline
+        ])
+
+    def get(self, user, name, *args):
+        self.client.force_login(user)
+        response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200, f"{name} answered {response.status_code}")
+        return response
+
+    def test_affiliate_views(self):
+        for name in ('dashboard', 'transaction_history', 'withdraw_history', 'referral_list', 'notifications'):
+            with self.subTest(view=name):
+                self.get(self.affiliate, name)
+
+    def test_investment_views(self):
+        for name in ('front_package', 'investment_plans', 'my_investments'):
+            with self.subTest(view=name):
+                self.get(self.affiliate, name)
+
+    def test_manager_views(self):
+        for name in (
+            'krysline_admin', 'recent_transactions_feed', 'all_transaction', 'all_pending_withdrawal',
+            'all_approved_withdrawal', 'admin_investment_list', 'admin_plan_list',
+            'inventory_report', 'ledger_trend', 'all_expenses',
+        ):
+            with self.subTest(view=name):
+                self.get(self.manager, name)
+        self.get(self.manager, 'user_downline', self.affiliate.pk)
+
+    def test_overrun_is_caught(self):
+        with override_settings(QUERY_BUDGETS={'transaction_history': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.get(self.affiliate, 'transaction_history')
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_overrun_only_logs_when_not_strict(self):
+        with override_settings(QUERY_BUDGETS={'transaction_history': 1}):
+            self.get(self.affiliate, 'transaction_history')
+
+
+
+class KpiSnapshotTests(TestCase):
+
+    def setUp(self):
+        shared_cache.clear()
+        # Drop this process's copy left over from earlier tests
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_kpi_snapshot()
+        self.user = make_user(1)
+
+    def test_a_write_in_one_worker_reaches_the_others(self):
+        # Another worker's copy, checking its version on every read
+        other_worker = VersionedLocalCache('kpi_snapshot', compute_kpi_snapshot, check_interval=0)
+        self.assertEqual(other_worker.get()['pending_withdrawal'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Withdrawal.objects.create(user=self.user, amount=Decimal('5000'), status='pending')
+
+        self.assertEqual(other_worker.get()['pending_withdrawal'], Decimal('5000'))
+        self.assertEqual(get_kpi_snapshot()['pending_withdrawal'], Decimal('5000'))
+
+    def test_rolled_back_writes_keep_the_snapshot(self):
+        get_kpi_snapshot()
+        with self.captureOnCommitCallbacks(execute=False):
+            Withdrawal.objects.create(user=self.user, amount=Decimal('5000'), status='pending')
+        self.assertEqual(get_kpi_snapshot()['pending_withdrawal'], 0)
+
+
+class IndexAdvisorTests(TestCase):
+
+    def test_pending_withdrawals_are_read_in_index_order(self):
+        query = next(query for query in HOT_QUERIES if query.name == 'pending_withdrawal')
+        report = analyse(query)
+        self.assertTrue(report.ok, report.problems)
+        self.assertNotIn('TEMP B-TREE', report.plan)
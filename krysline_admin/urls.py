@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('dashboard/', views.home, name='krysline_admin'),
+    path('dashboard/transactions/feed/', views.recent_transactions_feed, name='recent_transactions_feed'),
+    path('dashboard/query-profile/', views.query_profile, name='query_profile'),
+    path('dashboard/users/<str:pk>/downline/', views.user_downline, name='user_downline'),
     path('All/Transactions/', views.transaction_history, name='all_transaction'),
     path('All/Withdrawal/approved/', views.withdrawal, name='all_approved_withdrawal'),
     path('All/Withdrawal/pending-or-rejected/', views.pending_withdrawal, name='all_pending_withdrawal'),
@@ -10,10 +10,14 @@ from django.db.models import Sum
 from django.contrib import messages as mg
 from .forms import *
 from .models import TransactionPIN
-from datetime import datetime
+from datetime import datetime, timedelta
 from monnify_verification.monnify_api import *
 from django.utils import timezone
-from affiliation.services import distribute_commissions
+from affiliation.services import verify_property_sales, package_revenue_stats, downline_stats, downline_members, DOWNLINE_CURSOR
+from users.services import credit_balance
+from users.utils import subscription_expiry
+from users.pagination import keyset_page, merged_keyset_page, parse_cursor, wants_json, keyset_json_response
+from .services import get_kpi_snapshot, recent_transactions, parse_transaction_cursor, view_profile_report, reset_view_profiles
 from ledger.models import Expense
 from django.conf import settings
 from base.models import *
@@ -52,53 +56,142 @@ def home(request):
         else:
             mg.error(request, 'PIN, Not matching, Try Again!')
 
-    total_income = 0
+    # 1. Headline figures come from the cached snapshot (no queries on a hit)
+    kpis = get_kpi_snapshot()
 
-    total_withdrawal = Withdrawal.objects.all().filter(
-        status="approved").aggregate(total=Sum('amount'))['total'] or 0
-    
-    total_expenses = Expense.objects.all().filter(
-        status="approved").aggregate(total=Sum('amount'))['total'] or 0
-    
-    pending_withdrawl = Withdrawal.objects.all().filter(
-        status="pending").aggregate(total=Sum('amount'))['total'] or 0
-    
-    totalPackageIncome = Affiliate.objects.all().filter(
-        is_active=True).aggregate(total=Sum("package__price"))['total'] or 0
-    
-    totalPropertySale = PropertyTransaction.objects.all().filter(
-        is_verified=True).aggregate(total=Sum('amount'))['total'] or 0
-
-    outflow = total_withdrawal + total_expenses
-    net_balance = totalPackageIncome + totalPropertySale - outflow
-    total_income = totalPackageIncome + totalPropertySale 
+    # 2. Package cards with members/revenue annotated in the same query
+    packages = list(package_revenue_stats()[:5])
+    packages += [None] * (5 - len(packages))
+    basic, standard, premium, professional, elite = packages
 
+    # 3. First page of the transaction feed; older pages load on demand
+    transactions, next_cursor = recent_transactions()
 
     context = {
-        'total_users': User.objects.all().count(),
-        'active_users': User.objects.all().filter(is_active=True).count(),
-        'unverified_email': User.objects.all().filter(verified_email=False).count(),
-        'total_packages': AffiliatePackage.objects.all().filter(is_active=True).count(),
-        'total_withdrawal': total_withdrawal,
-        'transactions': Transaction.objects.all(),
-        'pending_withdrawal': pending_withdrawl,
-        'total_income': total_income,
-        'basic': AffiliatePackage.objects.all()[0],
-        'standard': AffiliatePackage.objects.all()[1],
-        'premium': AffiliatePackage.objects.all()[2],
-        'professional': AffiliatePackage.objects.all()[3],
-        'elite': AffiliatePackage.objects.all()[4],
+        **kpis,
+        'transactions': transactions,
+        'transactions_next_cursor': next_cursor,
+        'basic': basic,
+        'standard': standard,
+        'premium': premium,
+        'professional': professional,
+        'elite': elite,
         'set_pin': set_pin,
-        'totalPackageIncome': totalPackageIncome,
-        'totalPropertySale': totalPropertySale,
-        'total_property': PropertyTransaction.objects.all().count(),
-        'outflow': outflow,
-        'total_expenses': total_expenses,
-        'net_balance': net_balance,
     }
     return render(request, 'krysline_admin/index.html', context)
 
 
+@login_required(login_url="login")
+@rate_limit("1000/hour")
+@staff_member_required
+def recent_transactions_feed(request):
+    """AJAX: next page of the dashboard transaction feed, older than ?before=<cursor>"""
+    if request.user.user_type != "manager":
+        return JsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
+
+    before = parse_transaction_cursor(request.GET.get('before'))
+    rows, next_cursor = recent_transactions(before=before)
+
+    data = []
+    for trans in rows:
+        affiliate = getattr(trans.user, 'affiliate_record', None)
+        data.append({
+            'user': trans.user.get_full_name(),
+            'package': affiliate.package.get_name_display() if affiliate and affiliate.package else '',
+            'amount': str(trans.amount),
+            'transaction_type': trans.transaction_type,
+            'transaction_type_display': trans.get_transaction_type_display(),
+            'timestamp': trans.timestamp.isoformat(),
+        })
+
+    return JsonResponse({
+        'success': True,
+        'next_cursor': next_cursor,
+        'transactions': data,
+    })
+
+
+@login_required(login_url="login")
+@rate_limit("1000/hour")
+@staff_member_required
+def user_downline(request, pk):
+    """
+    JSON: a user's downline per generation plus a page of members.
+    ?depth=N limits the generations, ?generation=N lists one generation,
+    ?after=<cursor> continues the member list.
+    """
+    if request.user.user_type != "manager":
+        return JsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
+
+    profile = get_object_or_404(UserProfile, user_id=pk)
+    depth = request.GET.get('depth')
+    generation = request.GET.get('generation')
+    max_depth = int(depth) if depth and depth.isdigit() else None
+    generation = int(generation) if generation and generation.isdigit() else None
+
+    stats = downline_stats(profile, max_depth=max_depth)
+    paths, next_cursor = downline_members(
+        profile,
+        max_depth=max_depth,
+        generation=generation,
+        after=parse_cursor(request.GET.get('after'), DOWNLINE_CURSOR),
+    )
+
+    members = []
+    for path in paths:
+        member = path.descendant.user
+        affiliate = getattr(member, 'affiliate_record', None)
+        members.append({
+            'user_id': member.id,
+            'name': member.get_full_name(),
+            'email': member.email,
+            'generation': path.depth,
+            'referrer_profile_id': path.descendant.referrer_id,
+            'package': affiliate.package.name if affiliate and affiliate.package else None,
+            'is_active': bool(affiliate and affiliate.is_active),
+            'joined': member.date_joined.isoformat(),
+        })
+
+    for gen in stats['generations']:
+        gen['commission'] = str(gen['commission'])
+    stats['total_commission'] = str(stats['total_commission'])
+
+    return JsonResponse({
+        'success': True,
+        **stats,
+        'members': members,
+        'next_cursor': next_cursor,
+    })
+
+
+PROFILE_SORT_KEYS = ('max_queries', 'avg_queries', 'avg_db_ms', 'avg_total_ms', 'p95_total_ms')
+
+
+@login_required(login_url="login")
+@rate_limit("1000/hour")
+@staff_member_required
+def query_profile(request):
+    """Worst views by query count / latency, from this worker's profiling buffer"""
+    if request.user.user_type != "manager":
+        return redirect('dashboard')
+
+    if request.method == 'POST':
+        reset_view_profiles()
+        mg.success(request, 'Profiling data cleared.')
+        return redirect('query_profile')
+
+    order_by = request.GET.get('sort')
+    if order_by not in PROFILE_SORT_KEYS:
+        order_by = 'max_queries'
+
+    context = {
+        'profiles': view_profile_report(order_by=order_by),
+        'sort': order_by,
+        'sort_keys': PROFILE_SORT_KEYS,
+    }
+    return render(request, 'krysline_admin/query-profile.html', context)
+
+
 @login_required(login_url="login")
 @rate_limit("1000/hour")
 @log_security_event(action="USER_PACKAGE_VIEW")
@@ -110,8 +203,6 @@ def view_user_package(request, pk):
 
     affiliate = get_object_or_404(Affiliate, id=pk)
     form = AffilliateForm(instance=affiliate)
-    duration = settings.DURATION
-
     if request.method == 'POST':
         form = AffilliateForm(request.POST, instance=affiliate)
         if form.is_valid():
@@ -119,7 +210,7 @@ def view_user_package(request, pk):
 
             update_affiliate = form.save(commit=False)
             update_affiliate.is_active = active
-            update_affiliate.duration = duration
+            update_affiliate.duration = subscription_expiry()
             update_affiliate.save()
 
             mg.success(request, 'User Package Updated Successfully!')
@@ -216,28 +307,78 @@ def delete_user(request, pk):
 
 
 @login_required(login_url="login")
+# Each page is one cheap keyset query; infinite scroll fetches many
 @rate_limit("5/hour")
 @log_security_event(action="TRANSACTION_VIEW")
 @staff_member_required
 def transaction_history(request):
-    transactions = Transaction.objects.all()
+    before = parse_cursor(request.GET.get('before'))
+    transactions, next_cursor = keyset_page(
+        Transaction.objects.select_related('user'), 'timestamp', before=before,
+        only=('id', 'amount', 'transaction_type', 'timestamp',
+              'user__first_name', 'user__last_name', 'user__username'),
+    )
+
+    if wants_json(request):
+        return keyset_json_response(transactions, next_cursor, lambda t: {
+            'id': t.id,
+            'user': t.user.get_full_name(),
+            'username': t.user.username,
+            'amount': str(t.amount),
+            'transaction_type': t.transaction_type,
+            'transaction_type_display': t.get_transaction_type_display(),
+            'timestamp': t.timestamp.isoformat(),
+        }, key='transactions')
 
     context = {
         "transactions": transactions,
+        "next_cursor": next_cursor,
+        "is_first_page": before is None,
     }
     return render(request, 'krysline_admin/transaction.html', context)
 
 
+def _withdrawal_page(request, statuses):
+    """Keyset page of withdrawals in `statuses`, shared by the approved and pending lists."""
+    before = parse_cursor(request.GET.get('before'))
+    withdrawals = Withdrawal.objects.select_related('user')
+    # One (status, created_at) index range per status; status IN (...) would sort every match
+    return before, merged_keyset_page(
+        [withdrawals.filter(status=status) for status in statuses], 'created_at', before=before,
+        only=('id', 'transaction_id', 'amount', 'status', 'created_at', 'processed_at',
+              'user__first_name', 'user__last_name', 'user__username'),
+    )
+
+
+def _withdrawal_json(withdraw):
+    return {
+        'id': withdraw.id,
+        'transaction_id': withdraw.transaction_id,
+        'user': withdraw.user.get_full_name(),
+        'username': withdraw.user.username,
+        'amount': str(withdraw.amount),
+        'status': withdraw.status,
+        'status_display': withdraw.get_status_display(),
+        'created_at': withdraw.created_at.isoformat(),
+        'processed_at': withdraw.processed_at.isoformat() if withdraw.processed_at else None,
+    }
+
+
 @login_required(login_url="login")
 @rate_limit("5/hour")
 @log_security_event(action="WITHDRAWAL_VIEW")
 @staff_member_required
 def withdrawal(request):
-    withdrawals = Withdrawal.objects.all().filter(status="approved")
+    before, (withdrawals, next_cursor) = _withdrawal_page(request, ["approved"])
+
+    if wants_json(request):
+        return keyset_json_response(withdrawals, next_cursor, _withdrawal_json, key='withdrawals')
 
     context = {
         'withdrawals': withdrawals,
-        'approved': True
+        'approved': True,
+        'next_cursor': next_cursor,
+        'is_first_page': before is None,
     }
     return render(request, 'krysline_admin/withdrawal.html', context)
 
@@ -247,13 +388,16 @@ def withdrawal(request):
 @log_security_event(action="WITHDRAWAL_VIEW")
 @staff_member_required
 def pending_withdrawal(request):
-    pending_withdrawal = Withdrawal.objects.all().filter(
-        status__in=["pending", "rejected"])
-    # print(withdrawals)
+    before, (pending_withdrawal, next_cursor) = _withdrawal_page(request, ["pending", "rejected"])
+
+    if wants_json(request):
+        return keyset_json_response(pending_withdrawal, next_cursor, _withdrawal_json, key='withdrawals')
 
     context = {
         'pending_withdrawals': pending_withdrawal,
-        'approved': False
+        'approved': False,
+        'next_cursor': next_cursor,
+        'is_first_page': before is None,
     }
     return render(request, 'krysline_admin/withdrawal.html', context)
 
@@ -473,16 +617,15 @@ def verify_property_transaction(request, pk):
     property = get_object_or_404(PropertyTransaction, id=pk)
     property_name = str(property.transaction_id)
 
-    with transaction.atomic():
-        property.is_verified = True
-        property.verified_by = request.user
-        property.verification_date = timezone.now()
-        property.save()
-
-        distribute_commissions(property=property)
+    # Skips sales that are already verified, so commissions are never paid twice
+    verified = verify_property_sales(
+        PropertyTransaction.objects.filter(id=property.id), request.user)
 
+    if verified:
         mg.success(request, f"{property_name} has been successfully Verfied!")
-        return redirect('properties')
+    else:
+        mg.info(request, f"{property_name} was already Verified.")
+    return redirect('properties')
 
 
 
@@ -531,8 +674,10 @@ def admin_investment_list(request):
     }
     
     # Today's payouts
+    today_start = timezone.make_aware(datetime.combine(date.today(), datetime.min.time()))
     today_payouts = InvestmentPayout.objects.filter(
-        scheduled_date__date=date.today(),
+        scheduled_date__gte=today_start,
+        scheduled_date__lt=today_start + timedelta(days=1),
         status='scheduled'
     ).aggregate(
         count=Count('id'),
@@ -717,8 +862,7 @@ def complete_payout(request, payout_id):
             investment.save(update_fields=['total_paid_out', 'payouts_completed'])
 
             # Update user account balance for withdrawing 
-            user.profile.balance += payout.total_amount
-            user.profile.save()
+            credit_balance(user.profile, payout.total_amount)
 
             # Update payout status
             # payout.status = InvestmentPayout.PayoutStatus.COMPLETED
@@ -1,15 +1,25 @@
 from django.contrib import admin
-from .models import FinancialEntry, Expense
+from .models import FinancialEntry, Expense, LedgerMonthlyRollup
+from krysline_admin.services import invalidate_kpi_snapshot
 from django.utils.html import format_html
 
 @admin.register(FinancialEntry)
 class FinancialEntryAdmin(admin.ModelAdmin):
     list_display = ('reference_id', 'entry_type', 'category', 'amount', 'actor', 'timestamp')
-    list_filter = ('entry_type', 'category', 'timestamp')
+    list_filter = ('entry_type', 'category', 'package', 'timestamp')
     search_fields = ('reference_id', 'description', 'actor__email')
     readonly_fields = ('timestamp',) # Cannot edit the time of a transaction
 
 
+@admin.register(LedgerMonthlyRollup)
+class LedgerMonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('month', 'entry_type', 'category', 'total', 'entry_count', 'updated_at')
+    list_filter = ('entry_type', 'category')
+    date_hierarchy = 'month'
+    readonly_fields = [f.name for f in LedgerMonthlyRollup._meta.get_fields()] # Maintained by signals
+
+    def has_add_permission(self, request): return False
+
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
@@ -49,11 +59,13 @@ class ExpenseAdmin(admin.ModelAdmin):
     @admin.action(description="Approve selected expenses")
     def approve_expenses(self, request, queryset):
         queryset.update(status='approved')
+        invalidate_kpi_snapshot()
 
     # ❌ Reject Action
     @admin.action(description="Reject selected expenses")
     def reject_expenses(self, request, queryset):
         queryset.update(status='rejected')
+        invalidate_kpi_snapshot()
 
     # 🔒 Prevent Editing After Approval
     # def get_readonly_fields(self, request, obj=None):
@@ -0,0 +1,15 @@
+"""
+Management command to recompute the ledger rollup tables from FinancialEntry.
+Run via: python manage.py rebuild_ledger_rollups
+"""
+
+from django.core.management.base import BaseCommand
+from ledger.services import rebuild_ledger_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild LedgerDailyRollup and LedgerMonthlyRollup from the raw ledger'
+
+    def handle(self, *args, **options):
+        daily, monthly = rebuild_ledger_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {daily} daily and {monthly} monthly rollup rows'))
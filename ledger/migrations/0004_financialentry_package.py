@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_package_entries(apps, schema_editor):
+    """Package inflows were only identifiable by their PKG-SUB-<user>-<PACKAGE> reference."""
+    FinancialEntry = apps.get_model('ledger', 'FinancialEntry')
+    AffiliatePackage = apps.get_model('affiliation', 'AffiliatePackage')
+
+    for package in AffiliatePackage.objects.all():
+        FinancialEntry.objects.filter(
+            category='package',
+            package__isnull=True,
+            reference_id__iendswith=f"-{package.name}"
+        ).update(package=package)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0005_referralpath'),
+        ('ledger', '0003_alter_financialentry_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialentry',
+            name='package',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='affiliation.affiliatepackage'),
+        ),
+        migrations.AddIndex(
+            model_name='financialentry',
+            index=models.Index(fields=['timestamp', 'id'], name='ledger_fina_timesta_9d0198_idx'),
+        ),
+        migrations.RunPython(link_package_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:34
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    """Seeds the rollups from the existing ledger (same as rebuild_ledger_rollups)."""
+    FinancialEntry = apps.get_model('ledger', 'FinancialEntry')
+    LedgerDailyRollup = apps.get_model('ledger', 'LedgerDailyRollup')
+    LedgerMonthlyRollup = apps.get_model('ledger', 'LedgerMonthlyRollup')
+
+    days = (
+        FinancialEntry.objects
+        .annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'entry_type', 'category')
+        .annotate(total=Sum('amount'), entry_count=Count('id'))
+        .order_by()
+    )
+
+    daily_rows = []
+    monthly = defaultdict(lambda: [Decimal('0'), 0])
+    for row in days:
+        daily_rows.append(LedgerDailyRollup(
+            day=row['day'], entry_type=row['entry_type'], category=row['category'],
+            total=row['total'], entry_count=row['entry_count']
+        ))
+        key = (row['day'].replace(day=1), row['entry_type'], row['category'])
+        monthly[key][0] += row['total']
+        monthly[key][1] += row['entry_count']
+
+    LedgerDailyRollup.objects.bulk_create(daily_rows, batch_size=1000)
+    LedgerMonthlyRollup.objects.bulk_create([
+        LedgerMonthlyRollup(month=month, entry_type=entry_type, category=category, total=total, entry_count=count)
+        for (month, entry_type, category), (total, count) in monthly.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0004_financialentry_package'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('inflow', 'Inflow (Revenue/Deposit)'), ('outflow', 'Outflow (Expense/Withdrawal)')], max_length=10)),
+                ('category', models.CharField(choices=[('package', 'Package Purchase'), ('investment', 'Investment'), ('commission', 'Commission Payout'), ('referral', 'Referral Bonus'), ('salary', 'Staff Salary'), ('office', 'Office Maintenance'), ('utility', 'Utility Bills'), ('logistics', 'Logistics/Transport'), ('marketing', 'Marketing'), ('other', 'Other'), ('property_sale', 'Property Sale Inflow')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('day', 'entry_type', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('inflow', 'Inflow (Revenue/Deposit)'), ('outflow', 'Outflow (Expense/Withdrawal)')], max_length=10)),
+                ('category', models.CharField(choices=[('package', 'Package Purchase'), ('investment', 'Investment'), ('commission', 'Commission Payout'), ('referral', 'Referral Bonus'), ('salary', 'Staff Salary'), ('office', 'Office Maintenance'), ('utility', 'Utility Bills'), ('logistics', 'Logistics/Transport'), ('marketing', 'Marketing'), ('other', 'Other'), ('property_sale', 'Property Sale Inflow')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField()),
+            ],
+            options={
+                'ordering': ['month'],
+                'unique_together': {('month', 'entry_type', 'category')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
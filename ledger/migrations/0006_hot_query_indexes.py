@@ -0,0 +1,20 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('affiliation', '0008_hot_query_indexes'),
+        ('ledger', '0005_ledger_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialentry',
+            index=models.Index(fields=['reference_id'], name='ledger_fina_referen_c85a95_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+def backfill_idempotency_keys(apps, schema_editor):
+    """
+    Keys the oldest entry of every (category, reference_id). Later duplicates
+    keep a NULL key so the history stays intact for reconciliation.
+    """
+    FinancialEntry = apps.get_model('ledger', 'FinancialEntry')
+    seen = set()
+    updates = []
+    for pk, category, reference_id in (
+        FinancialEntry.objects.order_by('id').values_list('id', 'category', 'reference_id').iterator()
+    ):
+        key = f"{category}:{reference_id}"
+        if key in seen:
+            continue
+        seen.add(key)
+        updates.append(FinancialEntry(id=pk, idempotency_key=key))
+        if len(updates) >= 1000:
+            FinancialEntry.objects.bulk_update(updates, ['idempotency_key'])
+            updates = []
+    FinancialEntry.objects.bulk_update(updates, ['idempotency_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialentry',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=150, null=True),
+        ),
+        migrations.RunPython(backfill_idempotency_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='financialentry',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=150, null=True, unique=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='financialentry',
+            name='ledger_fina_referen_c85a95_idx',
+        ),
+    ]
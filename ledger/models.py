@@ -31,13 +31,24 @@ class FinancialEntry(models.Model):
     # Inventory Link (Optional: Link to specific physical assets if needed)
     description = models.TextField(help_text="Detailed reason for this transaction")
     reference_id = models.CharField(max_length=100, help_text="Internal TRX or Receipt Number")
-    # reference_id = models.CharField(max_length=100, unique=True, help_text="Internal TRX or Receipt Number")
+    # "category:reference_id", set by ledger.services.post_many so a posting can't land twice
+    idempotency_key = models.CharField(max_length=150, unique=True, null=True, blank=True, editable=False)
+
+    # Package behind a subscription inflow, so reports can group on it
+    package = models.ForeignKey(
+        'affiliation.AffiliatePackage', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='ledger_entries'
+    )
     
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name_plural = "Financial Entries"
         ordering = ['timestamp']
+        indexes = [
+            # Date-range filters and keyset paging on the inventory report
+            models.Index(fields=['timestamp', 'id']),
+        ]
 
     def __str__(self):
         return f"[{self.entry_type.upper()}] {self.category} - ₦{self.amount}"
@@ -124,4 +135,41 @@ class Expense(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.receipt_number} - ₦{self.amount}"
\ No newline at end of file
+        return f"{self.receipt_number} - ₦{self.amount}"
+
+class LedgerRollup(models.Model):
+    """
+    Pre-summed FinancialEntry totals for one period, entry type and category.
+    Kept current by ledger.signals; `rebuild_ledger_rollups` recomputes them.
+    """
+    entry_type = models.CharField(max_length=10, choices=FinancialEntry.ENTRY_TYPES)
+    category = models.CharField(max_length=20, choices=FinancialEntry.CATEGORIES)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class LedgerDailyRollup(LedgerRollup):
+    day = models.DateField()
+
+    class Meta:
+        ordering = ['day']
+        unique_together = ('day', 'entry_type', 'category')
+
+    def __str__(self):
+        return f"{self.day} [{self.entry_type.upper()}] {self.category} - ₦{self.total}"
+
+
+class LedgerMonthlyRollup(LedgerRollup):
+    # Always the first day of the month
+    month = models.DateField()
+
+    class Meta:
+        ordering = ['month']
+        unique_together = ('month', 'entry_type', 'category')
+
+    def __str__(self):
+        return f"{self.month:%b %Y} [{self.entry_type.upper()}] {self.category} - ₦{self.total}"
@@ -0,0 +1,434 @@
+import csv
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import connections, router, transaction, IntegrityError
+from django.db.models import Q, F, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import FinancialEntry, LedgerDailyRollup, LedgerMonthlyRollup
+from affiliation.models import AffiliatePackage
+from users.models import Notification
+from security.decorators import logger
+
+
+ENTRIES_PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = (
+    ('reference_id', 'Reference ID'),
+    ('timestamp', 'Date'),
+    ('entry_type', 'Entry Type'),
+    ('category', 'Category'),
+    ('package__name', 'Package'),
+    ('amount', 'Amount (NGN)'),
+    ('actor__email', 'Actor'),
+    ('description', 'Description'),
+)
+
+
+# ==========================================
+# FILTERING & AGGREGATES
+# ==========================================
+
+def report_date_range(params):
+    """The report's (start_date, end_date) GET params as dates; either may be None."""
+    return (
+        parse_date(params.get('start_date') or ''),
+        parse_date(params.get('end_date') or ''),
+    )
+
+
+def filter_entries(params):
+    """Applies the inventory report's search and date-range filters (GET params)."""
+    queryset = FinancialEntry.objects.all()
+
+    # 1. TEXT SEARCH
+    query = params.get('q')
+    if query:
+        queryset = queryset.filter(
+            Q(reference_id__icontains=query) |
+            Q(description__icontains=query)
+        )
+
+    # 2. DATE RANGE FILTER
+    start_date, end_date = report_date_range(params)
+    if start_date:
+        queryset = queryset.filter(timestamp__gte=_day_start(start_date))
+    if end_date:
+        queryset = queryset.filter(timestamp__lt=_day_start(end_date + timedelta(days=1)))
+
+    return queryset
+
+
+def _day_start(day):
+    """Midnight at the start of `day` in the project timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def entry_totals(queryset):
+    """Inflow, outflow and net for the filtered ledger in one aggregate query."""
+    totals = queryset.aggregate(
+        inflow=Sum('amount', filter=Q(entry_type='inflow')),
+        outflow=Sum('amount', filter=Q(entry_type='outflow')),
+    )
+    total_inflow = totals['inflow'] or 0
+    total_outflow = totals['outflow'] or 0
+    return total_inflow, total_outflow, total_inflow - total_outflow
+
+
+def package_breakdown(queryset):
+    """
+    Revenue per subscription package, grouped in the database.
+    Keyed by lower-case package name to match the report template.
+    """
+    rows = (
+        queryset.filter(category='package', package__isnull=False)
+        .values('package__name', 'package__price')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    return {
+        row['package__name'].lower(): {
+            'name': row['package__name'].lower(),
+            'price': row['package__price'],
+            'total': row['total'],
+        }
+        for row in rows
+    }
+
+
+def range_totals(start_date=None, end_date=None):
+    """
+    Inflow, outflow and net for whole days [start_date, end_date] (None = open).
+    Closed months come from LedgerMonthlyRollup, the closed days around them
+    from LedgerDailyRollup, and only today, which is still being written, is
+    summed from raw FinancialEntry rows. The cost stays a handful of small
+    queries however many years the range spans.
+    """
+    today = timezone.localdate()
+    totals = defaultdict(Decimal)
+
+    def add(rows):
+        for row in rows:
+            totals[row['entry_type']] += row['total'] or 0
+
+    closed_end = today - timedelta(days=1)
+    if end_date is not None:
+        closed_end = min(end_date, closed_end)
+
+    if start_date is None or start_date <= closed_end:
+        # 1. Whole months inside the closed range
+        first_month = None
+        if start_date is not None:
+            first_month = start_date if start_date.day == 1 else _next_month(start_date)
+        ends_month = _next_month(closed_end) - timedelta(days=1) == closed_end
+        last_month = closed_end.replace(day=1) if ends_month else _previous_month(closed_end)
+
+        if first_month is None or first_month <= last_month:
+            months = LedgerMonthlyRollup.objects.filter(month__lte=last_month)
+            if first_month is not None:
+                months = months.filter(month__gte=first_month)
+            add(months.values('entry_type').annotate(total=Sum('total')).order_by())
+
+            # 2. Loose days either side of those months
+            days = Q(day__gte=_next_month(last_month), day__lte=closed_end)
+            if first_month is not None:
+                days |= Q(day__gte=start_date, day__lt=first_month)
+        else:
+            days = Q(day__gte=start_date, day__lte=closed_end)
+
+        add(LedgerDailyRollup.objects.filter(days)
+            .values('entry_type').annotate(total=Sum('total')).order_by())
+
+    # 3. Today is still open: read it from the ledger itself
+    if end_date is None or end_date >= today:
+        if start_date is None or start_date <= today:
+            add(FinancialEntry.objects.filter(timestamp__gte=_day_start(today))
+                .values('entry_type').annotate(total=Sum('amount')).order_by())
+
+    total_inflow = totals['inflow']
+    total_outflow = totals['outflow']
+    return total_inflow, total_outflow, total_inflow - total_outflow
+
+
+def monthly_trend(start_month=None, end_month=None):
+    """Month-by-month inflow/outflow series straight from the monthly rollups."""
+    rows = LedgerMonthlyRollup.objects.all()
+    if start_month:
+        rows = rows.filter(month__gte=start_month.replace(day=1))
+    if end_month:
+        rows = rows.filter(month__lte=end_month.replace(day=1))
+
+    series = {}
+    for row in rows.values('month', 'entry_type').annotate(total=Sum('total')).order_by('month'):
+        point = series.setdefault(row['month'], {'inflow': Decimal('0'), 'outflow': Decimal('0')})
+        point[row['entry_type']] += row['total']
+    return series
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _previous_month(day):
+    return (day.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+# ==========================================
+# ROLLUP MAINTENANCE
+# ==========================================
+
+def record_entries(entries, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) FinancialEntry rows from the daily and
+    monthly rollups. Used by ledger.signals and by bulk_create callers, which
+    bypass the signals.
+    """
+    daily = defaultdict(lambda: [Decimal('0'), 0])
+    for entry in entries:
+        key = (timezone.localdate(entry.timestamp), entry.entry_type, entry.category)
+        daily[key][0] += sign * Decimal(entry.amount)
+        daily[key][1] += sign
+
+    monthly = defaultdict(lambda: [Decimal('0'), 0])
+    for (day, entry_type, category), (amount, count) in daily.items():
+        monthly[(day.replace(day=1), entry_type, category)][0] += amount
+        monthly[(day.replace(day=1), entry_type, category)][1] += count
+
+    with transaction.atomic():
+        for (day, entry_type, category), (amount, count) in daily.items():
+            _bump_rollup(LedgerDailyRollup, {'day': day, 'entry_type': entry_type, 'category': category}, amount, count)
+        for (month, entry_type, category), (amount, count) in monthly.items():
+            _bump_rollup(LedgerMonthlyRollup, {'month': month, 'entry_type': entry_type, 'category': category}, amount, count)
+
+
+def _bump_rollup(model, key, amount, count):
+    """F() increment of one rollup row, creating it on first use."""
+    changes = {
+        'total': F('total') + amount,
+        'entry_count': F('entry_count') + count,
+        'updated_at': timezone.now(),
+    }
+    if model.objects.filter(**key).update(**changes):
+        return
+    if count <= 0:
+        # Nothing to take away from: the rollups predate this entry and need a rebuild
+        logger.warning(f"{model.__name__} row missing for {key}; run rebuild_ledger_rollups")
+        return
+    try:
+        # Savepoint so a concurrent insert of the same key doesn't poison the transaction
+        with transaction.atomic():
+            model.objects.create(**key, total=amount, entry_count=count)
+    except IntegrityError:
+        model.objects.filter(**key).update(**changes)
+
+
+@transaction.atomic
+def rebuild_ledger_rollups():
+    """
+    Recomputes both rollup tables from FinancialEntry with one grouped scan.
+    Returns (daily_rows, monthly_rows).
+    """
+    days = (
+        FinancialEntry.objects
+        .annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'entry_type', 'category')
+        .annotate(total=Sum('amount'), entry_count=Count('id'))
+        .order_by()
+    )
+
+    daily_rows = []
+    monthly = defaultdict(lambda: [Decimal('0'), 0])
+    for row in days:
+        daily_rows.append(LedgerDailyRollup(
+            day=row['day'], entry_type=row['entry_type'], category=row['category'],
+            total=row['total'], entry_count=row['entry_count']
+        ))
+        key = (row['day'].replace(day=1), row['entry_type'], row['category'])
+        monthly[key][0] += row['total']
+        monthly[key][1] += row['entry_count']
+
+    LedgerDailyRollup.objects.all().delete()
+    LedgerMonthlyRollup.objects.all().delete()
+
+    LedgerDailyRollup.objects.bulk_create(daily_rows, batch_size=1000)
+    LedgerMonthlyRollup.objects.bulk_create([
+        LedgerMonthlyRollup(month=month, entry_type=entry_type, category=category, total=total, entry_count=count)
+        for (month, entry_type, category), (total, count) in monthly.items()
+    ], batch_size=1000)
+
+    return len(daily_rows), len(monthly)
+
+
+# ==========================================
+# POSTING
+# ==========================================
+
+POSTING_BATCH_SIZE = 500
+
+
+def ledger_key(category, reference_id):
+    """Canonical idempotency key: one posting per category and reference."""
+    return f"{category}:{reference_id}"
+
+
+def post_entry(**fields):
+    """
+    Posts one FinancialEntry unless its (category, reference_id) is already
+    in the ledger. Returns True if it was posted, False for a repeat.
+    """
+    return bool(post_many([FinancialEntry(**fields)]))
+
+
+def post_many(entries, batch_size=POSTING_BATCH_SIZE):
+    """
+    Posts unsaved FinancialEntry instances, skipping any whose
+    idempotency_key is already in the ledger, so retries and re-runs of a
+    job are safe. One INSERT ... ON CONFLICT DO NOTHING RETURNING per batch:
+    only the rows it returns count as posted, so rollups and the actors'
+    notifications never follow a row another transaction inserted.
+    Returns the posted entries with their pks.
+    """
+    # 1. Key every entry, keeping the first of any repeats within the call
+    pending = {}
+    for entry in entries:
+        entry.idempotency_key = ledger_key(entry.category, entry.reference_id)
+        pending.setdefault(entry.idempotency_key, entry)
+    pending = list(pending.values())
+    if not pending:
+        return []
+
+    using = router.db_for_write(FinancialEntry)
+    connection = connections[using]
+    fields = [field for field in FinancialEntry._meta.local_concrete_fields if not field.primary_key]
+    batch_size = min(batch_size, connection.ops.bulk_batch_size(fields, pending) or batch_size)
+    returning = (
+        connection.features.can_return_rows_from_bulk_insert
+        and connection.features.supports_update_conflicts_with_target
+    )
+
+    posted = []
+    with transaction.atomic(using=using):
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+
+            # 2. Insert; the unique index skips keys that are already posted
+            if returning:
+                inserted = _insert_returning_keys(batch, fields, connection)
+            else:
+                inserted = _insert_one_by_one(batch, using)
+
+            for entry in batch:
+                if entry.idempotency_key in inserted:
+                    entry.pk = inserted[entry.idempotency_key]
+                    posted.append(entry)
+
+        # 3. The raw insert skips update_ledger_rollups and create_notification
+        if posted:
+            record_entries(posted)
+            for entry in posted:
+                notify_entry_actor(entry)
+
+    return posted
+
+
+def _insert_returning_keys(entries, fields, connection):
+    """
+    INSERT ... ON CONFLICT (idempotency_key) DO NOTHING RETURNING id, idempotency_key.
+    Returns {idempotency_key: pk} for the rows this statement inserted.
+    """
+    qn = connection.ops.quote_name
+    opts = FinancialEntry._meta
+    key_column = opts.get_field('idempotency_key').column
+
+    rows, params = [], []
+    for entry in entries:
+        rows.append(f"({', '.join(['%s'] * len(fields))})")
+        # pre_save() also stamps the auto_now_add timestamp on each instance
+        params += [field.get_db_prep_save(field.pre_save(entry, True), connection) for field in fields]
+
+    sql = (
+        f"INSERT INTO {qn(opts.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+        f"VALUES {', '.join(rows)} "
+        f"ON CONFLICT ({qn(key_column)}) DO NOTHING "
+        f"RETURNING {qn(opts.pk.column)}, {qn(key_column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {key: pk for pk, key in cursor.fetchall()}
+
+
+def _insert_one_by_one(entries, using):
+    """
+    For backends without ON CONFLICT ... RETURNING (MySQL): one INSERT per
+    entry in its own savepoint; a duplicate key fails only that entry.
+    """
+    inserted = {}
+    for entry in entries:
+        try:
+            with transaction.atomic(using=using):
+                FinancialEntry.objects.using(using).bulk_create([entry])
+        except IntegrityError:
+            continue
+        inserted[entry.idempotency_key] = entry.pk
+    return inserted
+
+
+def notify_entry_actor(entry):
+    """Tells the actor about referral, package and commission postings."""
+    if entry.category == 'referral':
+        Notification.create_notification(
+            user=entry.actor,
+            title="Commission from your Referral",
+            message=f"You received ₦{entry.amount} commission from your Referral",
+            notification_type=Notification.NotificationType.REFERRAL,
+            priority=Notification.Priority.NORMAL,
+        )
+    elif entry.category == 'package':
+        package = entry.package or AffiliatePackage.objects.filter(price=entry.amount).first()
+        Notification.create_notification(
+            user=entry.actor,
+            title="Package Subscription",
+            message=f"Your Subscription of ₦{entry.amount} to a {package.name} Package: {package.get_name_display()}",
+            notification_type=Notification.NotificationType.PACKAGE,
+            priority=Notification.Priority.NORMAL,
+        )
+    elif entry.category == 'commission':
+        Notification.create_notification(
+            user=entry.actor,
+            title="Commission Withdrawal",
+            message=f"Your Withdrawl of ₦{entry.amount} has been approved and Paid",
+            notification_type=Notification.NotificationType.COMMISSION,
+            priority=Notification.Priority.NORMAL,
+        )
+
+
+# ==========================================
+# CSV EXPORT
+# ==========================================
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+    def write(self, value):
+        return value
+
+
+def iter_entries_csv(queryset):
+    """
+    Yields the filtered ledger as CSV lines.
+    Rows are read through a server-side iterator in chunks, so memory stays
+    flat whatever the date range.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([label for _, label in EXPORT_COLUMNS])
+
+    rows = queryset.order_by('timestamp', 'id').values_list(
+        *[field for field, _ in EXPORT_COLUMNS]
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    for row in rows:
+        row = list(row)
+        row[1] = row[1].strftime('%Y-%m-%d %H:%M:%S')
+        yield writer.writerow(row)
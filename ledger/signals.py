@@ -1,31 +1,54 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
+from django.utils import timezone
+from types import SimpleNamespace
 from .models import FinancialEntry, Expense
-from affiliation.models import Affiliate, PropertyTransaction, AffiliatePackage
-from users.models import Withdrawal, Notification, Transaction
+from .services import record_entries, post_entry, notify_entry_actor
+from affiliation.models import Affiliate, PropertyTransaction
+from users.models import Withdrawal, Transaction, UserFinancialSummary
 from base.models import Investment, InvestmentPayout, InvestmentStatus
 
 
+SUBSCRIPTION_FIELDS = ('is_active', 'package_id', 'duration')
+
+
+@receiver(post_init, sender=Affiliate)
+def remember_subscription(sender, instance, **kwargs):
+    instance._saved_subscription = tuple(instance.__dict__.get(field) for field in SUBSCRIPTION_FIELDS)
+
+
 @receiver(post_save, sender=Affiliate)
 def track_package_inflow(sender, instance, created, **kwargs):
     """
     AUTOMATIC INFLOW: Triggers when an affiliate is activated 
     after paying for a package.
     """
-    # Only record if the account just became active
-    if instance.is_active and instance.package:
-        # Check if we already recorded this to avoid duplicates
-        ref = f"PKG-SUB-{str(instance.user.username).capitalize()}-{instance.package.name}"
-        # if not FinancialEntry.objects.filter(reference_id=ref).exists():
-        FinancialEntry.objects.create(
-            actor=instance.user,
-            entry_type='inflow',
-            category='package',
-            amount=instance.package.price,
-            description=f"Revenue from {instance.package.name} package purchase by {instance.user.get_full_name()}",
-            reference_id=ref
-        )
+    subscription = tuple(getattr(instance, field) for field in SUBSCRIPTION_FIELDS)
+    previous = None if created else instance._saved_subscription
+    instance._saved_subscription = subscription
+
+    # Only record if the account just became active, renewed or changed package
+    if subscription == previous or not (instance.is_active and instance.package):
+        return
+
+    # Each subscription period has its own expiry, so renewals post again
+    expiry = timezone.localtime(instance.duration).strftime('%Y%m%d%H%M%S') if instance.duration else 'FREE'
+    ref = f"PKG-SUB-{str(instance.user.username).capitalize()}-{instance.package.name}-{expiry}"
+    post_entry(
+        actor=instance.user,
+        entry_type='inflow',
+        category='package',
+        amount=instance.package.price,
+        description=f"Revenue from {instance.package.name} package purchase by {instance.user.get_full_name()}",
+        reference_id=ref,
+        package=instance.package
+    )
+
+
+@receiver(post_init, sender=Investment)
+def remember_investment_status(sender, instance, **kwargs):
+    instance._saved_status = instance.__dict__.get('status')
 
 
 @receiver(post_save, sender=Investment)
@@ -34,10 +57,13 @@ def track_investment_inflow(sender, instance, created, **kwargs):
     AUTOMATIC INFLOW: Triggers when an Investment is activated 
     after paying for a Investment.
     """
-    if instance.status == InvestmentStatus.ACTIVE:
-        ref = f"INVEST-{str(instance.user.username).capitalize()}-{instance.plan.name}"
+    was_active = False if created else instance._saved_status == InvestmentStatus.ACTIVE
+    instance._saved_status = instance.status
+
+    if instance.status == InvestmentStatus.ACTIVE and not was_active:
+        ref = f"INVEST-{instance.reference_code}"
         with transaction.atomic():
-            FinancialEntry.objects.create(
+            posted = post_entry(
                 actor=instance.user,
                 entry_type='inflow',
                 category='investment',
@@ -47,16 +73,13 @@ def track_investment_inflow(sender, instance, created, **kwargs):
             )
 
             # Create Transaction
-            Transaction.objects.create(
-                    user=instance.user,
-                    amount=instance.amount,
-                    transaction_type='investment',
-                    description=f"Investment for {instance.plan.name})"
-                )
-
-
-
-
+            if posted:
+                Transaction.objects.create(
+                        user=instance.user,
+                        amount=instance.amount,
+                        transaction_type='investment',
+                        description=f"Investment for {instance.plan.name})"
+                    )
 
 
 @receiver(post_save, sender=Withdrawal)
@@ -66,49 +89,21 @@ def track_withdrawal_outflow(sender, instance, created, **kwargs):
     a withdrawal request.
     """
     if instance.status == 'approved':
-        ref = f"WTH-{instance.transaction_id}"
-        if not FinancialEntry.objects.filter(reference_id=ref).exists():
-            FinancialEntry.objects.create(
-                actor=instance.user,
-                entry_type='outflow',
-                category='commission',
-                amount=instance.amount,
-                description=f"Commission payout to {instance.user.get_full_name()}",
-                reference_id=ref
-            )
-
-
+        post_entry(
+            actor=instance.user,
+            entry_type='outflow',
+            category='commission',
+            amount=instance.amount,
+            description=f"Commission payout to {instance.user.get_full_name()}",
+            reference_id=f"WTH-{instance.transaction_id}"
+        )
 
 
 @receiver(post_save, sender=FinancialEntry)
-def create_notification(sender, instance, created, **kwargs):
-    if created:
-        note = Notification()
-        if instance.category == 'referral':
-            note.create_notification(
-                user=instance.actor,
-                title=f"Commission from your Referral",
-                message=f"You received ₦{instance.amount} commission from your Referral",
-                notification_type=Notification.NotificationType.REFERRAL,
-                priority=Notification.Priority.NORMAL,
-            )
-        elif instance.category == 'package':
-            package = AffiliatePackage.objects.filter(price=instance.amount).first()
-            note.create_notification(
-                user=instance.actor,
-                title=f"Package Subscription",
-                message=f"Your Subscription of ₦{instance.amount} to a {package.name} Package: {package.get_name_display()}",
-                notification_type=Notification.NotificationType.PACKAGE,
-                priority=Notification.Priority.NORMAL,
-            )
-        elif instance.category == 'commission':
-            note.create_notification(
-                user=instance.actor,
-                title="Commission Withdrawal",
-                message=f"Your Withdrawl of ₦{instance.amount} has been approved and Paid",
-                notification_type=Notification.NotificationType.COMMISSION,
-                priority=Notification.Priority.NORMAL,
-            )
+def create_notification(sender, instance, created, raw=False, **kwargs):
+    # Entries saved directly (admin); post_many notifies for its own inserts
+    if created and not raw:
+        notify_entry_actor(instance)
 
 
 @receiver(post_save, sender=Expense)
@@ -119,18 +114,26 @@ def track_expense_outflow(sender, instance, created, **kwargs):
     """
 
     if instance.status == 'approved':
-        ref = f"EXP-{instance.receipt_number}"
-
-        if not FinancialEntry.objects.filter(reference_id=ref).exists():
-            FinancialEntry.objects.create(
-                actor=instance.recorded_by,
-                entry_type='outflow',
-                category=instance.category if instance.category in dict(
-                    FinancialEntry.CATEGORIES) else 'other',
-                amount=instance.amount,
-                description=f"Expense recorded: {instance.description}",
-                reference_id=ref
-            )
+        post_entry(
+            actor=instance.recorded_by,
+            entry_type='outflow',
+            category=instance.category if instance.category in dict(
+                FinancialEntry.CATEGORIES) else 'other',
+            amount=instance.amount,
+            description=f"Expense recorded: {instance.description}",
+            reference_id=f"EXP-{instance.receipt_number}"
+        )
+
+
+@receiver(post_init, sender=PropertyTransaction)
+def remember_property_verification(sender, instance, **kwargs):
+    instance._saved_is_verified = bool(instance.__dict__.get('is_verified'))
+
+
+@receiver(post_delete, sender=PropertyTransaction)
+def remove_verified_sale(sender, instance, **kwargs):
+    if instance.is_verified:
+        UserFinancialSummary.adjust(instance.affiliate.user_id, verified_sales_count=-1)
 
 
 @receiver(post_save, sender=PropertyTransaction)
@@ -139,17 +142,55 @@ def track_property_inflow(sender, instance, created, **kwargs):
     AUTOMATIC INFLOW: Triggers when a property sale is verified.
     Records the total sale amount into the company ledger.
     """
+    # Keep the seller's dashboard count in step with verification changes
+    was_verified = False if created else instance._saved_is_verified
+    if instance.is_verified != was_verified:
+        UserFinancialSummary.adjust(
+            instance.affiliate.user_id,
+            verified_sales_count=1 if instance.is_verified else -1
+        )
+        instance._saved_is_verified = instance.is_verified
+
     if instance.is_verified:
-        # Create a unique reference for this specific property sale
-        ref = f"PROP-{instance.transaction_id}"
+        # The ledger ignores a second posting of the same sale
+        post_entry(
+            actor=instance.affiliate.user,  # The agent who made the sale
+            entry_type='inflow',
+            category='property_sale',
+            amount=instance.amount,
+            description=f"Property {instance.transaction_type}: {instance.transaction_id} by {instance.affiliate.user.get_full_name()}",
+            reference_id=f"PROP-{instance.transaction_id}"
+        )
 
-        # Check for duplicates to maintain 'Eminent' data integrity
-        if not FinancialEntry.objects.filter(reference_id=ref).exists():
-            FinancialEntry.objects.create(
-                actor=instance.affiliate.user,  # The agent who made the sale
-                entry_type='inflow',
-                category='property_sale',  # Add this to CATEGORIES in your model
-                amount=instance.amount,
-                description=f"Property {instance.transaction_type}: {instance.transaction_id} by {instance.affiliate.user.get_full_name()}",
-                reference_id=ref
-            )
+
+ROLLUP_FIELDS = ('timestamp', 'entry_type', 'category', 'amount')
+
+
+@receiver(post_init, sender=FinancialEntry)
+def remember_rollup_state(sender, instance, **kwargs):
+    # Deferred fields aren't in __dict__; without them the old period is unknown
+    values = [instance.__dict__.get(field) for field in ROLLUP_FIELDS]
+    instance._rollup_state = None if None in values else SimpleNamespace(**dict(zip(ROLLUP_FIELDS, values)))
+
+
+@receiver(post_save, sender=FinancialEntry)
+def update_ledger_rollups(sender, instance, created, raw=False, **kwargs):
+    """Keeps the daily/monthly rollups in step with every ledger write."""
+    if raw:
+        return
+
+    current = SimpleNamespace(**{field: getattr(instance, field) for field in ROLLUP_FIELDS})
+    previous = None if created else instance._rollup_state
+
+    if previous == current:
+        return
+    if previous is not None:
+        record_entries([previous], sign=-1)
+    if created or previous is not None:
+        record_entries([current])
+    instance._rollup_state = current
+
+
+@receiver(post_delete, sender=FinancialEntry)
+def remove_from_ledger_rollups(sender, instance, **kwargs):
+    record_entries([instance._rollup_state or instance], sign=-1)
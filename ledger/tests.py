@@ -1,3 +1,107 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from authentication.models import User
+from users.models import Notification
+from users.pagination import keyset_page, parse_cursor
+from .models import FinancialEntry
+from .services import ledger_key, post_entry, post_many
 
-# Create your tests here.
+
+class PostManyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.actor = User.objects.create_user(email="actor@example.com", password="pw", username="actor")
+
+    def entry(self, reference_id, category='referral', amount='100'):
+        return FinancialEntry(
+            actor=self.actor, entry_type='outflow', category=category, amount=Decimal(amount),
+            description='Test posting', reference_id=reference_id
+        )
+
+    def test_posts_each_key_once(self):
+        posted = post_many([self.entry('REF-1'), self.entry('REF-2'), self.entry('REF-1', amount='999')])
+
+        self.assertEqual([entry.reference_id for entry in posted], ['REF-1', 'REF-2'])
+        self.assertEqual(
+            sorted(FinancialEntry.objects.values_list('pk', flat=True)), sorted(entry.pk for entry in posted)
+        )
+        self.assertEqual(FinancialEntry.objects.get(reference_id='REF-1').amount, Decimal('100'))
+        self.assertEqual(Notification.objects.filter(user=self.actor).count(), 2)
+
+    def test_reruns_only_post_new_keys(self):
+        post_many([self.entry('REF-1'), self.entry('REF-2')])
+        posted = post_many([self.entry('REF-2'), self.entry('REF-3')])
+
+        self.assertEqual([entry.reference_id for entry in posted], ['REF-3'])
+        self.assertEqual(FinancialEntry.objects.count(), 3)
+        # No second notification for the repeat
+        self.assertEqual(Notification.objects.filter(user=self.actor).count(), 3)
+        self.assertFalse(post_entry(
+            actor=self.actor, entry_type='outflow', category='referral', amount=Decimal('100'),
+            description='Test posting', reference_id='REF-3'
+        ))
+
+    def test_batches(self):
+        posted = post_many([self.entry(f"REF-{n}") for n in range(7)], batch_size=3)
+        self.assertEqual(len(posted), 7)
+        self.assertEqual(FinancialEntry.objects.count(), 7)
+
+    def test_one_statement_touches_the_ledger_per_batch(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(post_entry(
+                actor=self.actor, entry_type='outflow', category='other', amount=Decimal('100'),
+                description='Test posting', reference_id='REF-1'
+            ))
+        ledger = [query['sql'] for query in queries.captured_queries if 'ledger_financialentry' in query['sql']]
+        self.assertEqual(len(ledger), 1)
+        self.assertIn('ON CONFLICT', ledger[0])
+
+    def test_competing_insert_right_before_ours_is_not_claimed(self):
+        competed = []
+
+        def post_elsewhere_first(execute, sql, params, many, context):
+            # Another transaction commits REF-2 just before our INSERT runs
+            if not competed and 'ON CONFLICT' in sql:
+                competed.append(sql)
+                other = self.entry('REF-2', amount='555')
+                other.idempotency_key = ledger_key(other.category, other.reference_id)
+                FinancialEntry.objects.bulk_create([other])
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(post_elsewhere_first):
+            posted = post_many([self.entry('REF-1'), self.entry('REF-2')])
+
+        self.assertEqual(len(competed), 1)
+        self.assertEqual([entry.reference_id for entry in posted], ['REF-1'])
+        self.assertEqual(FinancialEntry.objects.get(reference_id='REF-2').amount, Decimal('555'))
+        # Only our own row is notified (and rolled up)
+        self.assertEqual(Notification.objects.filter(user=self.actor).count(), 1)
+
+
+class EntriesPageTests(TestCase):
+
+    def test_pages_walk_every_entry_newest_first(self):
+        actor = User.objects.create_user(email="actor@example.com", password="pw", username="actor")
+        FinancialEntry.objects.bulk_create([
+            FinancialEntry(
+                actor=actor, entry_type='inflow', category='other', amount=Decimal('10'),
+                description='Test posting', reference_id=f"REF-{n}"
+            ) for n in range(7)
+        ])
+        # Shared timestamps, so the id has to break the ties
+        now = timezone.now()
+        for n, pk in enumerate(FinancialEntry.objects.values_list('pk', flat=True)):
+            FinancialEntry.objects.filter(pk=pk).update(timestamp=now - timedelta(hours=n // 3))
+
+        seen, cursor = [], None
+        while True:
+            entries, cursor = keyset_page(FinancialEntry.objects.all(), 'timestamp', before=parse_cursor(cursor), limit=2)
+            seen.extend(entry.pk for entry in entries)
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(FinancialEntry.objects.order_by('-timestamp', '-id').values_list('pk', flat=True)))
@@ -4,6 +4,7 @@ from . import views
 
 urlpatterns = [
     path("", views.inventory_report, name="inventory_report"),
+    path("trend/", views.ledger_trend, name="ledger_trend"),
     path('expenses/', views.expenses, name="all_expenses"),
     path('expenses/add/', views.add_expense, name="add_expense"),
     path('view/<str:pk>/expense', views.view_expense, name="view_expense"),
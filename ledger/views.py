@@ -1,11 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum
-from django.utils.dateparse import parse_date
+from django.http import StreamingHttpResponse, JsonResponse
+from django.utils import timezone
 from .models import FinancialEntry, Expense
-from django.utils.dateparse import parse_date
-from datetime import datetime, time
-from affiliation.models import AffiliatePackage
+from .services import (
+    filter_entries, report_date_range, entry_totals, range_totals, monthly_trend,
+    package_breakdown, iter_entries_csv, ENTRIES_PAGE_SIZE,
+)
+from users.pagination import keyset_page, parse_cursor
 from .forms import ExpenseForm, ExpenseAddForm
 from django.contrib import messages as mg
 from security.decorators import *
@@ -20,70 +22,38 @@ from django.contrib.admin.views.decorators import staff_member_required
 @log_security_event(action="INVENTORY_VIEW")
 @staff_member_required
 def inventory_report(request):
-    queryset = FinancialEntry.objects.all()
-
-
-    # 1. TEXT SEARCH
-    query = request.GET.get('q')
-    if query:
-        queryset = queryset.filter(
-            Q(reference_id__icontains=query) |
-            Q(description__icontains=query)
-        )
-
-    # 2. DATE RANGE FILTER
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-
-    if start_date:
-        start_date = parse_date(start_date)
-        if start_date:
-            start_datetime = datetime.combine(start_date, time.min)
-            queryset = queryset.filter(timestamp__gte=start_datetime)
-
-    if end_date:
-        end_date = parse_date(end_date)
-        if end_date:
-            end_datetime = datetime.combine(end_date, time.max)
-            queryset = queryset.filter(timestamp__lte=end_datetime)
-
-    # 3. CALCULATE STATS
-    total_inflow = queryset.filter(entry_type='inflow').aggregate(
-        Sum('amount')
-    )['amount__sum'] or 0
-
-    total_outflow = queryset.filter(entry_type='outflow').aggregate(
-        Sum('amount')
-    )['amount__sum'] or 0
-
-    net_balance = total_inflow - total_outflow
-
-    packages = {
-        'basic': {'name': "", 'price': 0, 'total': 0},
-        'standard': {'price': 0, 'total': 0},
-        'premium': {'price': 0, 'total': 0},
-        'professional': {'price': 0, 'total': 0},
-        'elite': {'price': 0, 'total': 0},
-    }
-
-    for query in queryset:
-        try:
-            # Extract package name from reference
-            package_name = query.reference_id.split("-")[-1].lower()
-            
-            if package_name in packages:
-                # Add price to list and update total
-                packages[package_name]['name']= package_name
-                packages[package_name]['price']= query.amount
-                packages[package_name]['total'] += query.amount
-
-        except Exception as e:
-            print(f"Error processing {query.reference_id}: {e}")
-
-    print(packages["professional"].get("name"), packages["professional"].get("price"), packages["professional"].get("total"))
+    queryset = filter_entries(request.GET)
+
+    # Export streams the whole filtered range instead of rendering a page
+    if request.GET.get('export') == 'csv':
+        filename = f"ledger-{timezone.now():%Y%m%d-%H%M}.csv"
+        response = StreamingHttpResponse(iter_entries_csv(queryset), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # 1. CALCULATE STATS
+    # Date-only filters are answered from the rollups; text search needs the raw rows
+    if request.GET.get('q'):
+        total_inflow, total_outflow, net_balance = entry_totals(queryset)
+    else:
+        total_inflow, total_outflow, net_balance = range_totals(*report_date_range(request.GET))
+    packages = package_breakdown(queryset)
+
+    # 2. ONE PAGE OF ENTRIES
+    entries, next_cursor = keyset_page(
+        queryset.select_related('actor'), 'timestamp',
+        before=parse_cursor(request.GET.get('before')), limit=ENTRIES_PAGE_SIZE,
+    )
+
+    # Keep the active filters on the pager and export links
+    params = request.GET.copy()
+    params.pop('before', None)
+    params.pop('export', None)
 
     context = {
-        'entries': queryset,
+        'entries': entries,
+        'next_cursor': next_cursor,
+        'filter_query': params.urlencode(),
         'total_inflow': total_inflow,
         'total_outflow': total_outflow,
         'net_balance': net_balance,
@@ -95,11 +65,26 @@ def inventory_report(request):
 
 
 
+@login_required(login_url="login")
+@rate_limit("60/hour")
+@staff_member_required
+def ledger_trend(request):
+    """AJAX: monthly inflow/outflow series for the trend charts (?start_date=&end_date=)."""
+    start_date, end_date = report_date_range(request.GET)
+    series = monthly_trend(start_date, end_date)
+
+    return JsonResponse({
+        'months': [month.strftime('%Y-%m') for month in series],
+        'inflow': [str(point['inflow']) for point in series.values()],
+        'outflow': [str(point['outflow']) for point in series.values()],
+    })
+
+
 @login_required(login_url="login")
 @rate_limit("10/hour")
 @log_security_event(action="VIEW_EXPENSE")
 def expenses(request):
-    all_expenses = Expense.objects.all()
+    all_expenses = Expense.objects.select_related('recorded_by')
 
     context = {
         "all_expenses": all_expenses,
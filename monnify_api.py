@@ -6,6 +6,7 @@ import os
 from datetime import datetime
 from monnify_verification.monnify_api import *
 from affiliation.models import Affiliate, AffiliatePackage
+from users.utils import subscription_expiry
 
 
 
@@ -93,7 +94,7 @@ def _process_subscription_payment(request, package_id, amount, customer_email, r
             # Fetch user by email from invoice
             user = get_object_or_404(User, email=customer_email)
             
-            duration = settings.DURATION
+            duration = subscription_expiry()
             
             # Get or create affiliate with row lock
             affiliate, created = Affiliate.objects.select_for_update().get_or_create(
@@ -0,0 +1,74 @@
+"""
+In-memory stand-in for MonnifyClient, for tests and local development.
+Enable via settings: MONNIFY_CLIENT_CLASS = "monnify_verification.fake_client.FakeMonnifyClient"
+or inject one directly: monnify_api.set_client(FakeMonnifyClient())
+"""
+
+from datetime import datetime
+from typing import Tuple, Any, Optional
+
+
+class FakeMonnifyClient:
+    """Answers the endpoints the helpers use without any network or credentials"""
+
+    def __init__(self, contract_code: str = "FAKE-CONTRACT", admin_wallet_number: str = "0000000000"):
+        self.contract_code = contract_code
+        self.admin_wallet_number = admin_wallet_number
+        self.access_token = "fake-token"
+
+        # reference -> invoice body, as Monnify would return it
+        self.invoices = {}
+        # (method, endpoint, kwargs) for every call, in order
+        self.calls = []
+
+    def mark_paid(self, reference: str):
+        """Simulates the customer paying an invoice"""
+        self.invoices[reference]["invoiceStatus"] = "PAID"
+
+    def invalidate_token(self):
+        pass
+
+    def latency_metrics(self):
+        return {}
+
+    def _make_request(self, method: str, endpoint: str, metric: Optional[str] = None, **kwargs) -> Tuple[Any, bool]:
+        self.calls.append((method, endpoint, kwargs))
+        parts = endpoint.strip("/").split("/")
+
+        # 1. Invoices
+        if endpoint == "/api/v1/invoice/create":
+            payload = kwargs["json"]
+            reference = payload["invoiceReference"]
+            self.invoices[reference] = {
+                **payload,
+                "invoiceStatus": "PENDING",
+                "checkoutUrl": f"https://fake.monnify.local/checkout/{reference}",
+                "createdOn": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            return self.invoices[reference], True
+
+        if parts[:3] == ["api", "v1", "invoice"] and len(parts) == 5:
+            invoice = self.invoices.get(parts[3])
+            if invoice is None:
+                return "Invoice not found", False
+            if parts[4] == "cancel":
+                invoice["invoiceStatus"] = "CANCELLED"
+            return invoice, True
+
+        # 2. Disbursements
+        if endpoint == "/api/v1/disbursements/account/validate":
+            params = kwargs["params"]
+            return {
+                "accountNumber": params["accountNumber"],
+                "accountName": "FAKE ACCOUNT",
+                "bankCode": params["bankCode"],
+            }, True
+
+        if endpoint == "/api/v2/disbursements/single":
+            payload = kwargs["json"]
+            return {"reference": payload["reference"], "amount": payload["amount"], "status": "PENDING_AUTHORIZATION"}, True
+
+        if endpoint == "/api/v2/disbursements/single/validate-otp":
+            return {"reference": kwargs["json"]["reference"], "status": "SUCCESS"}, True
+
+        return f"Fake Monnify has no handler for {method} {endpoint}", False
@@ -245,12 +245,20 @@
 
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from base64 import b64encode
 import os
 import json
+import time
+import threading
 from datetime import datetime
 from typing import Tuple, Dict, Any, Optional
 from functools import wraps
+from django.conf import settings
+from project.cache import shared_cache
+from django.utils.module_loading import import_string
+from security.decorators import logger
 
 # Bank names and codes
 BANK_CODES_NAME = [
@@ -274,14 +282,47 @@ class MonnifyAPIError(Exception):
     pass
 
 
+# Connection pool / retry tuning (override in settings)
+MONNIFY_BASE_URL = getattr(settings, 'MONNIFY_BASE_URL', "https://api.monnify.com")
+MONNIFY_POOL_SIZE = getattr(settings, 'MONNIFY_POOL_SIZE', 10)
+MONNIFY_MAX_RETRIES = getattr(settings, 'MONNIFY_MAX_RETRIES', 3)
+MONNIFY_BACKOFF_FACTOR = getattr(settings, 'MONNIFY_BACKOFF_FACTOR', 0.5)
+
+# Refresh this many seconds before Monnify says the token expires
+TOKEN_EXPIRY_MARGIN = 60
+TOKEN_LOCK_TIMEOUT = 30
+
+
+def build_session(pool_size=MONNIFY_POOL_SIZE, max_retries=MONNIFY_MAX_RETRIES,
+                  backoff_factor=MONNIFY_BACKOFF_FACTOR) -> requests.Session:
+    """
+    Keep-alive session with a bounded connection pool.
+    Only idempotent methods are retried, so an invoice or transfer POST is
+    never sent twice.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "DELETE"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 class MonnifyClient:
-    """Monnify API client with automatic token refresh"""
+    """Monnify API client with a pooled session and a cache-shared access token"""
 
-    def __init__(self):
+    def __init__(self, base_url: Optional[str] = None, session: Optional[requests.Session] = None):
         self.api_key = os.environ.get("Mon_Api_key")
         self.secret_key = os.environ.get("Mon_Secret_key")
         self.contract_code = os.environ.get("Contract_Code")
-        self.base_url = "https://api.monnify.com"
+        self.base_url = base_url or MONNIFY_BASE_URL
 
         # Admin credentials
         self.admin_account_number = os.environ.get("accountNumber")
@@ -297,15 +338,27 @@ class MonnifyClient:
             raise ValueError(
                 "Missing required Monnify credentials in environment")
 
+        self.session = session or build_session()
+
+        # Shared by every worker using the same credentials (the 'shared' cache)
+        key_id = self.api_key[-8:]
+        self._token_cache_key = f"monnify:token:{key_id}"
+        self._token_lock_key = f"monnify:token-lock:{key_id}"
+
+        # Per-endpoint latency, per process: {endpoint: {...}}
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
     def _get_auth_string(self) -> str:
         """Generate Base64 encoded API key and secret"""
         data = f"{self.api_key}:{self.secret_key}".encode()
         return b64encode(data).decode("ascii")
 
     def _refresh_token(self) -> str:
-        """Fetch new access token"""
+        """Fetch new access token and publish it to the shared cache"""
+        started = time.monotonic()
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/v1/auth/login",
                 headers={"Authorization": f"Basic {self._get_auth_string()}"},
                 timeout=10
@@ -314,9 +367,17 @@ class MonnifyClient:
             data = response.json()
 
             if data.get("requestSuccessful") and data.get("responseMessage") == "success":
-                self._access_token = data["responseBody"]["accessToken"]
-                # Token typically expires in 1 hour, refresh after 50 minutes
-                self._token_expiry = datetime.now().timestamp() + 3000
+                body = data["responseBody"]
+                # Token typically expires in 1 hour; trust expiresIn when Monnify sends it
+                lifetime = max(int(body.get("expiresIn") or 3060) - TOKEN_EXPIRY_MARGIN, 1)
+
+                self._access_token = body["accessToken"]
+                self._token_expiry = datetime.now().timestamp() + lifetime
+                shared_cache.set(
+                    self._token_cache_key,
+                    {"token": self._access_token, "expiry": self._token_expiry},
+                    timeout=lifetime
+                )
                 return self._access_token
             else:
                 raise MonnifyAPIError(
@@ -324,13 +385,50 @@ class MonnifyClient:
 
         except requests.exceptions.RequestException as e:
             raise MonnifyAPIError(f"Failed to authenticate: {str(e)}")
+        finally:
+            self._record_latency("/api/v1/auth/login", started)
+
+    def _cached_token(self) -> Optional[str]:
+        """Token another worker already fetched, if it is still valid"""
+        cached = shared_cache.get(self._token_cache_key)
+        if cached and datetime.now().timestamp() < cached["expiry"]:
+            self._access_token = cached["token"]
+            self._token_expiry = cached["expiry"]
+            return self._access_token
+        return None
 
     @property
     def access_token(self) -> str:
         """Get valid access token, refresh if expired"""
-        if not self._access_token or datetime.now().timestamp() >= (self._token_expiry or 0):
-            return self._refresh_token()
-        return self._access_token
+        if self._access_token and datetime.now().timestamp() < (self._token_expiry or 0):
+            return self._access_token
+
+        token = self._cached_token()
+        if token:
+            return token
+
+        # Only the worker holding the lock logs in; the rest wait for its token
+        if shared_cache.add(self._token_lock_key, True, timeout=TOKEN_LOCK_TIMEOUT):
+            try:
+                return self._refresh_token()
+            finally:
+                shared_cache.delete(self._token_lock_key)
+
+        deadline = time.monotonic() + TOKEN_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            token = self._cached_token()
+            if token:
+                return token
+
+        # The refreshing worker died or is stuck: fetch our own
+        return self._refresh_token()
+
+    def invalidate_token(self):
+        """Drop the token everywhere, e.g. after Monnify rejects it"""
+        self._access_token = None
+        self._token_expiry = None
+        shared_cache.delete(self._token_cache_key)
 
     @property
     def headers(self) -> Dict[str, str]:
@@ -340,19 +438,56 @@ class MonnifyClient:
             "Content-Type": "application/json"
         }
 
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Tuple[Any, bool]:
-        """Generic request handler with error handling"""
+    def _record_latency(self, endpoint: str, started: float, failed: bool = False):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._metrics_lock:
+            stats = self._metrics.setdefault(
+                endpoint, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        logger.info("monnify_request", endpoint=endpoint, ms=round(elapsed_ms, 1), failed=failed)
+
+    def latency_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-endpoint request count, errors and latency for this process"""
+        with self._metrics_lock:
+            return {
+                endpoint: {**stats, "avg_ms": stats["total_ms"] / stats["count"]}
+                for endpoint, stats in self._metrics.items()
+            }
+
+    def _make_request(self, method: str, endpoint: str, metric: Optional[str] = None, **kwargs) -> Tuple[Any, bool]:
+        """
+        Generic request handler with error handling.
+        `metric` names the endpoint in the latency stats when the path holds
+        an id, e.g. "/api/v1/invoice/{reference}/details".
+        """
         url = f"{self.base_url}{endpoint}"
         timeout = kwargs.pop('timeout', 30)
+        started = time.monotonic()
+        failed = True
 
         try:
-            response = requests.request(
+            response = self.session.request(
                 method=method,
                 url=url,
                 headers=self.headers,
                 timeout=timeout,
                 **kwargs
             )
+
+            if response.status_code == 401:
+                # Token revoked or expired early: log in again and retry once
+                self.invalidate_token()
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    headers=self.headers,
+                    timeout=timeout,
+                    **kwargs
+                )
             response.raise_for_status()
 
             # Try to parse JSON, handle empty responses
@@ -360,11 +495,13 @@ class MonnifyClient:
                 data = response.json()
             except json.JSONDecodeError:
                 if response.status_code == 204:
+                    failed = False
                     return None, True
                 return f"Invalid JSON response: {response.text}", False
 
             # Check Monnify-specific success indicators
             if data.get("requestSuccessful") is True and data.get("responseMessage") == "success":
+                failed = False
                 return data.get("responseBody"), True
             else:
                 error_msg = data.get("responseMessage", "Unknown API error")
@@ -381,10 +518,45 @@ class MonnifyClient:
             return f"Request failed: {str(e)}", False
         except Exception as e:
             return f"Unexpected error: {str(e)}", False
+        finally:
+            self._record_latency(metric or endpoint, started, failed)
+
+
+# ==========================================
+# CLIENT REGISTRY
+# ==========================================
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The shared Monnify client, built on first use rather than at import.
+    settings.MONNIFY_CLIENT_CLASS (dotted path) swaps in another provider,
+    e.g. "monnify_verification.fake_client.FakeMonnifyClient" for tests.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client_class = getattr(settings, 'MONNIFY_CLIENT_CLASS', None)
+                _client = import_string(client_class)() if client_class else MonnifyClient()
+    return _client
+
+
+def set_client(client):
+    """Injects a client (None resets, so the next call builds a fresh one)"""
+    global _client
+    with _client_lock:
+        _client = client
 
 
-# Global client instance
-monnify = MonnifyClient()
+def __getattr__(name):
+    # Keeps `from monnify_api import monnify` working without building at import
+    if name == "monnify":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_bank_code(bank_name: str) -> Optional[str]:
@@ -413,7 +585,7 @@ def verify_bank_account(account_number: str, bank_name: str) -> Tuple[Any, bool]
         if not bank_code:
             return "Invalid bank name", False
 
-        response, success = monnify._make_request(
+        response, success = get_client()._make_request(
             "GET",
             "/api/v1/disbursements/account/validate",
             params={
@@ -451,29 +623,31 @@ def create_invoice(
         "invoiceReference": reference,
         "customerName": user.get_full_name() or user.username,
         "customerEmail": user.email,
-        "contractCode": monnify.contract_code,
+        "contractCode": get_client().contract_code,
         "description": description,
         "expiryDate": expiry_date,
         "redirectUrl": redirect_url or "https://royal-dilemmatical-tartishly.ngrok-free.dev/Dashboard/payments/", #"https://affiliate.kagency.org/Dashboard/payments/",
         "accountReference": ""
     }
 
-    return monnify._make_request("POST", "/api/v1/invoice/create", json=payload)
+    return get_client()._make_request("POST", "/api/v1/invoice/create", json=payload)
 
 
 def get_invoice_details(reference: str) -> Tuple[Any, bool]:
     """Get invoice details by reference"""
-    return monnify._make_request(
+    return get_client()._make_request(
         "GET",
-        f"/api/v1/invoice/{reference}/details"
+        f"/api/v1/invoice/{reference}/details",
+        metric="/api/v1/invoice/{reference}/details"
     )
 
 
 def cancel_invoice(reference: str) -> Tuple[Any, bool]:
     """Cancel an existing invoice"""
-    return monnify._make_request(
+    return get_client()._make_request(
         "DELETE",
-        f"/api/v1/invoice/{reference}/cancel"
+        f"/api/v1/invoice/{reference}/cancel",
+        metric="/api/v1/invoice/{reference}/cancel"
     )
 
 
@@ -500,10 +674,10 @@ def initiate_transfer(
         "destinationBankCode": dest_details["bankCode"],
         "destinationAccountNumber": dest_details["accountNumber"],
         "currency": "NGN",
-        "sourceAccountNumber": source_account or monnify.admin_wallet_number,
+        "sourceAccountNumber": source_account or get_client().admin_wallet_number,
     }
 
-    return monnify._make_request(
+    return get_client()._make_request(
         "POST",
         "/api/v2/disbursements/single",
         json=payload
@@ -517,7 +691,7 @@ def validate_transfer_otp(reference: str, otp: str) -> Tuple[Any, bool]:
         "authorizationCode": otp
     }
 
-    return monnify._make_request(
+    return get_client()._make_request(
         "POST",
         "/api/v2/disbursements/single/validate-otp",
         json=payload
@@ -525,7 +699,7 @@ def validate_transfer_otp(reference: str, otp: str) -> Tuple[Any, bool]:
 
 
 # Backward compatibility aliases
-def access_token(): return monnify.access_token
+def access_token(): return get_client().access_token
 
 
 bank_verification = verify_bank_account
@@ -1,3 +1,260 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from monnify_verification import monnify_api
+from project.cache import SHARED_CACHE_ALIAS, shared_cache
+from monnify_verification.fake_client import FakeMonnifyClient
+from monnify_verification.monnify_api import MonnifyClient, build_session, get_client, set_client
 
-# Create your tests here.
+# The simulated workers are threads of this process; an in-memory 'shared'
+# cache stands in for the database table (SimpleTestCase has no database)
+IN_MEMORY_SHARED_CACHE = {
+    **settings.CACHES,
+    SHARED_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+CREDENTIALS = {"Mon_Api_key": "MK_TEST_12345678", "Mon_Secret_key": "secret", "Contract_Code": "1234"}
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise monnify_api.requests.exceptions.HTTPError(f"{self.status_code}")
+
+
+def ok(body):
+    return FakeResponse(200, {"requestSuccessful": True, "responseMessage": "success", "responseBody": body})
+
+
+class StubSession:
+    """Counts logins; `responses` are handed out in order for API requests."""
+
+    def __init__(self, login_delay=0, responses=None):
+        self.login_delay = login_delay
+        self.responses = list(responses or [])
+        self.logins = 0
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def post(self, url, headers=None, timeout=None):
+        with self._lock:
+            self.logins += 1
+            number = self.logins
+        time.sleep(self.login_delay)
+        return ok({"accessToken": f"token-{number}", "expiresIn": 3600})
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        self.requests.append((method, url, headers["Authorization"]))
+        return self.responses.pop(0)
+
+
+@override_settings(CACHES=IN_MEMORY_SHARED_CACHE)
+@mock.patch.dict(os.environ, CREDENTIALS)
+class AccessTokenTests(SimpleTestCase):
+
+    def setUp(self):
+        shared_cache.clear()
+
+    def test_concurrent_callers_share_one_login(self):
+        session = StubSession(login_delay=0.2)
+        # One client per simulated worker, all on the same cache
+        clients = [MonnifyClient(session=session) for _ in range(8)]
+        tokens = []
+        threads = [threading.Thread(target=lambda c=c: tokens.append(c.access_token)) for c in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(session.logins, 1)
+        self.assertEqual(set(tokens), {"token-1"})
+
+    def test_waiting_worker_picks_up_published_token(self):
+        session = StubSession()
+        client = MonnifyClient(session=session)
+        shared_cache.add(client._token_lock_key, True)
+
+        def publish():
+            time.sleep(0.2)
+            shared_cache.set(client._token_cache_key, {"token": "from-other-worker", "expiry": time.time() + 600})
+
+        threading.Thread(target=publish).start()
+        self.assertEqual(client.access_token, "from-other-worker")
+        self.assertEqual(session.logins, 0)
+
+    def test_self_refresh_when_lock_holder_never_publishes(self):
+        session = StubSession()
+        client = MonnifyClient(session=session)
+        shared_cache.add(client._token_lock_key, True)
+
+        with mock.patch.object(monnify_api, "TOKEN_LOCK_TIMEOUT", 0.3):
+            self.assertEqual(client.access_token, "token-1")
+        self.assertEqual(session.logins, 1)
+
+
+@mock.patch.dict(os.environ, CREDENTIALS)
+class SharedTokenTests(TestCase):
+
+    def test_token_is_published_to_the_database_cache(self):
+        session = StubSession()
+        self.assertEqual(MonnifyClient(session=session).access_token, "token-1")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM shared_cache")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        # A worker starting later (fresh client, empty memory) reuses it
+        self.assertEqual(MonnifyClient(session=session).access_token, "token-1")
+        self.assertEqual(session.logins, 1)
+
+
+@override_settings(CACHES=IN_MEMORY_SHARED_CACHE)
+@mock.patch.dict(os.environ, CREDENTIALS)
+class MakeRequestTests(SimpleTestCase):
+
+    def setUp(self):
+        shared_cache.clear()
+
+    def test_401_logs_in_again_and_retries_once(self):
+        session = StubSession(responses=[FakeResponse(401, {}), ok({"invoiceStatus": "PAID"})])
+        client = MonnifyClient(session=session)
+
+        body, success = client._make_request("GET", "/api/v1/invoice/REF/details")
+
+        self.assertTrue(success)
+        self.assertEqual(body, {"invoiceStatus": "PAID"})
+        self.assertEqual(session.logins, 2)
+        self.assertEqual(
+            [auth for _, _, auth in session.requests],
+            ["Bearer token-1", "Bearer token-2"]
+        )
+
+    def test_second_401_is_not_retried_again(self):
+        session = StubSession(responses=[FakeResponse(401, {}), FakeResponse(401, {})])
+        client = MonnifyClient(session=session)
+
+        body, success = client._make_request("GET", "/api/v1/invoice/REF/details")
+
+        self.assertFalse(success)
+        self.assertTrue(body.startswith("HTTP 401"))
+        self.assertEqual(len(session.requests), 2)
+
+
+class RetryPolicyTests(SimpleTestCase):
+
+    def test_only_idempotent_methods_are_retried(self):
+        retry = build_session().get_adapter("https://api.monnify.com").max_retries
+
+        self.assertTrue(retry.is_retry("GET", 503))
+        self.assertTrue(retry.is_retry("DELETE", 502))
+        # Invoices and transfers must never be sent twice
+        self.assertFalse(retry.is_retry("POST", 503))
+        self.assertFalse(retry.is_retry("POST", 429))
+
+
+class ClientRegistryTests(SimpleTestCase):
+
+    def tearDown(self):
+        set_client(None)
+
+    def test_set_client_injects_and_none_resets(self):
+        fake = FakeMonnifyClient()
+        set_client(fake)
+        self.assertIs(get_client(), fake)
+        self.assertIs(monnify_api.monnify, fake)
+
+        set_client(None)
+        with override_settings(MONNIFY_CLIENT_CLASS="monnify_verification.fake_client.FakeMonnifyClient"):
+            rebuilt = get_client()
+        self.assertIsInstance(rebuilt, FakeMonnifyClient)
+        self.assertIsNot(rebuilt, fake)
+
+    def test_unknown_module_attribute_still_raises(self):
+        with self.assertRaises(AttributeError):
+            monnify_api.not_a_client
+
+    def test_import_without_credentials(self):
+        env = {key: value for key, value in os.environ.items() if key not in CREDENTIALS}
+        env["DJANGO_SETTINGS_MODULE"] = "project.settings"
+        # A fresh interpreter, so the import really runs without the env vars
+        result = subprocess.run(
+            [sys.executable, "-c", (
+                "import django; django.setup(); "
+                "import monnify_verification.monnify_api as api, users.views, krysline_admin.views; "
+                "assert api._client is None"
+            )],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    @mock.patch.dict(os.environ, {key: "" for key in CREDENTIALS})
+    def test_real_client_is_only_built_on_first_use(self):
+        with override_settings(MONNIFY_CLIENT_CLASS=None):
+            with self.assertRaises(ValueError):
+                get_client()
+
+
+class FakeClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.fake = FakeMonnifyClient()
+        set_client(self.fake)
+        self.user = SimpleNamespace(get_full_name=lambda: "Ada Obi", username="ada", email="ada@example.com")
+
+    def tearDown(self):
+        set_client(None)
+
+    def test_invoice_round_trip(self):
+        invoice, success = monnify_api.create_invoice(
+            amount=25000, user=self.user, description="Gold package",
+            reference="KAL-INV-1", expiry_date="2026-10-19 12:00:00"
+        )
+        self.assertTrue(success)
+        self.assertEqual(invoice["contractCode"], "FAKE-CONTRACT")
+        self.assertEqual(invoice["customerEmail"], "ada@example.com")
+
+        details, success = monnify_api.get_invoice_details("KAL-INV-1")
+        self.assertTrue(success)
+        self.assertEqual(details["invoiceStatus"], "PENDING")
+
+        self.fake.mark_paid("KAL-INV-1")
+        details, _ = monnify_api.get_invoice("KAL-INV-1")
+        self.assertEqual(details["invoiceStatus"], "PAID")
+
+        self.assertEqual(monnify_api.get_invoice_details("MISSING"), ("Invoice not found", False))
+
+    def test_initiate_transfer_validates_the_account_first(self):
+        result, success = monnify_api.initiate_transfer(
+            amount=5000, reference="WTH-1", narration="Commission payout",
+            destination_account="0123456789", destination_bank_name="058-Guaranty Trust Bank"
+        )
+        self.assertTrue(success)
+        self.assertEqual(result["status"], "PENDING_AUTHORIZATION")
+
+        (_, validate, validate_kwargs), (_, transfer, transfer_kwargs) = self.fake.calls
+        self.assertEqual(validate, "/api/v1/disbursements/account/validate")
+        self.assertEqual(validate_kwargs["params"], {"accountNumber": "0123456789", "bankCode": "058"})
+        self.assertEqual(transfer, "/api/v2/disbursements/single")
+        self.assertEqual(transfer_kwargs["json"]["sourceAccountNumber"], "0000000000")
+
+    def test_unknown_bank_never_reaches_the_provider(self):
+        result = monnify_api.initiate_transfer(
+            amount=5000, reference="WTH-2", narration="Commission payout",
+            destination_account="0123456789", destination_bank_name="999-Unknown Bank"
+        )
+        self.assertEqual(result, ("Invalid destination account", False))
+        self.assertEqual(self.fake.calls, [])
@@ -0,0 +1,62 @@
+import threading
+import time
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+
+# Alias of the cache every worker sees (see CACHES in settings)
+SHARED_CACHE_ALIAS = 'shared'
+
+# Like django.core.cache.cache, but for the shared alias
+shared_cache = ConnectionProxy(caches, SHARED_CACHE_ALIAS)
+
+
+class VersionedLocalCache:
+    """
+    A value loaded from the DB and kept in process memory, tagged with a
+    version token that lives in the shared cache under "<name>:version".
+
+    get() is served from memory; every `check_interval` seconds it re-reads
+    the version and calls `load` only when the version moved (or the copy is
+    older than `timeout`, in case a bump was lost). invalidate() sets a new
+    version once the current transaction commits, so every worker reloads
+    within `check_interval` seconds.
+    """
+
+    def __init__(self, name, load, timeout=300, check_interval=5):
+        self.name = name
+        self.load = load
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.version_key = f"{name}:version"
+        # Per-process copy: (value, version, monotonic load time, monotonic check time)
+        self._local = (None, None, 0.0, 0.0)
+        self._lock = threading.Lock()
+
+    def get(self):
+        value, version, loaded_at, checked_at = self._local
+        if version is not None and time.monotonic() - checked_at < self.check_interval:
+            return value
+
+        with self._lock:
+            # Until the first invalidate() there is no key; every process reads the same default
+            current = shared_cache.get(self.version_key, 0)
+
+            value, version, loaded_at, _ = self._local
+            now = time.monotonic()
+            if version is None or version != current or now - loaded_at >= self.timeout:
+                value, loaded_at = self.load(), now
+
+            self._local = (value, current, loaded_at, now)
+            return value
+
+    def invalidate(self):
+        """Sets a new version on commit, so every process reloads on its next check."""
+        def bump():
+            shared_cache.set(self.version_key, uuid.uuid4().hex, None)
+            # This process sees the change immediately
+            self._local = (None, None, 0.0, 0.0)
+
+        transaction.on_commit(bump)
@@ -3,7 +3,6 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
-from django.utils import timezone
 from django.contrib.messages import constants as messages
 
 load_dotenv()
@@ -143,6 +142,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + MY_APPS
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Check this line!
     'django.middleware.security.SecurityMiddleware',
+    'krysline_admin.middleware.QueryProfilingMiddleware', # per-view query counts / budgets
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -160,6 +160,38 @@ MIDDLEWARE = [
 ]
 
 
+# Query budgets per view (URL name -> max SQL queries per request), checked by
+# krysline_admin.middleware.QueryProfilingMiddleware. Overruns are logged;
+# with QUERY_BUDGET_STRICT = True (e.g. override_settings in tests) they raise.
+QUERY_BUDGETS = {
+    # users
+    'dashboard': 15,
+    'transaction_history': 6,
+    'withdraw_history': 6,
+    'referral_list': 12,
+    'choose_package': 6,
+    'notifications': 5,
+    # base
+    'front_package': 6,
+    'investment_plans': 6,
+    'my_investments': 10,
+    # krysline_admin
+    'krysline_admin': 15,
+    'recent_transactions_feed': 8,
+    'user_downline': 10,
+    'all_approved_withdrawal': 6,
+    'all_pending_withdrawal': 6,
+    'all_transaction': 6,
+    'admin_investment_list': 15,
+    'admin_plan_list': 10,
+    # ledger
+    'inventory_report': 10,
+    'ledger_trend': 5,
+    'all_expenses': 6,
+}
+QUERY_BUDGET_STRICT = False
+
+
 # Custom idle timeout (in minutes)
 IDLE_TIMEOUT_MINUTES = 2  # 30 minutes of inactivity
 
@@ -216,6 +248,26 @@ DATABASES = {
 }
 
 
+# 'default' stays per process (LocMem): rate-limit counters, failed-login
+# counts and other hot keys that can live with each worker keeping its own.
+# 'shared' is a table in the main database that every worker reads
+# (project.cache.shared_cache): the Monnify access token and its refresh
+# lock, so one login serves every worker, and the version tokens that make
+# every worker drop its in-process copy (project.cache.VersionedLocalCache:
+# IP blacklist, commission schedules, KPI snapshot). The table is
+# created by a migration (security 0003); point 'shared' at Redis or
+# Memcached instead once one is available.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'shared_cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -247,8 +299,16 @@ USE_I18N = True
 USE_TZ = True
 
 
-# DURATION
-DURATION = timezone.now() + timedelta(minutes=10)
+# Subscription length, added to the activation time of each affiliate
+# (see users.utils.subscription_expiry)
+SUBSCRIPTION_DURATION = timedelta(minutes=10)
+
+# Notification retention, applied by `python manage.py cleanup_notifications`:
+# read notifications older than this are archived (if enabled) and deleted,
+# and finished days within the digest window get one commission digest per user
+NOTIFICATION_READ_RETENTION = timedelta(days=90)
+NOTIFICATION_ARCHIVE = True
+NOTIFICATION_DIGEST_DAYS = 7
 
 
 # Static files (CSS, JavaScript, Images)
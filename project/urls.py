@@ -48,9 +48,6 @@
 
 
 from django.contrib import admin
-import datetime
-from django.utils import timezone
-from affiliation.models import Affiliate
 from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
@@ -87,18 +84,5 @@ urlpatterns += [
 ]
 
 
-def check_expiration():
-    today = timezone.localtime(timezone.now()) - datetime.timedelta(minutes=2)
-    # TODO: MINUS 1 HOUR 
-
-    Affiliate.objects.filter(
-            is_active=True,
-            duration__lt=today
-        ).update(is_active=False) 
-    
-check_expiration()
-
-
-
 # 404 handler
 handler404 = 'base.views._404'
\ No newline at end of file
@@ -73,34 +73,48 @@ def get_client_ip(request):
 #     return decorator
 
 
-def rate_limit(rate='100/hour', key_func=None):
+def rate_limit(rate='100/hour', key_func=None, algorithm='sliding', scope='user_or_ip'):
+    """
+    Limits a view to `rate` requests ('N/second|minute|hour|day') per client.
+    scope: 'user_or_ip' keys signed-in users by id and everyone else by IP,
+    'ip' always uses the IP, 'user_and_ip' combines both.
+    algorithm: 'sliding' (sliding-window counter) or 'token_bucket'.
+    Rejected requests get a 429 with a Retry-After header.
+    """
+    from .services import RateLimiter, parse_rate
+
     # Pre-parse rate to avoid re-parsing on every request
-    try:
-        num_str, period = rate.lower().split('/')
-        num_requests = int(num_str)
-        time_window = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}.get(period.strip(), 3600)
-    except (ValueError, AttributeError):
-        num_requests, time_window = 100, 3600
+    num_requests, time_window = parse_rate(rate)
+    limiter = RateLimiter(num_requests, time_window, algorithm=algorithm)
 
     def decorator(view_func):
+        view_name = f"{view_func.__module__}.{view_func.__qualname__}"
+
         @wraps(view_func)
         def wrapped_view(request, *args, **kwargs):
             ip = get_client_ip(request)
-            key = key_func(request) if key_func else f"rl:{ip}:{view_func.__name__}"
-
-            # Atomic increment with fallback for race conditions
-            try:
-                current = cache.incr(key)
-            except (ValueError, AttributeError):
-                cache.set(key, 1, timeout=time_window)
-                current = 1
-
-            if current > num_requests:
-                logger.warning("rate_limit_exceeded: ip=%s, view=%s", ip, view_func.__name__)
-                return JsonResponse(
-                    {'error': 'Too many requests. Please try again later.', 'retry_after': time_window},
+            if key_func:
+                key = key_func(request)
+            else:
+                user = getattr(request, 'user', None)
+                user_id = user.pk if user is not None and user.is_authenticated else None
+                if scope == 'ip' or user_id is None:
+                    client = f"ip:{ip}"
+                elif scope == 'user_and_ip':
+                    client = f"u:{user_id}:ip:{ip}"
+                else:
+                    client = f"u:{user_id}"
+                key = f"rl:{algorithm}:{client}:{view_name}"
+
+            allowed, retry_after = limiter.hit(key)
+            if not allowed:
+                logger.warning("rate_limit_exceeded", ip=ip, key=key, view=view_name)
+                response = JsonResponse(
+                    {'error': 'Too many requests. Please try again later.', 'retry_after': retry_after},
                     status=429
                 )
+                response['Retry-After'] = str(retry_after)
+                return response
 
             return view_func(request, *args, **kwargs)
         return wrapped_view
@@ -157,14 +171,13 @@ def log_security_event(action, severity='LOW'):
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Using transaction.atomic to ensure the log is saved even if something else fails
-            from .models import SecurityAuditLog
-            
+            from .services import record_audit_event
+
             response = view_func(request, *args, **kwargs)
-            
-            # Use on_commit or just create to track the event
+
+            # Buffered: written in bulk off the request path (see security.services)
             if request.user.is_authenticated:
-                SecurityAuditLog.objects.create(
+                record_audit_event(
                     user=request.user,
                     action=action,
                     ip_address=get_client_ip(request),
@@ -0,0 +1,82 @@
+"""
+Management command to measure what buffering the security audit log saves per request.
+Run via: python manage.py benchmark_audit_log
+Or:      python manage.py benchmark_audit_log --requests 1000
+
+Sends the same requests through a @log_security_event view twice: once with
+AUDIT_LOG_BUFFERED off (one INSERT per request) and once through an
+AuditLogBuffer flushed after the run. Requests run in autocommit, as they do
+in production; the benchmark rows are deleted afterwards.
+"""
+
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from security import services
+from security.decorators import log_security_event
+from security.models import SecurityAuditLog
+
+
+@log_security_event('API_ACCESS')
+def _audited_view(request):
+    return HttpResponse('ok')
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request latency of synchronous and buffered audit logging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Requests per mode (default 300)')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('Needs at least one user to attribute the audit rows to')
+
+        count = options['requests']
+        factory = RequestFactory()
+        requests = []
+        for i in range(count):
+            request = factory.get(f'/benchmark/{i}/', REMOTE_ADDR='10.0.0.1')
+            request.user = user
+            requests.append(request)
+
+        last_pk = SecurityAuditLog.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        # 1. Synchronous: one INSERT (and commit) inside every request
+        with override_settings(AUDIT_LOG_BUFFERED=False):
+            sync_ms, sync_queries = self._run(requests)
+
+        # 2. Buffered: a private buffer that only flushes when told to
+        buffer = services.AuditLogBuffer(flush_size=count + 1, flush_interval=3600, limit=count + 1)
+        shared, services.audit_buffer = services.audit_buffer, buffer
+        try:
+            with override_settings(AUDIT_LOG_BUFFERED=True):
+                buffered_ms, buffered_queries = self._run(requests)
+            started = time.perf_counter()
+            written = buffer.flush()
+            flush_ms = (time.perf_counter() - started) * 1000
+        finally:
+            services.audit_buffer = shared
+
+        rows, _ = SecurityAuditLog.objects.filter(
+            pk__gt=last_pk, action='API_ACCESS', details__path__startswith='/benchmark/'
+        ).delete()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{count} requests per mode on {connection.vendor}'))
+        self.stdout.write(f'  synchronous: {sync_ms / count:.2f} ms/request, {sync_queries / count:.1f} queries/request')
+        self.stdout.write(f'  buffered:    {buffered_ms / count:.2f} ms/request, {buffered_queries / count:.1f} queries/request')
+        self.stdout.write(f'  flush:       {written} rows in {flush_ms:.1f} ms (one bulk_create, off the request path)')
+        self.stdout.write(self.style.SUCCESS(f'{rows} benchmark audit rows written and deleted again'))
+
+    def _run(self, requests):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for request in requests:
+                _audited_view(request)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        return elapsed_ms, len(queries)
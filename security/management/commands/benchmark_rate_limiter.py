@@ -0,0 +1,50 @@
+"""
+Management command to microbenchmark the rate limiter.
+Run via: python manage.py benchmark_rate_limiter
+Or:      python manage.py benchmark_rate_limiter --calls 50000
+
+Calls one view through RequestFactory undecorated and under @rate_limit with
+each algorithm, on the configured default cache (LocMem unless CACHES says
+otherwise). The rate is high enough that no call is rejected, so the figures
+are the limiter's own overhead per request.
+"""
+
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from security.decorators import rate_limit
+
+
+def _view(request):
+    return HttpResponse('ok')
+
+
+class Command(BaseCommand):
+    help = 'Measure per-call overhead of the sliding-window and token-bucket rate limiters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=20000, help='Calls per variant (default 20000)')
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        request = RequestFactory().get('/benchmark/', REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+
+        variants = [
+            ('undecorated', _view),
+            ('sliding', rate_limit(f'{calls * 10}/hour', algorithm='sliding')(_view)),
+            ('token_bucket', rate_limit(f'{calls * 10}/hour', algorithm='token_bucket')(_view)),
+        ]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{calls} calls per variant, {type(caches["default"]).__name__}'))
+        for name, view in variants:
+            started = time.perf_counter()
+            for _ in range(calls):
+                response = view(request)
+            elapsed_us = (time.perf_counter() - started) * 1_000_000
+            if response.status_code != 200:
+                self.stderr.write(f'{name} was rate limited; the figures are not comparable')
+            self.stdout.write(f'  {name:<13} {elapsed_us / calls:6.1f} us/call')
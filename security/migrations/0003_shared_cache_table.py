@@ -0,0 +1,24 @@
+# Generated by Django 4.2.11 on 2026-10-18 12:40
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The 'shared' DatabaseCache table (settings.CACHES); a no-op if it exists
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_cache_table(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {schema_editor.quote_name('shared_cache')}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security', '0002_auditlog_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, drop_cache_table),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from cryptography.fernet import Fernet
@@ -48,7 +49,8 @@ class SecurityAuditLog(models.Model):
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField()
     details = models.JSONField(default=dict)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now)
     severity = models.CharField(max_length=20, choices=[
         ('LOW', 'Low'),
         ('MEDIUM', 'Medium'),
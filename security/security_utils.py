@@ -3,26 +3,40 @@ from django.utils import timezone
 import structlog
 from datetime import timedelta
 from authentication.models import BlacklistedIP, User  # Assuming User is your custom user
+from project.cache import VersionedLocalCache
 
 
 logger = structlog.get_logger(__name__)
 
+# Seconds a worker may serve the blacklist before re-reading its version
+# from the shared cache, i.e. how long a new block takes to reach it
+BLACKLIST_CHECK_INTERVAL = 5
+
+_blacklist = VersionedLocalCache(
+    'ip_blacklist',
+    lambda: frozenset(BlacklistedIP.objects.values_list('ip_address', flat=True)),
+    check_interval=BLACKLIST_CHECK_INTERVAL,
+)
+
+
+def blacklisted_ips():
+    """
+    The blacklisted IPs as a frozenset, served from process memory and
+    refreshed through the shared cache (see project.cache.VersionedLocalCache).
+    """
+    return _blacklist.get()
+
+
+def invalidate_ip_blacklist():
+    """Every process reloads the blacklist once the current transaction commits."""
+    _blacklist.invalidate()
+
+
 def is_ip_blocked(ip_address):
     """
-    Checks cache first (fast), then DB (fallback) to see if IP is blocked.
+    Checks the in-process blacklist, refreshed through the shared cache (see blacklisted_ips).
     """
-    # 1. Check Cache
-    if cache.get(f"block:{ip_address}"):
-        return True
-    
-    # 2. Check Database
-    exists = BlacklistedIP.objects.filter(ip_address=ip_address).exists()
-    if exists:
-        # Re-populate cache for 1 hour so we don't hit DB again
-        cache.set(f"block:{ip_address}", True, 3600)
-        return True
-    
-    return False
+    return ip_address in blacklisted_ips()
 
 def increment_failed_attempts(user_email, ip_address):
     """
@@ -56,7 +70,7 @@ def increment_failed_attempts(user_email, ip_address):
     if ip_failures >= 5:
         BlacklistedIP.objects.update_or_create(
             ip_address=ip_address, 
-            reason="Exceeded 5 failed login attempts in 30 mins"
+            defaults={'reason': "Exceeded 5 failed login attempts in 30 mins"}
         )
         logger.warning(f"IP {ip_address} has been blacklisted.")
-        cache.set(f"block:{ip_address}", True, 3600)
+        invalidate_ip_blacklist()
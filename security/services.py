@@ -0,0 +1,291 @@
+import atexit
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+import structlog
+
+
+logger = structlog.get_logger(__name__)
+
+# Events per bulk_create; reaching it wakes the flusher early
+AUDIT_FLUSH_SIZE = getattr(settings, 'AUDIT_FLUSH_SIZE', 50)
+# Longest an event waits in memory before the flusher writes it
+AUDIT_FLUSH_INTERVAL = getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2.0)
+# Hard cap on buffered events per process
+AUDIT_BUFFER_LIMIT = getattr(settings, 'AUDIT_BUFFER_LIMIT', 1000)
+# These bypass the buffer and are written before the response goes out
+AUDIT_SYNC_SEVERITIES = frozenset({'HIGH', 'CRITICAL'})
+
+
+# ==========================================
+# BUFFERED AUDIT LOG WRITER
+# ==========================================
+
+class AuditLogBuffer:
+    """
+    Per-process buffer of SecurityAuditLog rows written with bulk_create.
+
+    Requests only append to a list; a daemon thread flushes it every
+    AUDIT_FLUSH_INTERVAL seconds or as soon as AUDIT_FLUSH_SIZE events are
+    waiting. Backpressure: when AUDIT_BUFFER_LIMIT is reached (the DB is
+    slow or down), the request that hits the limit flushes inline instead of
+    growing the buffer. Events are only dropped (oldest first) if that flush
+    fails too, and every drop is logged. The buffer is flushed at
+    interpreter exit.
+    """
+
+    def __init__(self, flush_size=AUDIT_FLUSH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 limit=AUDIT_BUFFER_LIMIT):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.limit = limit
+        self._events = []
+        self._lock = threading.Lock()
+        # Serialises flushes so rows are never written twice or out of order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def add(self, **fields):
+        from .models import SecurityAuditLog
+
+        # Stamp now: bulk_create may run seconds later
+        fields.setdefault('timestamp', timezone.now())
+        event = SecurityAuditLog(**fields)
+
+        if event.severity in AUDIT_SYNC_SEVERITIES:
+            event.save()
+            return
+
+        with self._lock:
+            self._events.append(event)
+            pending = len(self._events)
+
+        if pending >= self.limit:
+            self.flush()
+        elif pending >= self.flush_size:
+            self._wakeup.set()
+        self._ensure_flusher()
+
+    def flush(self):
+        """Writes everything buffered so far. Returns the number of rows saved."""
+        from .models import SecurityAuditLog
+
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+
+            try:
+                SecurityAuditLog.objects.bulk_create(events, batch_size=self.flush_size)
+                return len(events)
+            except Exception as e:
+                # Put the batch back in front of newer events, keeping at most `limit`
+                with self._lock:
+                    keep = events + self._events
+                    dropped = max(len(keep) - self.limit, 0)
+                    self._events = keep[dropped:]
+                    self.dropped += dropped
+                logger.error(f"Audit log flush failed ({len(events)} events, {dropped} dropped): {e}")
+                return 0
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='audit-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # This thread owns its own DB connection; drop it if it went stale
+            close_old_connections()
+            self.flush()
+
+
+audit_buffer = AuditLogBuffer()
+atexit.register(audit_buffer.flush)
+
+
+def record_audit_event(user, action, ip_address, user_agent='', details=None, severity='LOW'):
+    """Queues one SecurityAuditLog row (HIGH/CRITICAL are written immediately)."""
+    if not getattr(settings, 'AUDIT_LOG_BUFFERED', True):
+        from .models import SecurityAuditLog
+        SecurityAuditLog.objects.create(
+            user=user, action=action, ip_address=ip_address,
+            user_agent=user_agent, details=details or {}, severity=severity
+        )
+        return
+
+    audit_buffer.add(
+        user_id=getattr(user, 'pk', user),
+        action=action,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        details=details or {},
+        severity=severity,
+    )
+
+
+def flush_audit_log():
+    """Forces buffered audit events to the database (tests, shutdown hooks)."""
+    return audit_buffer.flush()
+
+
+# ==========================================
+# RATE LIMITING
+# ==========================================
+
+RATE_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Token bucket as GCRA: one "theoretical arrival time" per key, updated atomically
+_TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - window > now then
+    return {0, tostring(new_tat - window - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+def parse_rate(rate):
+    """'100/hour' -> (100, 3600); malformed rates fall back to 100/hour."""
+    try:
+        num_str, period = rate.lower().split('/')
+        return int(num_str), RATE_PERIODS.get(period.strip(), 3600)
+    except (ValueError, AttributeError):
+        return 100, 3600
+
+
+def _redis_client(cache):
+    """The raw redis-py client behind the cache, or None for other backends."""
+    # django.core.cache.backends.redis.RedisCache
+    if hasattr(cache, '_cache') and hasattr(cache._cache, 'get_client'):
+        return cache._cache.get_client(None, write=True)
+    # django-redis
+    client = getattr(cache, 'client', None)
+    if client is not None and hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    return None
+
+
+class RateLimiter:
+    """
+    Rate-limit engine behind security.decorators.rate_limit.
+
+    `hit(key)` counts one request and returns (allowed, retry_after_seconds).
+    Algorithms:
+    - 'sliding': sliding-window counter. The previous fixed window is weighted
+      by how much of it still overlaps the last `window` seconds, so there is
+      no burst of 2x the limit at window edges.
+    - 'token_bucket': `limit` tokens refilled evenly over `window` (GCRA).
+
+    With a Redis cache the counters move in one pipeline / Lua call; otherwise
+    cache.add + cache.incr are used, which never reset a live counter.
+    """
+
+    def __init__(self, limit, window, algorithm='sliding', cache_alias='default'):
+        if algorithm not in ('sliding', 'token_bucket'):
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.limit = limit
+        self.window = window
+        self.algorithm = algorithm
+        self.cache_alias = cache_alias
+        self._local_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        if self.algorithm == 'token_bucket':
+            return self._token_bucket(key, now)
+        return self._sliding_window(key, now)
+
+    # 1. Sliding window
+    def _sliding_window(self, key, now):
+        index, offset = divmod(now, self.window)
+        current_key = f"{key}:{int(index)}"
+        previous_key = f"{key}:{int(index) - 1}"
+        # Each counter is needed for this window and the next one
+        ttl = self.window * 2
+
+        current, previous = self._incr(current_key, previous_key, ttl)
+
+        weight = 1 - offset / self.window
+        estimate = previous * weight + current
+        if estimate <= self.limit:
+            return True, 0
+
+        # Retry-After is when one more request fits (the retry counts too)
+        if current >= self.limit:
+            # This window is full on its own: wait for it to decay inside the next one
+            wait = (self.window - offset) + self.window * (1 - (self.limit - 1) / current)
+        else:
+            # Only the previous window's share is in the way
+            wait = self.window * (1 - (self.limit - current - 1) / previous) - offset
+        return False, max(int(math.ceil(wait)), 1)
+
+    def _incr(self, current_key, previous_key, ttl):
+        cache = self.cache
+        client = _redis_client(cache)
+        if client is not None:
+            current_key = cache.make_and_validate_key(current_key)
+            previous_key = cache.make_and_validate_key(previous_key)
+            pipe = client.pipeline()
+            pipe.incr(current_key)
+            pipe.expire(current_key, ttl)
+            pipe.get(previous_key)
+            current, _, previous = pipe.execute()
+            return int(current), int(previous or 0)
+
+        # add() is a no-op if the counter exists, and incr() is atomic, so a
+        # concurrent request can never reset a live window
+        cache.add(current_key, 0, timeout=ttl)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Expired between add and incr
+            cache.add(current_key, 0, timeout=ttl)
+            current = cache.incr(current_key)
+        return current, cache.get(previous_key, 0)
+
+    # 2. Token bucket
+    def _token_bucket(self, key, now):
+        interval = self.window / self.limit
+        cache = self.cache
+        client = _redis_client(cache)
+        if client is not None:
+            allowed, wait = client.eval(
+                _TOKEN_BUCKET_LUA, 1, cache.make_and_validate_key(key),
+                repr(now), repr(interval), repr(self.window)
+            )
+            if not allowed:
+                return False, max(int(math.ceil(float(wait))), 1)
+            return True, 0
+
+        # Read-modify-write; the lock makes it atomic for the per-process LocMem cache
+        with self._local_lock:
+            tat = max(cache.get(key, now), now)
+            new_tat = tat + interval
+            if new_tat - self.window > now:
+                return False, max(int(math.ceil(new_tat - self.window - now)), 1)
+            cache.set(key, new_tat, timeout=int(math.ceil(new_tat - now)) + 1)
+            return True, 0
@@ -1,3 +1,321 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from types import SimpleNamespace
+from security.decorators import rate_limit
+from security.models import SecurityAuditLog
+from security.services import AuditLogBuffer, RateLimiter, parse_rate
+from project.cache import VersionedLocalCache, shared_cache
 
-# Create your tests here.
+
+class AuditLogBufferTests(TestCase):
+
+    def make_buffer(self, limit=5):
+        buffer = AuditLogBuffer(flush_size=100, flush_interval=3600, limit=limit)
+        # Flush only where the test says so; the daemon thread has its own connection
+        buffer._ensure_flusher = lambda: None
+        return buffer
+
+    def add(self, buffer, n, severity='LOW'):
+        for i in range(n):
+            buffer.add(user_id=None, action='API_ACCESS', ip_address='10.0.0.1',
+                       user_agent='', details={'n': i}, severity=severity)
+
+    def test_events_wait_in_memory_until_flushed(self):
+        buffer = self.make_buffer()
+        self.add(buffer, 3)
+        self.assertEqual(SecurityAuditLog.objects.count(), 0)
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(SecurityAuditLog.objects.count(), 3)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_high_severity_is_written_immediately(self):
+        buffer = self.make_buffer()
+        self.add(buffer, 1, severity='HIGH')
+        self.assertEqual(SecurityAuditLog.objects.count(), 1)
+        self.assertEqual(buffer._events, [])
+
+    def test_reaching_the_limit_flushes_inline(self):
+        buffer = self.make_buffer(limit=5)
+        self.add(buffer, 4)
+        self.assertEqual(SecurityAuditLog.objects.count(), 0)
+
+        self.add(buffer, 1)
+        self.assertEqual(SecurityAuditLog.objects.count(), 5)
+        self.assertEqual(buffer._events, [])
+
+    def test_failed_flush_keeps_the_batch_for_the_next_one(self):
+        buffer = self.make_buffer()
+        self.add(buffer, 3)
+
+        with mock.patch.object(SecurityAuditLog.objects, 'bulk_create', side_effect=Exception('db down')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer._events), 3)
+        self.assertEqual(buffer.dropped, 0)
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(
+            sorted(SecurityAuditLog.objects.values_list('details__n', flat=True)), [0, 1, 2]
+        )
+
+    def test_oldest_events_are_dropped_past_the_limit_while_the_db_is_down(self):
+        buffer = self.make_buffer(limit=3)
+
+        with mock.patch.object(SecurityAuditLog.objects, 'bulk_create', side_effect=Exception('db down')):
+            # Every add at the limit tries an inline flush, which fails
+            self.add(buffer, 5)
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual([event.details['n'] for event in buffer._events], [2, 3, 4])
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(SecurityAuditLog.objects.count(), 3)
+
+    def test_buffer_is_flushed_at_interpreter_exit(self):
+        # A fresh interpreter that exits without flushing; bulk_create is
+        # stubbed so nothing touches the real database
+        script = (
+            "import django; django.setup()\n"
+            "from security import services\n"
+            "from security.models import SecurityAuditLog\n"
+            "SecurityAuditLog.objects.bulk_create = lambda events, **kw: print('flushed', len(events))\n"
+            "services.audit_buffer._ensure_flusher = lambda: None\n"
+            "for i in range(3):\n"
+            "    services.record_audit_event(None, 'API_ACCESS', '10.0.0.1')\n"
+            "print('exiting')\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'project.settings'}
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['exiting', 'flushed', '3'])
+
+
+# A window boundary: int(WINDOW_START / 60) * 60 == WINDOW_START
+WINDOW_START = 60 * 28_000_000
+
+
+class SlidingWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.limiter = RateLimiter(10, 60, algorithm='sliding')
+
+    def hits(self, n, at, key='k'):
+        return [self.limiter.hit(key, now=at) for _ in range(n)]
+
+    def test_allows_the_limit_then_rejects(self):
+        results = self.hits(11, WINDOW_START + 5)
+        self.assertEqual([allowed for allowed, _ in results], [True] * 10 + [False])
+        self.assertGreater(results[-1][1], 0)
+
+    def test_no_double_burst_across_the_window_edge(self):
+        # A fixed window would allow 10 more a second later
+        self.hits(10, WINDOW_START + 59)
+        allowed = [ok for ok, _ in self.hits(10, WINDOW_START + 61)]
+        self.assertEqual(allowed, [False] * 10)
+
+    def test_previous_window_decays_with_its_overlap(self):
+        self.hits(10, WINDOW_START + 59)
+        # Halfway through the next window, half of the previous 10 still count
+        allowed = [ok for ok, _ in self.hits(10, WINDOW_START + 90)]
+        self.assertEqual(allowed.count(True), 5)
+
+    def test_retry_after_when_only_the_previous_window_is_in_the_way(self):
+        self.hits(10, WINDOW_START + 59)
+        allowed, retry_after = self.limiter.hit('k', now=WINDOW_START + 61)
+        self.assertFalse(allowed)
+
+        self.assertTrue(self.limiter.hit('k', now=WINDOW_START + 61 + retry_after)[0])
+
+    def test_retry_after_when_the_current_window_is_full(self):
+        self.hits(10, WINDOW_START + 10)
+        allowed, retry_after = self.limiter.hit('k', now=WINDOW_START + 10)
+        self.assertFalse(allowed)
+        # Past the end of this window, and long enough into the next for its share to decay
+        self.assertGreater(retry_after, 50)
+
+        self.assertTrue(self.limiter.hit('k', now=WINDOW_START + 10 + retry_after)[0])
+
+    def test_keys_are_counted_separately(self):
+        self.hits(10, WINDOW_START + 5, key='a')
+        self.assertTrue(self.limiter.hit('b', now=WINDOW_START + 5)[0])
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        # One token every 6 seconds, bursts of up to 10
+        self.limiter = RateLimiter(10, 60, algorithm='token_bucket')
+
+    def test_burst_then_even_refill(self):
+        start = WINDOW_START + 59
+        results = [self.limiter.hit('k', now=start) for _ in range(11)]
+        self.assertEqual([allowed for allowed, _ in results], [True] * 10 + [False])
+        self.assertEqual(results[-1][1], 6)
+
+        self.assertFalse(self.limiter.hit('k', now=start + 5)[0])
+        self.assertTrue(self.limiter.hit('k', now=start + 6)[0])
+        self.assertFalse(self.limiter.hit('k', now=start + 6)[0])
+
+    def test_no_double_burst_across_the_window_edge(self):
+        start = WINDOW_START + 59
+        for _ in range(10):
+            self.limiter.hit('k', now=start)
+        # Crossing the minute boundary gives no fresh allowance
+        allowed = [self.limiter.hit('k', now=start + 2)[0] for _ in range(10)]
+        self.assertEqual(allowed, [False] * 10)
+
+    def test_sustained_rate_matches_the_limit(self):
+        # Ten seconds of hammering, every 100 ms, over two minutes
+        allowed = sum(
+            self.limiter.hit('k', now=WINDOW_START + tick / 10)[0] for tick in range(1200)
+        )
+        # The initial burst plus one token per 6 s
+        self.assertEqual(allowed, 10 + 120 // 6 - 1)
+
+
+class RateLimitDecoratorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def request(self, ip, user=None):
+        request = self.factory.get('/limited/', REMOTE_ADDR=ip)
+        request.user = user or AnonymousUser()
+        return request
+
+    def user(self, pk):
+        return SimpleNamespace(pk=pk, is_authenticated=True)
+
+    def view(self, **options):
+        @rate_limit('2/minute', **options)
+        def limited(request):
+            return HttpResponse('ok')
+        return limited
+
+    def test_rejection_is_a_429_with_retry_after(self):
+        view = self.view()
+        self.assertEqual(view(self.request('10.0.0.1')).status_code, 200)
+        self.assertEqual(view(self.request('10.0.0.1')).status_code, 200)
+
+        response = view(self.request('10.0.0.1'))
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(json.loads(response.content)['retry_after'], int(response['Retry-After']))
+
+    def test_user_or_ip_scope(self):
+        view = self.view()
+        for _ in range(2):
+            view(self.request('10.0.0.1', self.user(1)))
+        self.assertEqual(view(self.request('10.0.0.2', self.user(1))).status_code, 429)
+        # Same IP, different user; and anonymous clients go by IP
+        self.assertEqual(view(self.request('10.0.0.1', self.user(2))).status_code, 200)
+        self.assertEqual(view(self.request('10.0.0.1')).status_code, 200)
+
+    def test_ip_scope(self):
+        view = self.view(scope='ip')
+        view(self.request('10.0.0.1', self.user(1)))
+        view(self.request('10.0.0.1', self.user(2)))
+        self.assertEqual(view(self.request('10.0.0.1', self.user(3))).status_code, 429)
+        self.assertEqual(view(self.request('10.0.0.2', self.user(1))).status_code, 200)
+
+    def test_user_and_ip_scope(self):
+        view = self.view(scope='user_and_ip')
+        for _ in range(2):
+            view(self.request('10.0.0.1', self.user(1)))
+        self.assertEqual(view(self.request('10.0.0.1', self.user(1))).status_code, 429)
+        self.assertEqual(view(self.request('10.0.0.2', self.user(1))).status_code, 200)
+        self.assertEqual(view(self.request('10.0.0.1', self.user(2))).status_code, 200)
+
+    def test_views_with_the_same_name_do_not_share_a_counter(self):
+        class UserViews:
+            @rate_limit('2/minute')
+            def history(request):
+                return HttpResponse('ok')
+
+        class AdminViews:
+            @rate_limit('2/minute')
+            def history(request):
+                return HttpResponse('ok')
+
+        for _ in range(2):
+            UserViews.history(self.request('10.0.0.1'))
+        self.assertEqual(UserViews.history(self.request('10.0.0.1')).status_code, 429)
+        self.assertEqual(AdminViews.history(self.request('10.0.0.1')).status_code, 200)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('5/minute'), (5, 60))
+        self.assertEqual(parse_rate('nonsense'), (100, 3600))
+
+
+class VersionedLocalCacheTests(TestCase):
+
+    def setUp(self):
+        shared_cache.clear()
+        self.loads = 0
+
+    def make_cache(self, **options):
+        def load():
+            self.loads += 1
+            return {'loads': self.loads}
+        return VersionedLocalCache('test_values', load, **options)
+
+    def test_loads_once_and_serves_from_memory(self):
+        values = self.make_cache()
+        self.assertEqual(values.get(), {'loads': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(values.get(), {'loads': 1})
+        self.assertEqual(self.loads, 1)
+
+    def test_invalidate_reloads_after_commit(self):
+        values = self.make_cache()
+        values.get()
+        version = shared_cache.get('test_values:version')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            values.invalidate()
+        self.assertEqual(values.get(), {'loads': 1})
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(values.get(), {'loads': 2})
+        self.assertNotEqual(shared_cache.get('test_values:version'), version)
+
+    def test_other_processes_notice_the_bump_on_their_next_check(self):
+        values, other = self.make_cache(), self.make_cache(check_interval=0)
+        values.get()
+        other.get()
+        # Unchanged version: checking costs one cache read, not a reload
+        with self.assertNumQueries(1):
+            self.assertEqual(other.get(), {'loads': 2})
+        self.assertEqual(self.loads, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            values.invalidate()
+        self.assertEqual(other.get(), {'loads': 3})
+
+    def test_the_version_lives_in_the_database_cache(self):
+        values = self.make_cache()
+        values.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            values.invalidate()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM shared_cache")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_old_copy_is_reloaded_without_a_bump(self):
+        # In case a bump is lost, e.g. the shared cache was cleared
+        values = self.make_cache(check_interval=0, timeout=0)
+        values.get()
+        self.assertEqual(values.get(), {'loads': 2})
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Transaction, Withdrawal, Notification
+from .models import Transaction, Withdrawal, Notification, NotificationArchive, UserFinancialSummary, EmailOutbox
+from .services import rebuild_financial_summaries
 from django.utils import timezone
 from django.utils.html import format_html
 
@@ -55,11 +56,59 @@ class NotificationAdmin(admin.ModelAdmin):
     actions = ['mark_as_read', 'mark_as_unread']
     
     def mark_as_read(self, request, queryset):
-        queryset.update(is_read=True, read_at=timezone.now())
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        queryset.update(is_read=True)
+        # Bulk updates skip the signals, so recount the affected summaries
+        rebuild_financial_summaries(user_ids)
     mark_as_read.short_description = "Mark selected as read"
     
     def mark_as_unread(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
         queryset.update(is_read=False)
+        rebuild_financial_summaries(user_ids)
     mark_as_unread.short_description = "Mark selected as unread"
 
 
+@admin.register(UserFinancialSummary)
+class UserFinancialSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        'user', 'total_withdrawn', 'pending_withdrawn', 'total_commission',
+        'verified_sales_count', 'unread_notifications', 'updated_at'
+    )
+    search_fields = ('user__email', 'user__username')
+    readonly_fields = [f.name for f in UserFinancialSummary._meta.get_fields()]
+
+    def has_add_permission(self, request): return False
+
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ['title', 'user', 'notification_type', 'created_at', 'archived_at']
+    list_filter = ['notification_type', 'archived_at']
+    search_fields = ['title', 'user__email']
+    readonly_fields = [f.name for f in NotificationArchive._meta.get_fields()]
+
+    def has_add_permission(self, request): return False
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient_list', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'recipients')
+    # Bodies can hold live activation/reset links, so staff never see them
+    exclude = ('body', 'html_body')
+    readonly_fields = [f.name for f in EmailOutbox._meta.get_fields() if f.name not in ('body', 'html_body')]
+    actions = ['retry_now']
+
+    def has_add_permission(self, request): return False
+
+    @admin.display(description='Recipients')
+    def recipient_list(self, obj):
+        return ", ".join(obj.recipients)
+
+    @admin.action(description="Retry selected emails now")
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=EmailOutbox.Status.SENT).update(
+            status=EmailOutbox.Status.PENDING, next_attempt_at=timezone.now()
+        )
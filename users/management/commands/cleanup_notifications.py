@@ -0,0 +1,79 @@
+"""
+Management command to apply the notification retention policy.
+Run via: python manage.py cleanup_notifications    (e.g. from cron once a night)
+
+1. Each user's commission notices from the last NOTIFICATION_DIGEST_DAYS
+   finished days are folded into one summary per day.
+2. Read notifications older than NOTIFICATION_READ_RETENTION are copied to
+   NotificationArchive (unless NOTIFICATION_ARCHIVE is off) and deleted.
+
+Everything runs in bounded batches, and overlapping runs (on any host) are
+skipped through a lock row in the database (see users.services.job_lock).
+"""
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from users.services import (
+    digest_commission_notifications, purge_read_notifications, job_lock, NOTIFICATION_PURGE_BATCH_SIZE
+)
+
+LOCK_NAME = 'cleanup_notifications'
+LOCK_TIMEOUT = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Digest daily commission notifications and archive/delete old read ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=NOTIFICATION_PURGE_BATCH_SIZE,
+            help=f'Notifications deleted per transaction (default {NOTIFICATION_PURGE_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=None,
+            help='Override NOTIFICATION_READ_RETENTION for this run'
+        )
+        parser.add_argument(
+            '--digest-days', type=int, default=None,
+            help='Override NOTIFICATION_DIGEST_DAYS for this run'
+        )
+        parser.add_argument(
+            '--no-archive', action='store_true',
+            help='Delete old read notifications without copying them to the archive'
+        )
+        parser.add_argument(
+            '--skip-digest', action='store_true',
+            help='Only purge; leave commission notifications as they are'
+        )
+
+    def handle(self, *args, **options):
+        # 1. Only one cleanup at a time
+        with job_lock(LOCK_NAME, LOCK_TIMEOUT) as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING('Another notification cleanup is running; skipping'))
+                return
+
+            started = time.monotonic()
+            digests = merged = 0
+            # 2. Digest first, so the summaries (not the single notices) age out later
+            if not options['skip_digest']:
+                digests, merged = digest_commission_notifications(
+                    days=options['digest_days'], batch_size=options['batch_size']
+                )
+
+            # 3. Archive and delete old read notifications
+            older_than = None
+            if options['retention_days'] is not None:
+                older_than = timedelta(days=options['retention_days'])
+            archive = False if options['no_archive'] else getattr(settings, 'NOTIFICATION_ARCHIVE', True)
+            removed = purge_read_notifications(
+                older_than=older_than, archive=archive, batch_size=options['batch_size']
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {merged} commission notifications into {digests} digests; '
+            f'{"archived" if archive else "deleted"} {removed} read notifications in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,41 @@
+"""
+Management command to deactivate affiliates whose subscription has run out.
+Run via: python manage.py expire_subscriptions    (e.g. from cron every minute)
+
+Overlapping runs are skipped through a lock row in the database (see
+users.services.job_lock), so a slow sweep never stacks up behind the next
+cron tick, on this host or any other.
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from users.services import job_lock
+from users.utils import check_expired_subscriptions, EXPIRY_BATCH_SIZE
+
+LOCK_NAME = 'expire_subscriptions'
+LOCK_TIMEOUT = 60 * 10
+
+
+class Command(BaseCommand):
+    help = 'Deactivate affiliates whose subscription duration has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=EXPIRY_BATCH_SIZE,
+            help=f'Affiliates deactivated per UPDATE (default {EXPIRY_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        # 1. Only one sweep at a time
+        with job_lock(LOCK_NAME, LOCK_TIMEOUT) as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING('Another expiry sweep is running; skipping'))
+                return
+
+            started = time.monotonic()
+            expired = check_expired_subscriptions(batch_size=options['batch_size'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deactivated {expired} expired subscriptions in {elapsed:.2f}s'
+        ))
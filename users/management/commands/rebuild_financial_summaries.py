@@ -0,0 +1,21 @@
+"""
+Management command to recompute UserFinancialSummary rows from the source tables.
+Run via: python manage.py rebuild_financial_summaries [--user <id> ...]
+"""
+
+from django.core.management.base import BaseCommand
+from users.services import rebuild_financial_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized dashboard totals for every (or the given) user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only rebuild the summary of this user id (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_financial_summaries(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} financial summaries'))
@@ -0,0 +1,91 @@
+"""
+Management command to deliver the email outbox over one SMTP connection.
+Run via: python manage.py send_queued_emails            (drain once, e.g. from cron every minute)
+Or as a worker: python manage.py send_queued_emails --loop
+
+Sent and given-up emails older than OUTBOX_RETENTION are deleted at the
+start of each run (and hourly in --loop mode).
+"""
+
+import time
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from users.services import deliver_queued_emails, purge_outbox, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS
+
+# Seconds between outbox purges in --loop mode
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails from the outbox with batching, retry and backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+            help=f'Emails claimed per transaction (default {OUTBOX_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=OUTBOX_MAX_ATTEMPTS,
+            help=f'Give up on an email after this many failures (default {OUTBOX_MAX_ATTEMPTS})'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to wait between polls in --loop mode (default 5)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total_sent = total_failed = 0
+        purged_at = None
+
+        # One connection for the whole run; the backend reuses it for every message
+        connection = get_connection()
+        try:
+            connection.open()
+            while True:
+                if purged_at is None or time.monotonic() - purged_at >= PURGE_INTERVAL:
+                    purged = purge_outbox()
+                    purged_at = time.monotonic()
+                    if purged:
+                        self.stdout.write(f'Purged {purged} old emails')
+
+                try:
+                    sent, failed = deliver_queued_emails(
+                        connection,
+                        batch_size=options['batch_size'],
+                        max_attempts=options['max_attempts'],
+                    )
+                except Exception as e:
+                    # SMTP unreachable: keep the queue and try again later
+                    self.stdout.write(self.style.ERROR(f'Delivery interrupted: {str(e)}'))
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+                    try:
+                        connection.open()
+                    except Exception:
+                        pass
+                    continue
+
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} emails, {total_failed} failed, in {elapsed:.2f}s'
+        ))
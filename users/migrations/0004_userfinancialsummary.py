@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_alter_user_user_type'),
+        ('users', '0003_alter_transaction_transaction_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFinancialSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='financial_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_withdrawn', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('pending_withdrawn', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_commission', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('verified_sales_count', models.IntegerField(default=0)),
+                ('unread_notifications', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User Financial Summary',
+                'verbose_name_plural': 'User Financial Summaries',
+            },
+        ),
+    ]
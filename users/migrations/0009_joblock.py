@@ -0,0 +1,22 @@
+# Generated by Django 4.2.11 on 2026-10-18 12:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_notification_index_tuning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobLock',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, max_length=32)),
+                ('locked_until', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,5 +1,5 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -27,6 +27,11 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset-paginated history (users.pagination.keyset_page)
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.transaction_type} - ₦{self.amount}"
@@ -50,6 +55,13 @@ class Withdrawal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset-paginated history (users.pagination.keyset_page)
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.transaction_id:
             import secrets
@@ -120,9 +132,13 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', 'is_read', '-created_at']),
+            # The inbox cursor breaks created_at ties on id, so the index carries it too
+            models.Index(fields=['user', 'is_read', '-created_at', '-id']),
             models.Index(fields=['user', 'notification_type']),
-            # models.Index(fields=['is_active', 'expires_at']),
+            # Retention sweeps (users.services.purge_read_notifications / digest_commission_notifications).
+            # Partial: a bare boolean filter can't seek into an (is_read, created_at) index on SQLite
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True), name='notification_read_idx'),
+            models.Index(fields=['notification_type', 'created_at']),
         ]
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
@@ -131,18 +147,28 @@ class Notification(models.Model):
         return f"{self.user} - {self.title[:50]} ({self.get_notification_type_display()})"
 
     def mark_as_read(self):
-        """Mark notification as read with timestamp."""
+        """
+        Mark notification as read. Only the call whose UPDATE actually flips
+        the row lowers the unread counter, so concurrent clicks count once.
+        """
         if not self.is_read:
-            self.is_read = True
-            # self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'updated_at'])
+            self._set_read_state(True)
 
     def mark_as_unread(self):
         """Mark notification as unread."""
         if self.is_read:
-            self.is_read = False
-            # self.read_at = None
-            self.save(update_fields=['is_read', 'read_at', 'updated_at'])
+            self._set_read_state(False)
+
+    def _set_read_state(self, is_read):
+        with transaction.atomic():
+            flipped = Notification.objects.filter(pk=self.pk, is_read=not is_read).update(
+                is_read=is_read, updated_at=timezone.now()
+            )
+            if flipped:
+                UserFinancialSummary.adjust(self.user_id, unread_notifications=-1 if is_read else 1)
+        self.is_read = is_read
+        # Already counted above; keeps a later save() from counting it again
+        self._saved_is_read = is_read
 
     @property
     def time_since_created(self):
@@ -165,20 +191,31 @@ class Notification(models.Model):
             action_url="/dashboard/payments/"
         )
         """
-        return cls.objects.create(
-            user=user,
-            title=title,
-            message=message,
-            **kwargs
-        )
+        # The unread counter (users/signals.py) moves in the same transaction
+        with transaction.atomic():
+            return cls.objects.create(
+                user=user,
+                title=title,
+                message=message,
+                **kwargs
+            )
 
     @classmethod
     def get_unread_count(cls, user):
-        """Get count of unread notifications for user."""
-        return cls.objects.filter(
-            user=user,
-            is_read=False
-        ).count()
+        """
+        Get count of unread notifications for user, from the counter kept on
+        UserFinancialSummary instead of a COUNT(*) over their notifications.
+        """
+        unread = UserFinancialSummary.objects.filter(user_id=user.pk).values_list(
+            'unread_notifications', flat=True
+        ).first()
+
+        if unread is None:
+            from .services import rebuild_financial_summaries
+            rebuild_financial_summaries([user.pk])
+            unread = UserFinancialSummary.objects.get(user_id=user.pk).unread_notifications
+
+        return max(unread, 0)
 
     @classmethod
     def mark_all_as_read(cls, user, notification_type=None):
@@ -187,11 +224,140 @@ class Notification(models.Model):
         if notification_type:
             queryset = queryset.filter(notification_type=notification_type)
 
-        count = queryset.count()
-        queryset.update(is_read=True)
+        with transaction.atomic():
+            count = queryset.update(is_read=True, updated_at=timezone.now())
+            UserFinancialSummary.adjust(user.pk, unread_notifications=-count)
         return count
 
 
 
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of the live table once they pass
+    settings.NOTIFICATION_READ_RETENTION (`python manage.py cleanup_notifications`).
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_notifications'
+    )
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.NotificationType.choices)
+    priority = models.IntegerField(choices=Notification.Priority.choices)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+        verbose_name = 'Archived Notification'
+        verbose_name_plural = 'Archived Notifications'
+
+    def __str__(self):
+        return f"{self.user} - {self.title[:50]} (archived)"
 
+class UserFinancialSummary(models.Model):
+    """
+    Denormalized per-user totals for the affiliate dashboard.
+    Kept up to date by the signals in users/signals.py and ledger/signals.py;
+    `python manage.py rebuild_financial_summaries` recomputes it from scratch.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='financial_summary'
+    )
+    total_withdrawn = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    pending_withdrawn = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_commission = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    verified_sales_count = models.IntegerField(default=0)
+    unread_notifications = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        verbose_name = 'User Financial Summary'
+        verbose_name_plural = 'User Financial Summaries'
+
+    def __str__(self):
+        return f"Summary for {self.user}"
+
+    @classmethod
+    def adjust(cls, user_id, **deltas):
+        """
+        Adds deltas to one user's totals with a single UPDATE, e.g.
+        UserFinancialSummary.adjust(user.pk, unread_notifications=1).
+        A missing row is rebuilt from the source tables instead.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        updated = cls.objects.filter(user_id=user_id).update(
+            updated_at=timezone.now(),
+            **{field: models.F(field) + delta for field, delta in deltas.items()}
+        )
+
+        if not updated:
+            from .services import rebuild_financial_summaries
+            rebuild_financial_summaries([user_id])
+
+
+class EmailOutbox(models.Model):
+    """
+    Outgoing email queued inside the caller's transaction and delivered
+    later by `python manage.py send_queued_emails`. The body is blanked once
+    sent, and finished rows are purged after OUTBOX_RETENTION.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    recipients = models.JSONField(default=list)
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # The worker's "what is due" scan
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+        verbose_name = 'Queued Email'
+        verbose_name_plural = 'Email Outbox'
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class JobLock(models.Model):
+    """
+    One row per scheduled job, leased by users.services.job_lock so that
+    overlapping runs (on any host) skip instead of running twice.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    owner = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
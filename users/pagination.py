@@ -0,0 +1,147 @@
+import uuid
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+
+
+# Rows per page for the history views
+HISTORY_PAGE_SIZE = 50
+
+
+def seek_page(queryset, ordering, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of `queryset` in `ordering` (field names, '-' for descending; the
+    last one must be unique, usually the id). `after` holds the ordering values
+    of the last row already shown; seeking past them instead of using OFFSET
+    keeps deep pages as cheap as the first, provided an index starts with the
+    filter columns followed by the ordering.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*ordering)
+
+    if after is not None:
+        queryset = queryset.filter(_seek_filter(ordering, after))
+
+    # Fetch one extra row to know whether another page exists
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = _cursor(rows[-1], ordering) if has_more else None
+    return rows, next_cursor
+
+
+def _seek_filter(ordering, values):
+    """Rows after `values`: (a > x) OR (a = x AND b > y) OR ..., flipped for '-' fields."""
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def _cursor(row, ordering):
+    return '_'.join(_cursor_part(getattr(row, field.lstrip('-'))) for field in ordering)
+
+
+def _cursor_part(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def keyset_page(queryset, order_field, before=None, limit=HISTORY_PAGE_SIZE, only=None):
+    """
+    Newest-first page of `queryset`, ordered by (order_field, id) descending.
+    `before` is the (timestamp, id) of the last row already shown.
+    `only` narrows the SELECT to the columns the page actually renders.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    if only:
+        queryset = queryset.only(*only)
+    return seek_page(queryset, (f'-{order_field}', '-id'), after=before, limit=limit)
+
+
+def merged_keyset_page(querysets, order_field, before=None, limit=HISTORY_PAGE_SIZE, only=None):
+    """
+    keyset_page() over the union of `querysets`, with one seek per queryset
+    merged here. For filters no index can return in order as one scan, e.g.
+    status IN (...) ahead of the ORDER BY column: split into one queryset
+    per status and each is an ordered range of the (status, order_field) index.
+    Cursors are the same as keyset_page()'s.
+    """
+    ordering = (f'-{order_field}', '-id')
+    rows, has_more = [], False
+    for queryset in querysets:
+        if only:
+            queryset = queryset.only(*only)
+        page, cursor = seek_page(queryset, ordering, after=before, limit=limit)
+        rows.extend(page)
+        has_more = has_more or cursor is not None
+
+    rows.sort(key=lambda row: (getattr(row, order_field), row.id), reverse=True)
+    has_more = has_more or len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = _cursor(rows[-1], ordering) if has_more else None
+    return rows, next_cursor
+
+
+# Converters for parse_cursor(); each raises ValueError (or returns None) on bad input
+def cursor_int(value):
+    if not value.isdigit():
+        raise ValueError(value)
+    return int(value)
+
+
+def cursor_flag(value):
+    if value not in ('0', '1'):
+        raise ValueError(value)
+    return value == '1'
+
+
+cursor_datetime = parse_datetime
+cursor_uuid = uuid.UUID
+
+
+def parse_cursor(value, types=(cursor_datetime, cursor_int)):
+    """
+    Turns a cursor from seek_page() back into a tuple of values, one per
+    converter in `types`, or None if it is missing or invalid.
+    The default reads keyset_page()'s 'timestamp_id' cursors.
+    """
+    if not value:
+        return None
+    # An unencoded '+' in the UTC offset arrives as a space
+    parts = value.replace(' ', '+').split('_')
+    if len(parts) != len(types):
+        return None
+    try:
+        values = tuple(convert(part) for convert, part in zip(types, parts))
+    except ValueError:
+        return None
+    if any(part is None for part in values):
+        return None
+    return values
+
+
+def wants_json(request):
+    """True for infinite-scroll requests (?format=json or an XHR/fetch asking for JSON)."""
+    return (
+        request.GET.get('format') == 'json'
+        or 'application/json' in request.headers.get('Accept', '')
+    )
+
+
+def keyset_json_response(rows, next_cursor, serialize, key='results'):
+    """JSON variant of a keyset page: {'success', 'next_cursor', key: [serialize(row), ...]}."""
+    return JsonResponse({
+        'success': True,
+        'next_cursor': next_cursor,
+        key: [serialize(row) for row in rows],
+    })
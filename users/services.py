@@ -0,0 +1,499 @@
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from decimal import Decimal
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import F, Q, Case, When, Value, DecimalField, Sum, Count
+from django.db.models.functions import TruncDate
+from authentication.models import User, UserProfile
+from affiliation.models import CommissionLog, PropertyTransaction
+from .models import Withdrawal, Notification, NotificationArchive, UserFinancialSummary, EmailOutbox, JobLock
+from .pagination import seek_page, cursor_flag, cursor_datetime, cursor_uuid
+
+
+class InsufficientBalance(Exception):
+    """Raised when a debit would take a balance below zero."""
+    pass
+
+
+def _to_amount(amount):
+    return Decimal(str(amount)).quantize(Decimal('0.01'))
+
+
+def _profile_id(profile):
+    return getattr(profile, 'pk', profile)
+
+
+def credit_balance(profile, amount):
+    """
+    Adds `amount` to a profile's balance with a single
+    UPDATE ... SET balance = balance + amount. Returns the new balance.
+    """
+    return apply_balance_deltas({_profile_id(profile): _to_amount(amount)}, profile=profile)
+
+
+def debit_balance(profile, amount):
+    """
+    Takes `amount` off a profile's balance, but only if the balance covers
+    it (checked in the same UPDATE). Returns the new balance or raises
+    InsufficientBalance.
+    """
+    return apply_balance_deltas({_profile_id(profile): -_to_amount(amount)}, profile=profile)
+
+
+@transaction.atomic
+def apply_balance_deltas(deltas, profile=None):
+    """
+    Applies {profile_id: delta} credits (+) and debits (-) in one UPDATE.
+    Debits are conditional: if any row would go negative nothing is
+    written and InsufficientBalance is raised.
+
+    Returns {profile_id: new_balance}, or just the new balance when a
+    single `profile` instance is passed (its .balance is refreshed too).
+    """
+    deltas = {pk: _to_amount(delta) for pk, delta in deltas.items() if delta}
+
+    if not deltas:
+        return profile.balance if profile is not None else {}
+
+    amount_field = DecimalField(max_digits=12, decimal_places=2)
+    delta_case = Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        output_field=amount_field
+    )
+
+    queryset = UserProfile.objects.filter(pk__in=deltas)
+
+    debited = {pk: -delta for pk, delta in deltas.items() if delta < 0}
+    if debited:
+        # balance must cover the debit; credits compare against 0 and always pass
+        queryset = queryset.filter(balance__gte=Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in debited.items()],
+            default=Value(Decimal('-1')),
+            output_field=amount_field
+        ))
+
+    updated = queryset.update(balance=F('balance') + delta_case)
+
+    if updated != len(deltas):
+        # Some debit didn't fit (or a profile is missing): undo the whole batch
+        raise InsufficientBalance("Insufficient balance for this transaction.")
+
+    balances = dict(
+        UserProfile.objects.filter(pk__in=deltas).values_list('pk', 'balance')
+    )
+
+    if profile is not None:
+        if hasattr(profile, 'pk'):
+            profile.balance = balances[profile.pk]
+        return balances[_profile_id(profile)]
+
+    return balances
+
+
+# ==================================================
+# Dashboard financial summary
+# ==================================================
+
+
+SUMMARY_FIELDS = (
+    'total_withdrawn',
+    'pending_withdrawn',
+    'total_commission',
+    'verified_sales_count',
+    'unread_notifications',
+)
+
+
+def get_financial_summary(user):
+    """Dashboard totals for `user` in one primary-key lookup."""
+    summary = UserFinancialSummary.objects.filter(user=user).first()
+
+    if summary is None:
+        rebuild_financial_summaries([user.pk])
+        summary = UserFinancialSummary.objects.get(user=user)
+
+    return summary
+
+
+@transaction.atomic
+def rebuild_financial_summaries(user_ids=None):
+    """
+    Recomputes UserFinancialSummary rows from the source tables, for
+    `user_ids` or for every user. Returns the number of rows written.
+    """
+    def scoped(queryset, field):
+        return queryset if user_ids is None else queryset.filter(**{f'{field}__in': user_ids})
+
+    users = scoped(User.objects.all(), 'pk')
+    rows = {pk: UserFinancialSummary(user_id=pk) for pk in users.values_list('pk', flat=True)}
+
+    # 1. Withdrawals, grouped per user
+    withdrawals = scoped(Withdrawal.objects.all(), 'user_id').values('user_id').annotate(
+        approved=Sum('amount', filter=Q(status='approved')),
+        pending=Sum('amount', filter=Q(status='pending')),
+    ).order_by()
+    for row in withdrawals:
+        if row['user_id'] in rows:
+            rows[row['user_id']].total_withdrawn = row['approved'] or 0
+            rows[row['user_id']].pending_withdrawn = row['pending'] or 0
+
+    # 2. Commissions earned
+    commissions = scoped(CommissionLog.objects.all(), 'recipient_profile__user_id').values(
+        'recipient_profile__user_id'
+    ).annotate(total=Sum('amount')).order_by()
+    for row in commissions:
+        if row['recipient_profile__user_id'] in rows:
+            rows[row['recipient_profile__user_id']].total_commission = row['total'] or 0
+
+    # 3. Verified property sales
+    sales = scoped(PropertyTransaction.objects.filter(is_verified=True), 'affiliate__user_id').values(
+        'affiliate__user_id'
+    ).annotate(total=Count('id')).order_by()
+    for row in sales:
+        if row['affiliate__user_id'] in rows:
+            rows[row['affiliate__user_id']].verified_sales_count = row['total']
+
+    # 4. Unread notifications
+    unread = scoped(Notification.objects.filter(is_read=False), 'user_id').values(
+        'user_id'
+    ).annotate(total=Count('id')).order_by()
+    for row in unread:
+        if row['user_id'] in rows:
+            rows[row['user_id']].unread_notifications = row['total']
+
+    UserFinancialSummary.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=list(SUMMARY_FIELDS) + ['updated_at'],
+        batch_size=1000
+    )
+    return len(rows)
+
+
+# ==================================================
+# Notification inbox
+# ==================================================
+
+
+NOTIFICATION_PAGE_SIZE = 20
+# Unread notifications shown in the dashboard bell dropdown
+NOTIFICATION_DROPDOWN_SIZE = 10
+# Inbox order, and how its cursor parts are read back
+NOTIFICATION_ORDERING = ('is_read', '-created_at', '-id')
+NOTIFICATION_CURSOR = (cursor_flag, cursor_datetime, cursor_uuid)
+
+
+def notification_inbox(user, unread_only=False, after=None, limit=NOTIFICATION_PAGE_SIZE):
+    """
+    One page of `user`'s notifications: unread first, newest first within each.
+    That is the order of the (user, is_read, -created_at, -id) index, so every page
+    is a short index range scan no matter how many notifications piled up.
+    `after` is the (is_read, created_at, id) of the last row already shown, as
+    parsed by parse_cursor(value, NOTIFICATION_CURSOR).
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    queryset = Notification.objects.filter(user=user).only(
+        'id', 'user_id', 'title', 'notification_type', 'priority', 'is_read', 'created_at'
+    )
+
+    if unread_only:
+        queryset = queryset.filter(is_read=False)
+
+    return seek_page(queryset, NOTIFICATION_ORDERING, after=after, limit=limit)
+
+
+# ==================================================
+# Notification retention
+# ==================================================
+
+
+# Rows archived/deleted per transaction, so a sweep never holds long locks
+NOTIFICATION_PURGE_BATCH_SIZE = 1000
+# Per-sale commission notices; the ones digested into a daily summary
+DIGEST_NOTIFICATION_TYPE = Notification.NotificationType.REFERRAL
+DIGEST_TITLE = "Daily Commission Summary"
+_NAIRA_AMOUNT = re.compile(r'₦\s*([\d,]+(?:\.\d+)?)')
+
+
+def _notification_amount(message):
+    match = _NAIRA_AMOUNT.search(message or '')
+    if not match:
+        return None
+    return Decimal(match.group(1).replace(',', ''))
+
+
+def digest_commission_notifications(days=None, now=None, batch_size=NOTIFICATION_PURGE_BATCH_SIZE):
+    """
+    Folds each user's commission notifications of one (local) day into a
+    single summary row, for the last `days` finished days. Today is left
+    alone so new commissions still show up one by one.
+    The summary stays unread if any of the merged rows was unread; the
+    unread counter follows through the Notification signals.
+    Returns (digests_created, notifications_merged).
+    """
+    days = settings.NOTIFICATION_DIGEST_DAYS if days is None else days
+    now = now or timezone.now()
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # 1. (user, day) pairs with more than one notice, through the (type, created_at) index
+    groups = Notification.objects.filter(
+        notification_type=DIGEST_NOTIFICATION_TYPE,
+        created_at__gte=today - timedelta(days=days),
+        created_at__lt=today,
+    ).values('user_id', day=TruncDate('created_at')).annotate(
+        total=Count('id')
+    ).filter(total__gt=1).order_by('day', 'user_id')
+
+    digests = merged = 0
+    for group in groups:
+        start = timezone.make_aware(datetime.combine(group['day'], time.min))
+        end = start + timedelta(days=1)
+
+        # 2. One transaction per user-day, deleting in bounded chunks
+        with transaction.atomic():
+            notes = list(Notification.objects.filter(
+                user_id=group['user_id'],
+                notification_type=DIGEST_NOTIFICATION_TYPE,
+                created_at__gte=start,
+                created_at__lt=end,
+            ).only('id', 'message', 'is_read', 'created_at'))
+            if len(notes) < 2:
+                continue
+
+            amounts = [_notification_amount(note.message) for note in notes]
+            known = [amount for amount in amounts if amount is not None]
+            message = f"You received {len(notes)} commissions from your Referrals on {group['day']:%d %b %Y}"
+            if known:
+                message += f", totalling ₦{sum(known):,.2f}"
+
+            digest = Notification.objects.create(
+                user_id=group['user_id'],
+                title=DIGEST_TITLE,
+                message=message,
+                notification_type=DIGEST_NOTIFICATION_TYPE,
+                priority=Notification.Priority.NORMAL,
+                is_read=all(note.is_read for note in notes),
+            )
+            # Keep the digest on the day it summarises
+            Notification.objects.filter(pk=digest.pk).update(
+                created_at=max(note.created_at for note in notes)
+            )
+
+            ids = [note.id for note in notes]
+            for i in range(0, len(ids), batch_size):
+                Notification.objects.filter(id__in=ids[i:i + batch_size]).delete()
+
+        digests += 1
+        merged += len(notes)
+
+    return digests, merged
+
+
+def purge_read_notifications(older_than=None, archive=None, now=None, batch_size=NOTIFICATION_PURGE_BATCH_SIZE):
+    """
+    Deletes read notifications older than `older_than` (default
+    settings.NOTIFICATION_READ_RETENTION), copying them to
+    NotificationArchive first when archiving is on. Works in batches of
+    `batch_size`, one short transaction each. Returns the number removed.
+    """
+    older_than = settings.NOTIFICATION_READ_RETENTION if older_than is None else older_than
+    archive = getattr(settings, 'NOTIFICATION_ARCHIVE', True) if archive is None else archive
+    cutoff = (now or timezone.now()) - older_than
+    removed = 0
+
+    while True:
+        with transaction.atomic():
+            # 1. Oldest batch first, through the (is_read, created_at) index
+            batch = list(
+                Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+                .order_by('created_at')
+                .values('id', 'user_id', 'title', 'message', 'notification_type', 'priority', 'created_at')
+                [:batch_size]
+            )
+            if not batch:
+                break
+
+            # 2. Copy, then delete; a rerun after a crash skips rows already archived
+            if archive:
+                NotificationArchive.objects.bulk_create(
+                    [NotificationArchive(**row) for row in batch],
+                    ignore_conflicts=True
+                )
+            # is_read=True again: a row marked unread meanwhile stays put
+            Notification.objects.filter(
+                id__in=[row['id'] for row in batch], is_read=True
+            ).delete()
+
+        removed += len(batch)
+        if len(batch) < batch_size:
+            break
+
+    return removed
+
+
+# ==================================================
+# Email outbox
+# ==================================================
+
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+# Retry delays double from here: 1m, 2m, 4m, 8m ... capped at an hour
+OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+OUTBOX_MAX_RETRY_DELAY = timedelta(hours=1)
+# A claimed email is left alone this long; if its worker dies, it is retried after
+OUTBOX_CLAIM_TIMEOUT = timedelta(minutes=10)
+# Sent and given-up emails (their bodies can hold activation/reset links) are deleted after
+OUTBOX_RETENTION = timedelta(days=7)
+
+
+def queue_email(subject, body, recipients, html_body='', from_email=None):
+    """
+    Puts an email in the outbox instead of talking to SMTP in the request.
+    Call it inside the transaction that produced the email: if that rolls
+    back, the email goes with it.
+    """
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        recipients=list(recipients),
+        from_email=from_email or '',
+    )
+
+
+def queue_emails(emails, from_email=None):
+    """
+    Bulk form of queue_email for batch jobs: `emails` is an iterable of
+    (subject, body, recipients) tuples, written with one INSERT per 500.
+    """
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(
+            subject=subject,
+            body=body,
+            recipients=list(recipients),
+            from_email=from_email or '',
+        )
+        for subject, body, recipients in emails
+    ], batch_size=500)
+
+
+def _outbox_message(queued, connection):
+    message = EmailMultiAlternatives(
+        queued.subject,
+        queued.body,
+        queued.from_email or None,
+        queued.recipients,
+        connection=connection
+    )
+    if queued.html_body:
+        message.attach_alternative(queued.html_body, 'text/html')
+    return message
+
+
+def deliver_queued_emails(connection, batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """
+    Sends one batch of due outbox emails over an already open `connection`,
+    so a worker reuses a single SMTP session across batches.
+    Failures are rescheduled with exponential backoff until `max_attempts`.
+    A sent email keeps its subject and recipients but not its body, which
+    may hold live activation or reset links. Returns (sent, failed).
+    """
+    now = timezone.now()
+    sent = failed = 0
+    connection_error = None
+
+    # 1. Claim the batch in a short transaction; skip_locked lets several
+    #    workers drain the outbox side by side. No lock is held while SMTP talks.
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.Status.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[queued.pk for queued in batch]).update(
+            attempts=F('attempts') + 1, next_attempt_at=now + OUTBOX_CLAIM_TIMEOUT
+        )
+
+    # 2. Send
+    handled = []
+    for queued in batch:
+        handled.append(queued)
+        queued.attempts += 1
+        try:
+            _outbox_message(queued, connection).send()
+        except Exception as e:
+            failed += 1
+            queued.last_error = str(e)[:1000]
+            if queued.attempts >= max_attempts:
+                queued.status = EmailOutbox.Status.FAILED
+            else:
+                delay = min(OUTBOX_RETRY_DELAY * 2 ** (queued.attempts - 1), OUTBOX_MAX_RETRY_DELAY)
+                queued.next_attempt_at = timezone.now() + delay
+
+            # The SMTP session may have dropped; start a fresh one for the rest
+            try:
+                connection.close()
+                connection.open()
+            except Exception as e:
+                connection_error = e
+                break
+        else:
+            sent += 1
+            queued.status = EmailOutbox.Status.SENT
+            queued.sent_at = timezone.now()
+            queued.last_error = ''
+            queued.body = queued.html_body = ''
+
+    # 3. Record the outcomes; emails never tried (the connection broke) are due again now
+    for queued in batch[len(handled):]:
+        queued.next_attempt_at = now
+    EmailOutbox.objects.bulk_update(
+        batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body', 'html_body']
+    )
+
+    if connection_error is not None:
+        raise connection_error
+
+    return sent, failed
+
+
+def purge_outbox(older_than=OUTBOX_RETENTION, now=None):
+    """Deletes sent and given-up emails queued more than `older_than` ago. Returns the count."""
+    cutoff = (now or timezone.now()) - older_than
+    deleted, _ = EmailOutbox.objects.filter(
+        status__in=[EmailOutbox.Status.SENT, EmailOutbox.Status.FAILED], created_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+# ==================================================
+# Job locks
+# ==================================================
+
+
+@contextmanager
+def job_lock(name, timeout):
+    """
+    Leases the JobLock row `name` for `timeout` seconds and yields whether
+    this process got it. The lease is one conditional UPDATE in the shared
+    database, so only one run wins however many hosts start the job; it is
+    released on exit, and a crashed run's lease simply runs out.
+    """
+    JobLock.objects.get_or_create(name=name)
+    owner = uuid.uuid4().hex
+    now = timezone.now()
+    acquired = JobLock.objects.filter(name=name, locked_until__lte=now).update(
+        owner=owner, locked_until=now + timedelta(seconds=timeout)
+    ) == 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            JobLock.objects.filter(name=name, owner=owner).update(locked_until=timezone.now())
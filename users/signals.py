@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
-from .models import Withdrawal, Transaction, Notification
+from decimal import Decimal
+from .models import Withdrawal, Transaction, Notification, UserFinancialSummary
 from affiliation.models import Affiliate, CommissionLog
 
 @receiver(post_save, sender=Withdrawal)
@@ -55,6 +56,9 @@ def record_package_purchase(sender, instance, created, **kwargs):
 @receiver(post_save, sender=CommissionLog)
 def record_commission_earned(sender, instance, created, **kwargs):
     if created:
+        UserFinancialSummary.adjust(
+            instance.recipient_profile.user_id, total_commission=instance.amount)
+
         commission = Transaction.objects.create(
                 user=instance.recipient_profile.user,
                 amount=instance.amount,
@@ -71,4 +75,74 @@ def record_commission_earned(sender, instance, created, **kwargs):
             priority=Notification.Priority.NORMAL,
         )
 
-        
+
+
+# ==================================================
+# UserFinancialSummary upkeep
+# ==================================================
+
+
+def _withdrawal_totals(status, amount):
+    """(total_withdrawn, pending_withdrawn) contribution of one withdrawal."""
+    amount = amount or Decimal('0')
+    if status == 'approved':
+        return amount, Decimal('0')
+    if status == 'pending':
+        return Decimal('0'), amount
+    return Decimal('0'), Decimal('0')
+
+
+@receiver(post_init, sender=Withdrawal)
+def remember_withdrawal_state(sender, instance, **kwargs):
+    instance._saved_totals = _withdrawal_totals(
+        instance.__dict__.get('status'), instance.__dict__.get('amount'))
+
+
+@receiver(post_save, sender=Withdrawal)
+def update_withdrawal_summary(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    old_withdrawn, old_pending = (Decimal('0'), Decimal('0')) if created else instance._saved_totals
+    new_withdrawn, new_pending = _withdrawal_totals(instance.status, instance.amount)
+
+    UserFinancialSummary.adjust(
+        instance.user_id,
+        total_withdrawn=new_withdrawn - old_withdrawn,
+        pending_withdrawn=new_pending - old_pending,
+    )
+    instance._saved_totals = (new_withdrawn, new_pending)
+
+
+@receiver(post_delete, sender=Withdrawal)
+def remove_withdrawal_summary(sender, instance, **kwargs):
+    withdrawn, pending = _withdrawal_totals(instance.status, instance.amount)
+    UserFinancialSummary.adjust(
+        instance.user_id, total_withdrawn=-withdrawn, pending_withdrawn=-pending)
+
+
+@receiver(post_init, sender=Notification)
+def remember_notification_state(sender, instance, **kwargs):
+    instance._saved_is_read = instance.__dict__.get('is_read')
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_summary(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created:
+        delta = 0 if instance.is_read else 1
+    elif instance._saved_is_read is None or instance._saved_is_read == instance.is_read:
+        delta = 0
+    else:
+        delta = -1 if instance.is_read else 1
+
+    UserFinancialSummary.adjust(instance.user_id, unread_notifications=delta)
+    instance._saved_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def remove_unread_summary(sender, instance, **kwargs):
+    if not instance.is_read:
+        UserFinancialSummary.adjust(instance.user_id, unread_notifications=-1)
@@ -1,3 +1,467 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.admin import site
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from affiliation.models import CommissionLog, PropertyTransaction
+from authentication.models import User, UserProfile
+from .admin import EmailOutboxAdmin
+from .models import EmailOutbox, JobLock, Notification, NotificationArchive, UserFinancialSummary, Withdrawal
+from .pagination import merged_keyset_page, parse_cursor
+from .services import (
+    apply_balance_deltas, credit_balance, debit_balance, InsufficientBalance,
+    deliver_queued_emails, digest_commission_notifications, get_financial_summary, job_lock,
+    purge_read_notifications, rebuild_financial_summaries, notification_inbox, purge_outbox, queue_email, NOTIFICATION_CURSOR,
+)
 
-# Create your tests here.
+
+class BalanceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = []
+        for n, balance in enumerate(('100.00', '50.00', '0.00')):
+            user = User.objects.create_user(email=f"payee{n}@example.com", password="pw", username=f"payee{n}")
+            UserProfile.objects.filter(pk=user.profile.pk).update(balance=Decimal(balance))
+            cls.profiles.append(UserProfile.objects.get(pk=user.profile.pk))
+
+    def balances(self):
+        return [UserProfile.objects.get(pk=profile.pk).balance for profile in self.profiles]
+
+    def test_credit_adds_and_refreshes_the_instance(self):
+        profile = self.profiles[0]
+        self.assertEqual(credit_balance(profile, Decimal('25.25')), Decimal('125.25'))
+        self.assertEqual(profile.balance, Decimal('125.25'))
+        self.assertEqual(self.balances()[0], Decimal('125.25'))
+
+    def test_debit_within_the_balance(self):
+        self.assertEqual(debit_balance(self.profiles[1].pk, 50), Decimal('0.00'))
+        self.assertEqual(self.balances()[1], Decimal('0.00'))
+
+    def test_debit_beyond_the_balance_leaves_it_untouched(self):
+        with self.assertRaises(InsufficientBalance):
+            debit_balance(self.profiles[1], Decimal('50.01'))
+        self.assertEqual(self.balances()[1], Decimal('50.00'))
+
+    def test_mixed_deltas_for_several_users_in_one_update(self):
+        first, second, third = self.profiles
+        with CaptureQueriesContext(connection) as queries:
+            balances = apply_balance_deltas({first.pk: Decimal('-30'), second.pk: Decimal('20'), third.pk: 0})
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+
+        self.assertEqual(len(updates), 1)
+        self.assertIn('CASE', updates[0])
+        # Zero deltas are dropped, not written
+        self.assertEqual(balances, {first.pk: Decimal('70.00'), second.pk: Decimal('70.00')})
+        self.assertEqual(self.balances(), [Decimal('70.00'), Decimal('70.00'), Decimal('0.00')])
+
+    def test_one_uncovered_debit_rolls_back_the_whole_batch(self):
+        first, second, third = self.profiles
+        with self.assertRaises(InsufficientBalance):
+            apply_balance_deltas({first.pk: Decimal('10'), second.pk: Decimal('-10'), third.pk: Decimal('-0.01')})
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('50.00'), Decimal('0.00')])
+
+
+class FinancialSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="earner@example.com", password="pw", username="earner")
+        cls.other = User.objects.create_user(email="other@example.com", password="pw", username="other")
+        # Rows are otherwise created on first use
+        rebuild_financial_summaries()
+
+    def totals(self, user):
+        summary = UserFinancialSummary.objects.get(user=user)
+        return (summary.total_withdrawn, summary.pending_withdrawn, summary.total_commission,
+                summary.verified_sales_count, summary.unread_notifications)
+
+    def make_activity(self):
+        Withdrawal.objects.create(user=self.user, amount=Decimal('300'), status='approved')
+        pending = Withdrawal.objects.create(user=self.user, amount=Decimal('200'))
+        Withdrawal.objects.create(user=self.user, amount=Decimal('100'))
+        pending.status = 'approved'
+        pending.save()
+        CommissionLog.objects.create(
+            recipient_profile=self.user.profile, source_user=self.other, amount=Decimal('75.50'), generation=1
+        )
+        PropertyTransaction.objects.create(
+            affiliate=self.user.affiliate_record, amount=Decimal('1000'), description='Plot 1', is_verified=True
+        )
+        PropertyTransaction.objects.create(affiliate=self.user.affiliate_record, amount=Decimal('1000'), description='Plot 2')
+        Notification.objects.filter(user=self.user).first().mark_as_read()
+
+    def test_rebuild_recomputes_every_total_from_the_source_tables(self):
+        self.make_activity()
+        UserFinancialSummary.objects.all().delete()
+
+        self.assertEqual(rebuild_financial_summaries(), User.objects.count())
+
+        unread = Notification.objects.filter(user=self.user, is_read=False).count()
+        self.assertEqual(self.totals(self.user), (Decimal('500'), Decimal('100'), Decimal('75.50'), 1, unread))
+        self.assertEqual(self.totals(self.other)[:4], (0, 0, 0, 0))
+
+    def test_signal_upkeep_matches_a_rebuild(self):
+        self.make_activity()
+        kept_up = self.totals(self.user)
+        rebuild_financial_summaries([self.user.pk])
+        self.assertEqual(self.totals(self.user), kept_up)
+
+    def test_rebuild_can_be_scoped_to_some_users(self):
+        UserFinancialSummary.objects.filter(user=self.other).update(total_commission=Decimal('999'))
+        UserFinancialSummary.objects.filter(user=self.user).update(total_commission=Decimal('999'))
+
+        self.assertEqual(rebuild_financial_summaries([self.user.pk]), 1)
+        self.assertEqual(self.totals(self.user)[2], 0)
+        self.assertEqual(self.totals(self.other)[2], Decimal('999'))
+
+    def test_adjust_adds_deltas_in_one_update(self):
+        before = self.totals(self.user)
+        with self.assertNumQueries(1):
+            UserFinancialSummary.adjust(self.user.pk, total_commission=Decimal('10'), unread_notifications=-1)
+        after = self.totals(self.user)
+        self.assertEqual(after[2] - before[2], Decimal('10'))
+        self.assertEqual(after[4] - before[4], -1)
+
+        with self.assertNumQueries(0):
+            UserFinancialSummary.adjust(self.user.pk, total_commission=0)
+
+    def test_missing_rows_are_rebuilt_on_demand(self):
+        CommissionLog.objects.create(
+            recipient_profile=self.user.profile, source_user=self.other, amount=Decimal('20'), generation=2
+        )
+        UserFinancialSummary.objects.filter(user=self.user).delete()
+
+        UserFinancialSummary.adjust(self.user.pk, total_commission=Decimal('5'))
+        # Rebuilt from the logs, which already include whatever the delta was for
+        self.assertEqual(self.totals(self.user)[2], Decimal('20'))
+
+        UserFinancialSummary.objects.filter(user=self.user).delete()
+        self.assertEqual(get_financial_summary(self.user).total_commission, Decimal('20'))
+
+
+class UnreadCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="reader@example.com", password="pw", username="reader")
+
+    def setUp(self):
+        Notification.objects.filter(user=self.user).delete()
+        rebuild_financial_summaries([self.user.pk])
+        self.note = Notification.create_notification(user=self.user, title="Hello", message="Hello")
+
+    def unread(self):
+        return UserFinancialSummary.objects.get(user=self.user).unread_notifications
+
+    def test_new_notifications_count_as_unread(self):
+        Notification.create_notification(user=self.user, title="Again", message="Hello")
+        self.assertEqual(self.unread(), 2)
+        self.assertEqual(Notification.get_unread_count(self.user), 2)
+
+    def test_read_and_unread_flip_the_counter_once(self):
+        self.note.mark_as_read()
+        self.assertEqual(self.unread(), 0)
+        self.note.mark_as_read()
+        self.assertEqual(self.unread(), 0)
+
+        self.note.mark_as_unread()
+        self.note.mark_as_unread()
+        self.assertEqual(self.unread(), 1)
+
+    def test_concurrent_clicks_count_once(self):
+        # Two requests loaded the same unread row
+        first, second = Notification.objects.get(pk=self.note.pk), Notification.objects.get(pk=self.note.pk)
+        first.mark_as_read()
+        second.mark_as_read()
+        self.assertEqual(self.unread(), 0)
+        self.assertTrue(Notification.objects.get(pk=self.note.pk).is_read)
+
+    def test_save_after_a_flip_does_not_count_it_again(self):
+        self.note.mark_as_read()
+        self.note.title = "Edited"
+        self.note.save()
+        self.assertEqual(self.unread(), 0)
+
+    def test_save_and_delete_keep_the_counter(self):
+        self.note.is_read = True
+        self.note.save()
+        self.assertEqual(self.unread(), 0)
+
+        other = Notification.create_notification(user=self.user, title="Again", message="Hello")
+        other.delete()
+        self.note.delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_mark_all_as_read(self):
+        Notification.create_notification(user=self.user, title="Again", message="Hello")
+        self.assertEqual(Notification.mark_all_as_read(self.user), 2)
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(Notification.get_unread_count(self.user), 0)
+
+
+class NotificationRetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="earner@example.com", password="pw", username="earner")
+        Notification.objects.filter(user=cls.user).delete()
+        rebuild_financial_summaries([cls.user.pk])
+        # Midday, so "yesterday" and "today" are whole local days
+        cls.now = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def note(self, created_at, message="You received ₦100 commission from your Referral", is_read=False,
+             notification_type=Notification.NotificationType.REFERRAL):
+        note = Notification.create_notification(
+            user=self.user, title="Commission from your Referral", message=message,
+            notification_type=notification_type, is_read=is_read,
+        )
+        Notification.objects.filter(pk=note.pk).update(created_at=created_at)
+        return note
+
+    def unread(self):
+        return UserFinancialSummary.objects.get(user=self.user).unread_notifications
+
+    def test_digest_folds_each_finished_day_into_one_notification(self):
+        yesterday = self.now - timedelta(days=1)
+        self.note(yesterday, "You received ₦1,000 commission from your Referral", is_read=True)
+        self.note(yesterday - timedelta(hours=1), "You received ₦250.50 commission from your Referral")
+        self.note(yesterday - timedelta(hours=2), "Commission without an amount", is_read=True)
+        lone = self.note(self.now - timedelta(days=2))
+        today = [self.note(self.now), self.note(self.now - timedelta(hours=1))]
+        other_type = self.note(yesterday, notification_type=Notification.NotificationType.INFO)
+        self.assertEqual(self.unread(), 5)
+
+        self.assertEqual(digest_commission_notifications(days=7, now=self.now), (1, 3))
+
+        digest = Notification.objects.get(title="Daily Commission Summary")
+        self.assertIn("3 commissions", digest.message)
+        self.assertIn("totalling ₦1,250.50", digest.message)
+        self.assertFalse(digest.is_read)
+        self.assertEqual(digest.created_at, yesterday)
+        left = set(Notification.objects.filter(user=self.user).values_list('pk', flat=True))
+        self.assertEqual(left, {digest.pk, lone.pk, other_type.pk, *(note.pk for note in today)})
+        # One unread merged away, one unread digest added
+        self.assertEqual(self.unread(), 5)
+        self.assertEqual(digest_commission_notifications(days=7, now=self.now), (0, 0))
+
+    def test_digest_of_read_notifications_is_read(self):
+        yesterday = self.now - timedelta(days=1)
+        self.note(yesterday, is_read=True)
+        self.note(yesterday - timedelta(hours=1), is_read=True)
+
+        digest_commission_notifications(days=7, now=self.now)
+        self.assertTrue(Notification.objects.get(title="Daily Commission Summary").is_read)
+        self.assertEqual(self.unread(), 0)
+
+    def test_purge_archives_old_read_notifications_in_batches(self):
+        old = self.now - timedelta(days=40)
+        purged = [self.note(old - timedelta(minutes=n), is_read=True) for n in range(5)]
+        kept_unread = self.note(old)
+        kept_recent = self.note(self.now - timedelta(days=1), is_read=True)
+
+        removed = purge_read_notifications(older_than=timedelta(days=30), archive=True, now=self.now, batch_size=2)
+
+        self.assertEqual(removed, 5)
+        self.assertEqual(
+            set(Notification.objects.filter(user=self.user).values_list('pk', flat=True)),
+            {kept_unread.pk, kept_recent.pk}
+        )
+        self.assertEqual(set(NotificationArchive.objects.values_list('pk', flat=True)), {note.pk for note in purged})
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(purge_read_notifications(older_than=timedelta(days=30), now=self.now), 0)
+
+    def test_purge_without_archive_only_deletes(self):
+        self.note(self.now - timedelta(days=40), is_read=True)
+        self.assertEqual(
+            purge_read_notifications(older_than=timedelta(days=30), archive=False, now=self.now), 1
+        )
+        self.assertFalse(NotificationArchive.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="reader@example.com", password="pw", username="reader")
+        now = timezone.now()
+        for n in range(7):
+            Notification.objects.create(user=cls.user, title=f"Note {n}", message="Hello")
+        # Ties on created_at and a mix of read states make the later cursor parts matter
+        notes = list(Notification.objects.filter(user=cls.user))
+        for n, note in enumerate(notes):
+            Notification.objects.filter(pk=note.pk).update(
+                created_at=now - timedelta(minutes=n // 3), is_read=n % 2 == 0
+            )
+
+    def test_inbox_pages_walk_the_whole_inbox_in_order(self):
+        expected = list(
+            Notification.objects.filter(user=self.user).order_by('is_read', '-created_at', '-id')
+            .values_list('pk', flat=True)
+        )
+        seen, cursor = [], None
+        while True:
+            rows, cursor = notification_inbox(self.user, after=parse_cursor(cursor, NOTIFICATION_CURSOR), limit=2)
+            seen.extend(row.pk for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_merged_pages_walk_several_statuses_in_one_order(self):
+        now = timezone.now()
+        for n, status in enumerate(['pending', 'rejected', 'approved'] * 4):
+            withdrawal = Withdrawal.objects.create(user=self.user, amount=Decimal('1000'), status=status)
+            Withdrawal.objects.filter(pk=withdrawal.pk).update(created_at=now - timedelta(minutes=n // 4))
+        open_withdrawals = Withdrawal.objects.filter(status__in=['pending', 'rejected'])
+        expected = list(open_withdrawals.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = merged_keyset_page(
+                [Withdrawal.objects.filter(status=status) for status in ('pending', 'rejected')],
+                'created_at', before=parse_cursor(cursor), limit=3,
+            )
+            seen.extend(row.pk for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_bad_cursors_start_from_the_top(self):
+        for value in ('', 'nonsense', '1_2', '2_2026-10-18T10:00:00+01:00_x', '0_not-a-date_1'):
+            self.assertIsNone(parse_cursor(value, NOTIFICATION_CURSOR))
+        self.assertIsNone(parse_cursor('2026-10-18T10:00:00+01:00_abc'))
+        # An unencoded '+' arrives as a space
+        parsed = parse_cursor('2026-10-18T10:00:00 01:00_12')
+        self.assertEqual(parsed[1], 12)
+        self.assertEqual(parsed[0].utcoffset(), timedelta(hours=1))
+
+
+class JobLockTests(TestCase):
+
+    def test_only_one_holder_at_a_time(self):
+        with job_lock('nightly', 60) as first:
+            with job_lock('nightly', 60) as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+            # The loser's exit leaves the holder's lease alone
+            self.assertGreater(JobLock.objects.get(name='nightly').locked_until, timezone.now())
+
+        with job_lock('nightly', 60) as again:
+            self.assertTrue(again)
+
+    def test_locks_are_per_job(self):
+        with job_lock('nightly', 60), job_lock('hourly', 60) as other:
+            self.assertTrue(other)
+
+    def test_lease_of_a_crashed_run_runs_out(self):
+        JobLock.objects.create(name='nightly', owner='gone', locked_until=timezone.now() - timedelta(seconds=1))
+        with job_lock('nightly', 60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_released_when_the_job_fails(self):
+        with self.assertRaises(RuntimeError):
+            with job_lock('nightly', 60):
+                raise RuntimeError('boom')
+        with job_lock('nightly', 60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_expire_subscriptions_skips_while_another_run_holds_the_lock(self):
+        out = StringIO()
+        with job_lock('expire_subscriptions', 60):
+            call_command('expire_subscriptions', stdout=out)
+        self.assertIn('skipping', out.getvalue())
+
+        out = StringIO()
+        call_command('expire_subscriptions', stdout=out)
+        self.assertIn('Deactivated 0 expired subscriptions', out.getvalue())
+
+    def test_cleanup_notifications_skips_while_another_run_holds_the_lock(self):
+        out = StringIO()
+        with job_lock('cleanup_notifications', 60):
+            call_command('cleanup_notifications', stdout=out)
+        self.assertIn('skipping', out.getvalue())
+
+        out = StringIO()
+        call_command('cleanup_notifications', stdout=out)
+        self.assertIn('Merged 0 commission notifications into 0 digests', out.getvalue())
+
+
+class EmailOutboxTests(TestCase):
+
+    def setUp(self):
+        self.connection = get_connection()
+
+    def queue(self, subject='Activate your account'):
+        return queue_email(subject, 'Your link: https://example.com/activate/abc/token', ['ada@example.com'],
+                           html_body='<a href="https://example.com/activate/abc/token">Activate</a>')
+
+    def test_sent_emails_lose_their_body(self):
+        queued = self.queue()
+        self.assertEqual(deliver_queued_emails(self.connection), (1, 0))
+
+        self.assertEqual(mail.outbox[0].body, 'Your link: https://example.com/activate/abc/token')
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, EmailOutbox.Status.SENT)
+        self.assertEqual((queued.body, queued.html_body), ('', ''))
+        self.assertEqual(queued.attempts, 1)
+
+    def test_rows_are_claimed_before_sending(self):
+        self.queue()
+        seen_by_other_worker = []
+
+        def send(message, *args, **kwargs):
+            # While this worker talks to SMTP, another worker finds nothing due
+            seen_by_other_worker.append(deliver_queued_emails(self.connection))
+            return 1
+
+        with mock.patch.object(EmailMultiAlternatives, 'send', send):
+            self.assertEqual(deliver_queued_emails(self.connection), (1, 0))
+        self.assertEqual(seen_by_other_worker, [(0, 0)])
+
+    def test_failures_back_off_and_keep_the_body(self):
+        queued = self.queue()
+        with mock.patch.object(EmailMultiAlternatives, 'send', side_effect=OSError('timed out')):
+            self.assertEqual(deliver_queued_emails(self.connection), (0, 1))
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, EmailOutbox.Status.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.last_error, 'timed out')
+        self.assertGreater(queued.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertIn('token', queued.body)
+
+    def test_unsent_rows_are_released_when_the_connection_breaks(self):
+        first, second = self.queue('one'), self.queue('two')
+        with mock.patch.object(EmailMultiAlternatives, 'send', side_effect=OSError('down')), \
+                mock.patch.object(self.connection, 'open', side_effect=OSError('refused')):
+            with self.assertRaises(OSError):
+                deliver_queued_emails(self.connection)
+
+        second.refresh_from_db()
+        self.assertEqual(second.attempts, 0)
+        self.assertLessEqual(second.next_attempt_at, timezone.now())
+
+    def test_purge_deletes_old_sent_and_failed_emails(self):
+        old = timezone.now() - timedelta(days=8)
+        sent, failed, pending, recent = (self.queue() for _ in range(4))
+        EmailOutbox.objects.filter(pk=sent.pk).update(status=EmailOutbox.Status.SENT, created_at=old)
+        EmailOutbox.objects.filter(pk=failed.pk).update(status=EmailOutbox.Status.FAILED, created_at=old)
+        EmailOutbox.objects.filter(pk=pending.pk).update(created_at=old)
+        EmailOutbox.objects.filter(pk=recent.pk).update(status=EmailOutbox.Status.SENT)
+
+        self.assertEqual(purge_outbox(), 2)
+        self.assertEqual(set(EmailOutbox.objects.values_list('pk', flat=True)), {pending.pk, recent.pk})
+
+    def test_admin_never_shows_the_body(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(email='admin@example.com', password='pw', username='admin')
+        fields = EmailOutboxAdmin(EmailOutbox, site).get_fields(request, self.queue())
+        self.assertNotIn('body', fields)
+        self.assertNotIn('html_body', fields)
@@ -17,6 +17,7 @@ urlpatterns = [
     path('verify_bank_account/', views.verify_bank_account, name="verify_bank_account"),
     path('Package/<str:pk>/payment/', views.package_payment, name="package_payment"),
     path('Free-Package/<str:pk>/payment/', views.free_account_activation, name="free_account"),
+    path("notifications/", views.notifications, name="notifications"),
     path("notification/<str:pk>/user/", views.notify, name="notify"), 
     path("Read/all/", views.mark_all_as_read, name="mark_all_as_read")
 ]
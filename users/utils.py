@@ -1,24 +1,53 @@
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from affiliation.models import Affiliate
+from krysline_admin.services import invalidate_kpi_snapshot
 import structlog
 
 logger = structlog.get_logger(__name__)
 
-def check_expired_subscriptions():
+# Rows deactivated per UPDATE, so a large backlog never holds a long lock
+EXPIRY_BATCH_SIZE = 1000
+
+
+def subscription_expiry(start=None):
+    """
+    Expiry for a subscription activated at `start` (default: now).
+    Computed per activation; settings only holds the length.
     """
-    Finds all active affiliates whose duration has passed 
-    and deactivates them in bulk.
+    return (start or timezone.now()) + settings.SUBSCRIPTION_DURATION
+
+
+def check_expired_subscriptions(now=None, batch_size=EXPIRY_BATCH_SIZE):
     """
-    today = timezone.now()
-    
-    # 1. Use filter().update() for high speed
-    # This hits the database ONCE, even if 1,000 people expired
-    expired_count = Affiliate.objects.filter(
-        is_active=True,
-        duration__lt=today # __lt means "Less Than" (Past Date)
-    ).update(is_active=False)
+    Finds all active affiliates whose duration has passed
+    and deactivates them in bulk. Returns how many were deactivated.
+    """
+    now = now or timezone.now()
+    expired_count = 0
+
+    while True:
+        # 1. Pick a batch through the (is_active, duration) index
+        ids = list(
+            Affiliate.objects.filter(
+                is_active=True,
+                duration__lt=now  # __lt means "Less Than" (Past Date)
+            ).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+
+        # 2. One UPDATE per batch; re-checking the filter skips rows renewed meanwhile
+        with transaction.atomic():
+            expired_count += Affiliate.objects.filter(
+                id__in=ids, is_active=True, duration__lt=now
+            ).update(is_active=False)
+
+        if len(ids) < batch_size:
+            break
 
     if expired_count > 0:
+        invalidate_kpi_snapshot()
         logger.info(f"System: Deactivated {expired_count} expired KAL accounts.")
-        return True
-    else: return False
+    return expired_count
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect, get_list_or_404, get_object_or_404
 from security.decorators import *
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
@@ -14,11 +14,16 @@ import paystack
 from django.utils import timezone
 from monnify_verification.monnify_api import *
 from .models import Withdrawal, Transaction, Notification
+from .services import (
+    debit_balance, InsufficientBalance, get_financial_summary,
+    notification_inbox, NOTIFICATION_CURSOR, NOTIFICATION_DROPDOWN_SIZE,
+)
 from authentication.models import UserProfile
 from .forms import UserUpdateForm, PaymentUpdate
 from django.db.models import Sum
 from datetime import datetime, timedelta
-from .utils import check_expired_subscriptions
+from .utils import subscription_expiry
+from .pagination import keyset_page, parse_cursor, wants_json, keyset_json_response
 from krysline_admin.models import TransactionPIN
 from django.contrib import messages as mg
 from django.conf import settings
@@ -46,9 +51,8 @@ def dashboard(request):
 
 
     profile = user.profile
-    notification = Notification.objects.all().filter(user=user, is_read=False) 
-    # notification = user.notifications.members.all()
-    # print(notification.count())
+    # Newest unread only; the badge count comes from the summary counter
+    notification, _ = notification_inbox(user, unread_only=True, limit=NOTIFICATION_DROPDOWN_SIZE)
 
     # 1. Fetch Affiliate Record Safely
     affiliate = getattr(user, 'affiliate_record', None)
@@ -76,32 +80,26 @@ def dashboard(request):
         else:
             mg.error(request, 'PIN, Not matching, Try Again!')
 
-    # 3. Financial Calculations (Withdrawals)
-    # Total Paid Out (Approved)
-    total_withdrawn = Withdrawal.objects.filter(
-        user=user, status='approved'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # 3. Financial Calculations (Withdrawals, Commissions, Sales)
+    # Precomputed totals: one primary-key lookup instead of an aggregate each
+    summary = get_financial_summary(user)
 
-    # Total Currently Locked (Pending)
-    pending_withdrawn = Withdrawal.objects.filter(
-        user=user, status='pending'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # Total Paid Out (Approved) / Total Currently Locked (Pending)
+    total_withdrawn = summary.total_withdrawn
+    pending_withdrawn = summary.pending_withdrawn
 
     # 4. Commission Calculations
-    commissions = CommissionLog.objects.filter(recipient_profile=profile)
-    total_commission = commissions.aggregate(total=Sum('amount'))['total'] or 0
+    total_commission = summary.total_commission
 
-    latest_commissions = commissions.order_by('-created_at')[:10]
+    latest_commissions = CommissionLog.objects.filter(
+        recipient_profile=profile).select_related('source_user').order_by('-created_at')[:10]
 
     # Current Balance from Profile
     current_balance = profile.balance
 
     # 5. Business Stats
     total_deposit = affiliate.package.price
-    total_tx_count = PropertyTransaction.objects.filter(
-        affiliate=affiliate,
-        is_verified=True
-    ).count()
+    total_tx_count = summary.verified_sales_count
 
     # 6. Rank Logic
     plan_name = affiliate.package.get_name_display()
@@ -129,6 +127,7 @@ def dashboard(request):
         'set_pin': set_pin,
         'is_active': affiliate.is_active,
         'notification': notification,
+        'unread_notifications': summary.unread_notifications,
     }
 
     return render(request, 'users/user-dashboard.html', context)
@@ -136,7 +135,7 @@ def dashboard(request):
 @login_required(login_url="login")
 @log_security_event(action="READING_A_NOTIFICATION")
 def notify(request, pk):
-    notification = get_object_or_404(Notification, id=pk)
+    notification = get_object_or_404(Notification, id=pk, user=request.user)
     notification.mark_as_read()
     context = {
         "notification": notification
@@ -146,6 +145,38 @@ def notify(request, pk):
 
 
 
+@login_required(login_url="login")
+@rate_limit(rate='1000/hour')
+def notifications(request):
+    """
+    AJAX inbox: a page of the user's notifications after ?after=<cursor>,
+    unread first. ?unread=1 limits it to unread ones.
+    """
+    after = parse_cursor(request.GET.get('after'), NOTIFICATION_CURSOR)
+    unread_only = request.GET.get('unread') == '1'
+    rows, next_cursor = notification_inbox(request.user, unread_only=unread_only, after=after)
+
+    data = []
+    for note in rows:
+        data.append({
+            'id': str(note.id),
+            'title': note.title,
+            'notification_type': note.notification_type,
+            'priority': note.priority,
+            'is_read': note.is_read,
+            'created_at': note.created_at.isoformat(),
+            'time_since_created': note.time_since_created,
+            'url': reverse('notify', args=[note.id]),
+        })
+
+    return JsonResponse({
+        'success': True,
+        'unread_count': Notification.get_unread_count(request.user),
+        'next_cursor': next_cursor,
+        'notifications': data,
+    })
+
+
 @login_required(login_url='login')
 @csrf_exempt
 @log_security_event(action="MARKING_ALL_AS_READ")
@@ -296,7 +327,7 @@ def package_payment(request, pk):
 
             # Create new invoice if needed
             if need_new_invoice:
-                local_now = timezone.localtime(settings.DURATION)
+                local_now = timezone.localtime(subscription_expiry())
                 expiry_date = local_now.strftime("%Y-%m-%d %H:%M:%S")
                 description = f"Subscription for {package.get_name_display()} Plan"
 
@@ -498,7 +529,7 @@ def _process_subscription_payment(request, package_id, amount, customer_email, r
             # Fetch user by email from invoice
             user = get_object_or_404(User, email=customer_email)
             
-            duration = settings.DURATION
+            duration = subscription_expiry()
             
             # Get or create affiliate with row lock
             affiliate, created = Affiliate.objects.select_for_update().get_or_create(
@@ -714,13 +745,14 @@ def withdraw_funds(request):
                 return redirect('withdraw_funds')
 
             # 3. ATOMIC PROCESSING
-            # We use select_for_update() to lock the profile row during the math
-            user_profile = UserProfile.objects.select_for_update().get(id=profile.id)
-
             with transaction.atomic():
                 # Deduct from balance immediately (Hold the funds)
-                user_profile.balance -= amount
-                user_profile.save()
+                # The UPDATE only applies if the balance still covers it
+                try:
+                    debit_balance(profile, amount)
+                except InsufficientBalance:
+                    messages.error(request, "Insufficient commission balance.")
+                    return redirect('withdraw_funds')
 
                 # Create the withdrawal record
                 Withdrawal.objects.create(
@@ -745,16 +777,54 @@ def withdraw_funds(request):
 
 @login_required(login_url="login")
 def withdraw_history(request):
+    """The user's withdrawals, newest first, a page at a time (?before=<cursor>)."""
+    before = parse_cursor(request.GET.get('before'))
+    history, next_cursor = keyset_page(
+        Withdrawal.objects.filter(user=request.user), 'created_at', before=before,
+        only=('id', 'transaction_id', 'amount', 'status', 'created_at', 'processed_at'),
+    )
+
+    if wants_json(request):
+        return keyset_json_response(history, next_cursor, lambda w: {
+            'id': w.id,
+            'transaction_id': w.transaction_id,
+            'amount': str(w.amount),
+            'status': w.status,
+            'status_display': w.get_status_display(),
+            'created_at': w.created_at.isoformat(),
+            'processed_at': w.processed_at.isoformat() if w.processed_at else None,
+        }, key='withdrawals')
+
     context = {
-        "history": Withdrawal.objects.all().filter(user=request.user)
+        "history": history,
+        "next_cursor": next_cursor,
+        "is_first_page": before is None,
     }
     return render(request, 'users/withdraw-history.html', context)
 
 
 @login_required(login_url='login')
 def transaction_history(request):
+    """The user's transactions, newest first, a page at a time (?before=<cursor>)."""
+    before = parse_cursor(request.GET.get('before'))
+    history, next_cursor = keyset_page(
+        Transaction.objects.filter(user=request.user), 'timestamp', before=before,
+        only=('id', 'amount', 'transaction_type', 'timestamp'),
+    )
+
+    if wants_json(request):
+        return keyset_json_response(history, next_cursor, lambda t: {
+            'id': t.id,
+            'amount': str(t.amount),
+            'transaction_type': t.transaction_type,
+            'transaction_type_display': t.get_transaction_type_display(),
+            'timestamp': t.timestamp.isoformat(),
+        }, key='transactions')
+
     context = {
-        "history": Transaction.objects.all().filter(user=request.user)
+        "history": history,
+        "next_cursor": next_cursor,
+        "is_first_page": before is None,
     }
     return render(request, 'users/transaction-history.html', context)
 
@@ -762,7 +832,8 @@ def transaction_history(request):
 @login_required(login_url='login')
 def referral_list(request):
     """
-    Displays the list of users directly referred by the current user (Gen 1).
+    Displays the list of users directly referred by the current user (Gen 1),
+    plus the size and earnings of every generation below them.
     """
     user_profile = request.user.profile
     user = request.user
@@ -771,27 +842,26 @@ def referral_list(request):
     affiliate = getattr(user, 'affiliate_record', None)
 
     # Fetch all profiles where 'referrer' points to me
-    # We use select_related to get the User and Affiliate data in one query (Performance)
+    # We use select_related to get the User, Affiliate and package in one query (Performance)
     referrals = UserProfile.objects.filter(
         referrer=user_profile
-    ).select_related('user', 'user__affiliate_record').order_by('-user__date_joined')
-
-    # Calculate some stats for the top of the page
-    total_referrals = referrals.count()
-    active_referrals = referrals.filter(
-        user__affiliate_record__is_active=True).count()
-    pending_referrals = total_referrals - active_referrals
+    ).select_related('user', 'user__affiliate_record__package').order_by('-user__date_joined')
 
-    commissions = CommissionLog.objects.filter(recipient_profile=user_profile)
-    total_commission = commissions.aggregate(total=Sum('amount'))['total'] or 0
+    # Whole downline, per generation, in two grouped queries
+    downline = downline_stats(user_profile)
+    first_generation = next(
+        (g for g in downline['generations'] if g['generation'] == 1),
+        {'total': 0, 'active': 0, 'inactive': 0}
+    )
 
     context = {
         'referrals': referrals,
-        'total_referrals': total_referrals,
-        'active_referrals': active_referrals,
-        'pending_referrals': pending_referrals,
+        'total_referrals': first_generation['total'],
+        'active_referrals': first_generation['active'],
+        'pending_referrals': first_generation['inactive'],
         'referral_url': f"{request.scheme}://{request.get_host()}/user/register/?ref={affiliate.referral_code}",
-        'total_commission': total_commission
+        'total_commission': downline['total_commission'],
+        'downline': downline,
     }
 
     return render(request, 'users/user-referal.html', context)